@@ -72,9 +72,11 @@ export const playerAPI = {
    * Get list of players
    * @param {number} limit - Number of players per page
    * @param {number} offset - Offset for pagination
+   * @param {string} cursor - next_cursor from the previous page (takes precedence over offset)
    */
-  listPlayers: async (limit = 20, offset = 0) => {
-    return fetchAPI(`/players?limit=${limit}&offset=${offset}`);
+  listPlayers: async (limit = 20, offset = 0, cursor = null) => {
+    const page = cursor ? `cursor=${encodeURIComponent(cursor)}` : `offset=${offset}`;
+    return fetchAPI(`/players?limit=${limit}&${page}`);
   },
   
   /**
@@ -103,6 +105,13 @@ export const cardsAPI = {
     return fetchAPI(`/cards${queryString}`);
   },
   
+  /**
+   * Get the full card catalog (versioned; matches player.cardCatalogVersion)
+   */
+  getCatalog: async () => {
+    return fetchAPI('/cards/catalog');
+  },
+  
   /**
    * Get specific card
    * @param {number} cardId - Card database ID
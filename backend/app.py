@@ -2,6 +2,7 @@
 Main Flask Application
 Clash Royale Deck Analyzer Backend
 """
+import click
 from flask import Flask, jsonify, request
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
@@ -32,10 +33,19 @@ def create_app(config_name=None):
     CORS(app, origins=app.config['CORS_ORIGINS'], supports_credentials=True)
     jwt = JWTManager(app)
     
+    from services.query_budget import init_query_budget
+    init_query_budget(app)
+    from services.deck_index import init_deck_index
+    init_deck_index()
+    
     # Create database tables on startup
     with app.app_context():
         try:
             db.create_all()
+            from models import ensure_columns
+            ensure_columns()
+            from services.name_search import ensure_name_search_index
+            ensure_name_search_index()
         except Exception as e:
             print(f'Warning: Failed to create database tables: {e}')
     
@@ -83,9 +93,31 @@ def create_app(config_name=None):
         except Exception as e:
             db_status = f'unhealthy: {str(e)}'
         
+        # Report upstream connection reuse if the API client has been created
+        from services import clash_royale, card_catalog, circuit_breaker, background_refresh, analysis_cache, negative_cache, hot_players, adaptive_ttl, deck_index
+        api_service = clash_royale._api_service
+        catalog = card_catalog._card_catalog
+        breaker = circuit_breaker._circuit_breaker
+        refresher = background_refresh._refresher
+        analyses = analysis_cache._analysis_cache
+        missing_players = negative_cache._missing_players
+        access_tracker = hot_players._access_tracker
+        ttl_stats = adaptive_ttl._ttl_stats
+        similar_decks = deck_index._deck_index
+        
         return jsonify({
             'status': 'healthy' if db_status == 'healthy' else 'unhealthy',
-            'database': db_status
+            'database': db_status,
+            'api_pool': api_service.get_pool_stats() if api_service else None,
+            'api_rate_limiter': api_service.rate_limiter.get_stats() if api_service else None,
+            'card_catalog': catalog.get_stats() if catalog else None,
+            'api_circuit_breaker': breaker.get_state() if breaker else None,
+            'player_refresh': refresher.get_stats() if refresher else None,
+            'analysis_cache': analyses.get_stats() if analyses else None,
+            'missing_players': missing_players.get_stats() if missing_players else None,
+            'player_access': access_tracker.get_stats() if access_tracker else None,
+            'player_ttl': ttl_stats.get_stats() if ttl_stats else None,
+            'deck_index': similar_decks.get_stats() if similar_decks else None
         })
 
     @app.route('/debug/cr_test', methods=['GET'])
@@ -172,16 +204,13 @@ def create_app(config_name=None):
     def seed_cards():
         """Seed the database with card data"""
         with app.app_context():
-            from services.clash_royale import get_api_service
+            from services.card_catalog import get_card_catalog
             from models import Card
             
             try:
-                api_service = get_api_service()
-                api_cards = api_service.get_cards()
+                catalog_cards = get_card_catalog().all()
                 
-                for api_card in api_cards:
-                    parsed_card = api_service.parse_card_data(api_card)
-                    
+                for parsed_card in catalog_cards:
                     # Check if card exists
                     card = Card.query.filter_by(card_id=parsed_card['card_id']).first()
                     
@@ -198,12 +227,83 @@ def create_app(config_name=None):
                         db.session.add(card)
                 
                 db.session.commit()
-                print(f"Successfully seeded {len(api_cards)} cards!")
+                print(f"Successfully seeded {len(catalog_cards)} cards!")
                 
             except Exception as e:
                 db.session.rollback()
                 print(f"Error seeding cards: {str(e)}")
     
+    @app.cli.command()
+    @click.option('--chunk-size', type=int, default=None, help='Players per fetch/commit')
+    @click.option('--limit', type=int, default=None, help='Maximum number of players to ingest')
+    def ingest_battles(chunk_size, limit):
+        """Ingest battlelogs of stored players into deduplicated battles"""
+        with app.app_context():
+            from services.battle_ingestion import BattleIngestionService
+            
+            try:
+                stats = BattleIngestionService.ingest_battles(chunk_size=chunk_size, limit=limit)
+                print(
+                    f"Ingested {stats['battles_inserted']} new battles "
+                    f"({stats['decks_inserted']} decks) from {stats['players']} players "
+                    f"in {stats['elapsed_seconds']}s ({stats['players_per_second']} players/s, "
+                    f"{stats['errors']} errors)"
+                )
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error ingesting battles: {str(e)}")
+    
+    @app.cli.command()
+    @click.option('--chunk-size', type=int, default=None, help='Decks per worker task/commit')
+    @click.option('--workers', type=int, default=None, help='Analyzer processes (default: one per CPU)')
+    @click.option('--limit', type=int, default=None, help='Maximum number of decks to read')
+    @click.option('--restart', is_flag=True, help='Ignore the checkpoint and start from the first deck')
+    def reanalyze_decks(chunk_size, workers, limit, restart):
+        """Re-analyze stored decks for the current analysis thresholds and card features"""
+        with app.app_context():
+            from services.bulk_reanalysis import BulkReanalysisService
+            
+            def report(stats):
+                print(
+                    f"{stats['analyzed']} decks analyzed up to deck {stats['last_deck_id']} "
+                    f"({stats['decks_per_second']} decks/s)"
+                )
+            
+            try:
+                stats = BulkReanalysisService.reanalyze(
+                    chunk_size=chunk_size, workers=workers, limit=limit, restart=restart, progress=report
+                )
+                print(
+                    f"Re-analyzed {stats['analyzed']} of {stats['decks']} decks for thresholds version "
+                    f"{stats['thresholds_version']} (resumed after deck {stats['resumed_after_deck']}, "
+                    f"{stats['already_analyzed']} already analyzed, {stats['skipped']} skipped) "
+                    f"in {stats['elapsed_seconds']}s ({stats['decks_per_second']} decks/s)"
+                )
+            except KeyboardInterrupt:
+                print("Stopped; run again to resume from the last committed chunk")
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error re-analyzing decks: {str(e)}")
+    
+    @app.cli.command()
+    @click.option('--budget', type=int, default=None, help='Player fetches per minute')
+    @click.option('--interval', type=int, default=None, help='Seconds between cycles')
+    @click.option('--once', is_flag=True, help='Run a single cycle and exit')
+    def refresh_hot_players(budget, interval, once):
+        """Refresh the most accessed players before their cache expires"""
+        with app.app_context():
+            from services.hot_players import create_scheduler
+            
+            scheduler = create_scheduler(budget_per_minute=budget, interval=interval)
+            print(
+                f"Refreshing hot players every {scheduler.interval}s "
+                f"({scheduler.budget_per_cycle} fetches per cycle)"
+            )
+            try:
+                scheduler.run(cycles=1 if once else None)
+            except KeyboardInterrupt:
+                print("Stopped")
+    
     return app
 
 if __name__ == '__main__':
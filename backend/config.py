@@ -48,12 +48,71 @@ class Config:
     
     # Clash Royale API Configuration
     CLASH_ROYALE_API_KEY = os.getenv('CLASH_ROYALE_API_KEY', '')
-    CLASH_ROYALE_API_BASE_URL = 'https://api.clashroyale.com/v1'
+    # RoyaleAPI proxy bypasses IP restrictions; point at replay_server.py for offline runs
+    CLASH_ROYALE_API_BASE_URL = os.getenv('CLASH_ROYALE_API_BASE_URL', 'https://proxy.royaleapi.dev/v1')
     CLASH_ROYALE_API_TIMEOUT = 10  # seconds
     
+    # Clash Royale API connection pool (shared by all threads of a worker)
+    CLASH_ROYALE_API_POOL_CONNECTIONS = int(os.getenv('CLASH_ROYALE_API_POOL_CONNECTIONS', 4))  # host pools kept
+    CLASH_ROYALE_API_POOL_MAXSIZE = int(os.getenv('CLASH_ROYALE_API_POOL_MAXSIZE', 10))  # connections per host
+    CLASH_ROYALE_API_POOL_BLOCK = os.getenv('CLASH_ROYALE_API_POOL_BLOCK', 'False').lower() == 'true'
+    CLASH_ROYALE_API_KEEPALIVE = os.getenv('CLASH_ROYALE_API_KEEPALIVE', 'True').lower() == 'true'
+    CLASH_ROYALE_API_MAX_RETRIES = int(os.getenv('CLASH_ROYALE_API_MAX_RETRIES', 2))  # connect/read retries
+    CLASH_ROYALE_API_RETRY_BACKOFF = float(os.getenv('CLASH_ROYALE_API_RETRY_BACKOFF', 0.3))  # seconds
+    CLASH_ROYALE_API_MAX_CONCURRENCY = int(os.getenv('CLASH_ROYALE_API_MAX_CONCURRENCY', 10))  # async fan-out
+    
+    # Clash Royale API client-side rate limiting (size to the API key's quota)
+    CLASH_ROYALE_API_RATE_LIMIT = float(os.getenv('CLASH_ROYALE_API_RATE_LIMIT', 10))  # requests per second
+    CLASH_ROYALE_API_RATE_BURST = int(os.getenv('CLASH_ROYALE_API_RATE_BURST', 20))  # bucket capacity
+    CLASH_ROYALE_API_MAX_QUEUE_WAIT = float(os.getenv('CLASH_ROYALE_API_MAX_QUEUE_WAIT', 5))  # seconds
+    CLASH_ROYALE_API_STATUS_RETRIES = int(os.getenv('CLASH_ROYALE_API_STATUS_RETRIES', 3))  # retries on 429/5xx
+    CLASH_ROYALE_API_BACKOFF_BASE = float(os.getenv('CLASH_ROYALE_API_BACKOFF_BASE', 0.5))  # seconds
+    CLASH_ROYALE_API_BACKOFF_MAX = float(os.getenv('CLASH_ROYALE_API_BACKOFF_MAX', 8))  # seconds
+    
+    # Clash Royale API circuit breaker
+    CLASH_ROYALE_API_BREAKER_FAILURES = int(os.getenv('CLASH_ROYALE_API_BREAKER_FAILURES', 5))  # consecutive
+    CLASH_ROYALE_API_BREAKER_RESET = float(os.getenv('CLASH_ROYALE_API_BREAKER_RESET', 30))  # seconds open
+    
     # Caching configuration (in seconds)
-    PLAYER_CACHE_DURATION = int(os.getenv('PLAYER_CACHE_DURATION', 300))  # 5 minutes
+    PLAYER_CACHE_DURATION = int(os.getenv('PLAYER_CACHE_DURATION', 300))  # 5 minutes (soft TTL)
+    # Between the soft and hard TTL cached players are served while refreshing in the background;
+    # set it to 0 to always refresh on the request path
+    PLAYER_CACHE_HARD_DURATION = int(os.getenv('PLAYER_CACHE_HARD_DURATION', 3600))  # 1 hour
+    # Per-player TTLs range from MIN (stats change on every fetch) to MAX (dormant);
+    # new players start at PLAYER_CACHE_DURATION
+    PLAYER_CACHE_MIN_DURATION = int(os.getenv('PLAYER_CACHE_MIN_DURATION', 60))
+    PLAYER_CACHE_MAX_DURATION = int(os.getenv('PLAYER_CACHE_MAX_DURATION', 1800))  # 30 minutes
+    PLAYER_ACTIVITY_SMOOTHING = float(os.getenv('PLAYER_ACTIVITY_SMOOTHING', 0.3))  # weight of the newest fetch
+    PLAYER_REFRESH_WORKERS = int(os.getenv('PLAYER_REFRESH_WORKERS', 2))
     CARDS_CACHE_DURATION = int(os.getenv('CARDS_CACHE_DURATION', 86400))  # 24 hours
+    CARD_CATALOG_MAX_AGE = int(os.getenv('CARD_CATALOG_MAX_AGE', 300))  # Client cache of /api/cards/catalog
+    # Tags the API reported missing are answered 404 locally for this long
+    PLAYER_NOT_FOUND_TTL = int(os.getenv('PLAYER_NOT_FOUND_TTL', 600))  # 10 minutes
+    PLAYER_NOT_FOUND_MAX_ENTRIES = int(os.getenv('PLAYER_NOT_FOUND_MAX_ENTRIES', 10000))
+    
+    # Hot players: web workers count lookups in a count-min sketch and flush the
+    # heaviest tags to player_access; `flask refresh-hot-players` refreshes them
+    HOT_PLAYER_SKETCH_WIDTH = int(os.getenv('HOT_PLAYER_SKETCH_WIDTH', 2048))
+    HOT_PLAYER_SKETCH_DEPTH = int(os.getenv('HOT_PLAYER_SKETCH_DEPTH', 4))
+    HOT_PLAYER_CANDIDATES = int(os.getenv('HOT_PLAYER_CANDIDATES', 512))  # tags flushed per window
+    HOT_PLAYER_FLUSH_INTERVAL = int(os.getenv('HOT_PLAYER_FLUSH_INTERVAL', 60))  # seconds
+    HOT_PLAYER_REFRESH_BUDGET = int(os.getenv('HOT_PLAYER_REFRESH_BUDGET', 60))  # player fetches per minute
+    HOT_PLAYER_REFRESH_INTERVAL = int(os.getenv('HOT_PLAYER_REFRESH_INTERVAL', 30))  # seconds per cycle
+    HOT_PLAYER_REFRESH_LEAD = int(os.getenv('HOT_PLAYER_REFRESH_LEAD', 60))  # seconds before expiry
+    HOT_PLAYER_MIN_HITS = float(os.getenv('HOT_PLAYER_MIN_HITS', 3))
+    HOT_PLAYER_HALF_LIFE = int(os.getenv('HOT_PLAYER_HALF_LIFE', 3600))  # seconds for counts to halve
+    
+    # Per-endpoint SQL statement budgets: off, warn (log) or raise
+    QUERY_BUDGET_MODE = os.getenv('QUERY_BUDGET_MODE', 'off')
+    
+    # Player listing: seconds between recounts of the approximate total
+    PLAYER_COUNT_TTL = int(os.getenv('PLAYER_COUNT_TTL', 60))
+    
+    # Batch player lookups
+    PLAYER_BATCH_MAX_TAGS = int(os.getenv('PLAYER_BATCH_MAX_TAGS', 50))
+    
+    # Battle log ingestion
+    BATTLE_INGEST_CHUNK_SIZE = int(os.getenv('BATTLE_INGEST_CHUNK_SIZE', 100))  # players per fetch/commit
     
     # CORS Configuration
     # On production (unified service): CORS not needed since frontend is same origin
@@ -67,7 +126,10 @@ class Config:
     RATELIMIT_STORAGE_URL = os.getenv('RATELIMIT_STORAGE_URL', 'memory://')
     RATELIMIT_DEFAULT = "100/hour"
     
-    # Analysis thresholds
+    # Analysis cache (in-memory LRU in front of the analysis_cache table)
+    ANALYSIS_CACHE_SIZE = int(os.getenv('ANALYSIS_CACHE_SIZE', 1024))
+    
+    # Analysis thresholds (changing them invalidates cached analyses)
     ANALYSIS_THRESHOLDS = {
         'high_elixir': 4.5,
         'low_elixir': 3.0,
@@ -76,12 +138,22 @@ class Config:
         'min_win_conditions': 1,
         'max_win_conditions': 3,
     }
+    
+    # Bulk re-analysis (flask reanalyze-decks) after a thresholds change
+    REANALYSIS_CHUNK_SIZE = int(os.getenv('REANALYSIS_CHUNK_SIZE', 1000))  # decks per worker task/commit
+    REANALYSIS_WORKERS = int(os.getenv('REANALYSIS_WORKERS', 0))  # analyzer processes, 0 for one per CPU
+    
+    # Similar deck index (in-memory per process, filled from the decks table)
+    DECK_INDEX_CHUNK_SIZE = int(os.getenv('DECK_INDEX_CHUNK_SIZE', 5000))  # decks read per query when syncing
+    DECK_INDEX_SYNC_INTERVAL = int(os.getenv('DECK_INDEX_SYNC_INTERVAL', 10))  # seconds between syncs
+    DECK_INDEX_SYNC_OVERLAP = int(os.getenv('DECK_INDEX_SYNC_OVERLAP', 1000))  # deck ids re-read per sync
 
 
 class DevelopmentConfig(Config):
     """Development configuration"""
     DEBUG = True
     SQLALCHEMY_ECHO = True
+    QUERY_BUDGET_MODE = os.getenv('QUERY_BUDGET_MODE', 'warn')
 
 
 class ProductionConfig(Config):
@@ -105,6 +177,7 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=5)
+    QUERY_BUDGET_MODE = 'raise'
 
 
 # Configuration dictionary
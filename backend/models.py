@@ -3,7 +3,10 @@ Database Models for Clash Royale Deck Analyzer
 Uses SQLAlchemy ORM for MySQL database interaction
 """
 from datetime import datetime
+from flask import g, has_request_context
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import selectinload
 from werkzeug.security import generate_password_hash, check_password_hash
 import hashlib
 import json
@@ -11,6 +14,94 @@ import json
 db = SQLAlchemy()
 
 
+def upsert(model, key_columns, update_columns=(), increment_columns=(), update_expressions=None):
+    """
+    Build a dialect-native bulk upsert for a model's table
+    
+    Execute it with one or more row dictionaries. Column defaults apply to
+    inserted rows only, so pass updated_at explicitly when it should change
+    on conflict.
+    
+    Args:
+        model: Mapped model class
+        key_columns: Columns of the unique key that detects conflicts
+        update_columns: Columns overwritten from the new row on conflict;
+            empty (with no increment_columns) keeps the existing row unchanged
+        increment_columns: Columns the new row's value is added to on conflict
+        update_expressions: Optional callable taking the new row (excluded or
+            inserted) and returning ordered (column, expression) pairs,
+            assigned on conflict before every other column
+    
+    Returns:
+        Insert: INSERT ... ON CONFLICT (SQLite, PostgreSQL) or
+            INSERT ... ON DUPLICATE KEY UPDATE (MySQL)
+    """
+    dialect = db.session.get_bind().dialect.name
+    table = model.__table__
+    
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(model)
+        # MySQL has no DO NOTHING; assigning a key column to itself is the no-op form
+        columns = update_columns or ([] if increment_columns or update_expressions else key_columns[:1])
+        # Assignments run in order and see earlier ones, so pass them as ordered pairs
+        values = list(update_expressions(stmt.inserted)) if update_expressions else []
+        values += [(column, stmt.inserted[column]) for column in columns]
+        values += [(column, table.c[column] + stmt.inserted[column]) for column in increment_columns]
+        return stmt.on_duplicate_key_update(values)
+    
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(model)
+    if not update_columns and not increment_columns and not update_expressions:
+        return stmt.on_conflict_do_nothing(index_elements=key_columns)
+    values = dict(update_expressions(stmt.excluded)) if update_expressions else {}
+    values.update({column: stmt.excluded[column] for column in update_columns})
+    values.update({column: table.c[column] + stmt.excluded[column] for column in increment_columns})
+    return stmt.on_conflict_do_update(index_elements=key_columns, set_=values)
+
+
+def ensure_columns():
+    """
+    Add model columns missing from existing tables
+    
+    db.create_all() only creates missing tables, so columns added to a model
+    after its table was created are added here with ALTER TABLE. Safe to run
+    on every startup: only columns the database lacks are added. Must run
+    inside an app context after db.create_all().
+    
+    Returns:
+        List[str]: Columns added, as table.column
+    """
+    added = []
+    inspector = inspect(db.engine)
+    dialect = db.engine.dialect
+    existing_tables = set(inspector.get_table_names())
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        present = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in present:
+                continue
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=dialect)}"
+            # Existing rows take the model's scalar default rather than NULL
+            if column.default is not None and column.default.is_scalar:
+                ddl += f" DEFAULT {column.default.arg!r}"
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(text(ddl))
+            except Exception:
+                # Another process may have added it first
+                if column.name not in {c['name'] for c in inspect(db.engine).get_columns(table.name)}:
+                    raise
+                continue
+            added.append(f'{table.name}.{column.name}')
+    return added
+
+
 class User(db.Model):
     """User model for authentication"""
     __tablename__ = 'users'
@@ -89,6 +180,57 @@ class Card(db.Model):
             'spell_type': self.spell_type
         }
     
+    def to_catalog_dict(self):
+        """Convert card to the catalog entry shape (API-style keys)"""
+        return {
+            'name': self.name,
+            'card_id': self.card_id,
+            'elixirCost': self.elixir_cost,
+            'iconUrls': {
+                'medium': self.icon_url,
+            },
+            'id': self.id,
+            'rarity': self.rarity,
+            'card_type': self.card_type,
+            'maxLevel': self.max_level
+        }
+    
+    @staticmethod
+    def catalog_version():
+        """
+        Get a version string for the stored card catalog
+        
+        The version changes whenever a card is added, removed or updated, so
+        it can be used as an ETag and as a cache key by clients. It is
+        computed once per request.
+        
+        Returns:
+            str: Short hex digest of the catalog's row count, highest id and latest update
+        """
+        if has_request_context() and 'card_catalog_version' in g:
+            return g.card_catalog_version
+        
+        count, max_id, last_updated = db.session.query(
+            db.func.count(Card.id), db.func.max(Card.id), db.func.max(Card.updated_at)
+        ).one()
+        version = hashlib.sha1(
+            f'{count}:{max_id}:{last_updated.isoformat() if last_updated else None}'.encode()
+        ).hexdigest()[:16]
+        
+        if has_request_context():
+            g.card_catalog_version = version
+        return version
+    
+    @staticmethod
+    def catalog():
+        """
+        Get the full card catalog
+        
+        Returns:
+            List[Dict]: Every card in catalog entry shape, ordered by id
+        """
+        return [card.to_catalog_dict() for card in Card.query.order_by(Card.id).all()]
+    
     def __repr__(self):
         return f'<Card {self.name} ({self.elixir_cost} elixir)>'
 
@@ -116,11 +258,38 @@ class Player(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Fetch history driving the adaptive cache duration (see services.adaptive_ttl)
+    fetch_count = db.Column(db.Integer, default=0)
+    change_count = db.Column(db.Integer, default=0)
+    activity = db.Column(db.Float)
+    cache_ttl = db.Column(db.Integer)
+    
     # Relationships
     decks = db.relationship('Deck', back_populates='player', cascade='all, delete-orphan')
+    current_decks = db.relationship(
+        'Deck',
+        primaryjoin='and_(Player.id == Deck.player_id, Deck.is_current_deck == True)',
+        order_by='Deck.id.desc()',
+        viewonly=True
+    )
+    
+    # Keyset pagination of the listing walks (trophies, id) in index order
+    __table_args__ = (
+        db.Index('ix_players_trophies_id', 'trophies', 'id'),
+    )
+    
+    @property
+    def current_deck(self):
+        """The player's current deck (newest if several are flagged), or None"""
+        return self.current_decks[0] if self.current_decks else None
     
     def to_dict(self, include_deck=True):
-        """Convert player to dictionary"""
+        """
+        Convert player to dictionary
+        
+        Args:
+            include_deck: Include the current deck and the card catalog version
+        """
         player_dict = {
             'id': self.id,
             'player_tag': self.player_tag,
@@ -141,9 +310,8 @@ class Player(db.Model):
         
         # Include current deck if requested
         if include_deck:
-            current_deck = Deck.query.filter_by(player_id=self.id, is_current_deck=True).first()
+            current_deck = self.current_deck
             if current_deck:
-                deck_cards = DeckCard.query.filter_by(deck_id=current_deck.id).order_by(DeckCard.position).all()
                 player_dict['currentDeck'] = [
                     {
                         'name': dc.card.name,
@@ -157,28 +325,13 @@ class Player(db.Model):
                         'rarity': dc.card.rarity,
                         'card_type': dc.card.card_type
                     }
-                    for dc in deck_cards
+                    for dc in current_deck.deck_cards
                 ]
             else:
                 player_dict['currentDeck'] = []
             
-            # Also include all cards as a fallback
-            all_cards = Card.query.all()
-            player_dict['cards'] = [
-                {
-                    'name': card.name,
-                    'card_id': card.card_id,
-                    'elixirCost': card.elixir_cost,
-                    'iconUrls': {
-                        'medium': card.icon_url,
-                    },
-                    'id': card.id,
-                    'rarity': card.rarity,
-                    'card_type': card.card_type,
-                    'maxLevel': card.max_level
-                }
-                for card in all_cards
-            ]
+            # Reference the card catalog (GET /api/cards/catalog) instead of embedding it
+            player_dict['cardCatalogVersion'] = Card.catalog_version()
         
         return player_dict
     
@@ -201,7 +354,9 @@ class Deck(db.Model):
     
     # Relationships
     player = db.relationship('Player', back_populates='decks')
-    deck_cards = db.relationship('DeckCard', back_populates='deck', cascade='all, delete-orphan')
+    deck_cards = db.relationship(
+        'DeckCard', back_populates='deck', cascade='all, delete-orphan', order_by='DeckCard.position'
+    )
     analyses = db.relationship('DeckAnalysis', back_populates='deck', cascade='all, delete-orphan')
     
     @staticmethod
@@ -225,13 +380,19 @@ class Deck(db.Model):
         if include_cards:
             result['cards'] = [dc.to_dict() for dc in self.deck_cards]
         
-        if include_analysis and self.analyses:
-            # Get the latest analysis
-            latest_analysis = sorted(self.analyses, key=lambda x: x.created_at, reverse=True)[0]
-            result['analysis'] = latest_analysis.to_dict()
+        if include_analysis:
+            latest_analysis = self.latest_analysis()
+            if latest_analysis:
+                result['analysis'] = latest_analysis.to_dict()
         
         return result
     
+    def latest_analysis(self):
+        """Get the most recent analysis of this deck (single indexed lookup), or None"""
+        return DeckAnalysis.query.filter_by(deck_id=self.id).order_by(
+            DeckAnalysis.created_at.desc(), DeckAnalysis.id.desc()
+        ).first()
+    
     def __repr__(self):
         return f'<Deck {self.id} (avg: {self.avg_elixir})>'
 
@@ -297,6 +458,11 @@ class DeckAnalysis(db.Model):
     # Relationships
     deck = db.relationship('Deck', back_populates='analyses')
     
+    # Latest-analysis lookups filter by deck and sort by time
+    __table_args__ = (
+        db.Index('ix_deck_analyses_deck_created', 'deck_id', 'created_at'),
+    )
+    
     def to_dict(self):
         """Convert analysis to dictionary"""
         return {
@@ -319,4 +485,154 @@ class DeckAnalysis(db.Model):
         }
     
     def __repr__(self):
-        return f'<DeckAnalysis {self.id} ({self.overall_rating})>'
\ No newline at end of file
+        return f'<DeckAnalysis {self.id} ({self.overall_rating})>'
+
+
+class AnalysisCacheEntry(db.Model):
+    """Content-addressed index of deck analyses by deck hash and analysis rule set"""
+    __tablename__ = 'analysis_cache'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    deck_hash = db.Column(db.String(64), nullable=False)
+    # DeckAnalyzer.analysis_version(): the thresholds and the deck's card features
+    thresholds_version = db.Column(db.String(16), nullable=False)
+    analysis_id = db.Column(db.Integer, db.ForeignKey('deck_analyses.id', ondelete='CASCADE'), nullable=False)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    analysis = db.relationship('DeckAnalysis')
+    
+    # Unique constraint
+    __table_args__ = (
+        db.UniqueConstraint('deck_hash', 'thresholds_version', name='unique_analysis_key'),
+    )
+    
+    def __repr__(self):
+        return f'<AnalysisCacheEntry {self.deck_hash[:8]} v{self.thresholds_version}>'
+
+
+class PlayerAccess(db.Model):
+    """Decayed access counts of players, fed by the web workers' frequency sketches"""
+    __tablename__ = 'player_access'
+    
+    player_tag = db.Column(db.String(20), primary_key=True)
+    # Forward-decayed: accesses weighted by when they happened (see services.hot_players.access_weight)
+    hits = db.Column(db.Float, nullable=False, default=0.0, index=True)
+    
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<PlayerAccess {self.player_tag} {self.hits:.3g}>'
+
+
+class Battle(db.Model):
+    """Battle model for deduplicated battles ingested from player battlelogs"""
+    __tablename__ = 'battles'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    battle_key = db.Column(db.String(64), unique=True, nullable=False, index=True)
+    battle_time = db.Column(db.DateTime, nullable=False, index=True)
+    battle_type = db.Column(db.String(50))
+    game_mode = db.Column(db.String(100))
+    arena_id = db.Column(db.Integer)
+    team_crowns = db.Column(db.Integer, default=0)
+    opponent_crowns = db.Column(db.Integer, default=0)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    decks = db.relationship('BattleDeck', back_populates='battle', cascade='all, delete-orphan')
+    
+    @staticmethod
+    def generate_key(battle_time, player_tags):
+        """Generate a stable key for a battle from its time and every participant's tag"""
+        key_string = f"{battle_time}|{'|'.join(sorted(player_tags))}"
+        return hashlib.sha256(key_string.encode()).hexdigest()
+    
+    def to_dict(self, include_decks=True):
+        """Convert battle to dictionary"""
+        result = {
+            'id': self.id,
+            'battle_time': self.battle_time.isoformat() if self.battle_time else None,
+            'battle_type': self.battle_type,
+            'game_mode': self.game_mode,
+            'arena_id': self.arena_id,
+            'team_crowns': self.team_crowns,
+            'opponent_crowns': self.opponent_crowns
+        }
+        
+        if include_decks:
+            result['decks'] = [bd.to_dict() for bd in self.decks]
+        
+        return result
+    
+    def __repr__(self):
+        return f'<Battle {self.id} ({self.battle_time})>'
+
+
+class BattleDeck(db.Model):
+    """BattleDeck model for the deck each participant played in a battle"""
+    __tablename__ = 'battle_decks'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    battle_id = db.Column(db.Integer, db.ForeignKey('battles.id', ondelete='CASCADE'), nullable=False, index=True)
+    side = db.Column(db.Enum('team', 'opponent'), nullable=False)
+    player_tag = db.Column(db.String(20), nullable=False, index=True)
+    crowns = db.Column(db.Integer, default=0)
+    card_ids = db.Column(db.JSON, nullable=False)  # API card ids in deck order
+    
+    # Relationships
+    battle = db.relationship('Battle', back_populates='decks')
+    
+    # Unique constraint
+    __table_args__ = (
+        db.UniqueConstraint('battle_id', 'player_tag', name='unique_battle_player'),
+    )
+    
+    def to_dict(self):
+        """Convert battle deck to dictionary"""
+        return {
+            'side': self.side,
+            'player_tag': self.player_tag,
+            'crowns': self.crowns,
+            'card_ids': self.card_ids
+        }
+    
+    def __repr__(self):
+        return f'<BattleDeck {self.player_tag} ({self.side})>'
+
+
+class BattleIngestState(db.Model):
+    """Per-player high-water mark of ingested battles"""
+    __tablename__ = 'battle_ingest_state'
+    
+    player_id = db.Column(db.Integer, db.ForeignKey('players.id', ondelete='CASCADE'), primary_key=True)
+    last_battle_time = db.Column(db.DateTime, nullable=False)
+    
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<BattleIngestState player={self.player_id} until={self.last_battle_time}>'
+
+
+class ReanalysisCheckpoint(db.Model):
+    """Progress of a bulk re-analysis run, per analysis rule set"""
+    __tablename__ = 'reanalysis_checkpoints'
+    
+    # DeckAnalyzer.thresholds_version of the run
+    thresholds_version = db.Column(db.String(16), primary_key=True)
+    last_deck_id = db.Column(db.Integer, nullable=False, default=0)
+    decks_analyzed = db.Column(db.Integer, nullable=False, default=0)
+    
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ReanalysisCheckpoint v{self.thresholds_version} after deck {self.last_deck_id}>'
+
+
+# Loader strategies for the hot serialization paths: the current deck, its
+# cards and their Card rows load in two SELECTs for any number of players
+# instead of lazily per player and per card
+DECK_CARDS_LOADER = selectinload(Deck.deck_cards).joinedload(DeckCard.card)
+PLAYER_DECK_LOADER = selectinload(Player.current_decks).options(DECK_CARDS_LOADER)
@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+"""
+Offline Clash Royale API replay server
+
+Serves the endpoints ClashRoyaleAPIService uses (/v1/players/{tag},
+/v1/players/{tag}/battlelog and /v1/cards) from recorded fixtures or
+deterministic synthetic data, with configurable latency and injected
+errors, so the Flask stack can be benchmarked and tested without network
+access or API quota.
+
+Recorded fixtures are read from --fixtures when present:
+    cards.json                  Raw /cards response
+    players/<TAG>.json          Raw /players/{tag} response (tag without #)
+    battlelogs/<TAG>.json       Raw /players/{tag}/battlelog response
+
+Usage:
+    python replay_server.py --port 8787 --latency-ms 40 --error-rate 0.01 --throttle-rate 0.02
+    CLASH_ROYALE_API_BASE_URL=http://localhost:8787/v1 flask run
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from flask import Flask, jsonify
+
+CARD_TYPES = ['Troop', 'Troop', 'Troop', 'Spell', 'Building']
+RARITIES = ['Common', 'Rare', 'Epic', 'Legendary', 'Champion']
+MAX_LEVELS = {'Common': 14, 'Rare': 12, 'Epic': 9, 'Legendary': 6, 'Champion': 4}
+SYNTHETIC_CARD_COUNT = 110
+BATTLELOG_SIZE = 25
+BATTLE_EPOCH = datetime(2024, 1, 1)
+
+
+class ReplayData:
+    """Recorded fixtures with a deterministic synthetic fallback"""
+    
+    def __init__(self, fixtures_dir: str = None, seed: int = 0, not_found_rate: float = 0.0):
+        """
+        Initialize the fixture source
+        
+        Args:
+            fixtures_dir: Directory with recorded responses (optional)
+            seed: Seed mixed into every synthetic response
+            not_found_rate: Fraction of synthetic tags that answer 404
+        """
+        self.fixtures_dir = fixtures_dir
+        self.seed = seed
+        self.not_found_rate = not_found_rate
+        self.cards = self._load_fixture('cards.json') or {'items': self._synthetic_cards()}
+    
+    def _load_fixture(self, *parts) -> Optional[object]:
+        """Load a recorded JSON response if it exists"""
+        if not self.fixtures_dir:
+            return None
+        path = os.path.join(self.fixtures_dir, *parts)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+    
+    def _rng(self, *key) -> random.Random:
+        """Random generator seeded from the server seed and a key"""
+        digest = hashlib.sha256('|'.join(map(str, (self.seed,) + key)).encode()).hexdigest()
+        return random.Random(int(digest[:16], 16))
+    
+    def _synthetic_cards(self) -> List[Dict]:
+        """Generate a stable card catalog"""
+        rng = self._rng('cards')
+        cards = []
+        for i in range(SYNTHETIC_CARD_COUNT):
+            card_type = rng.choice(CARD_TYPES)
+            rarity = RARITIES[min(int(rng.expovariate(1.2)), len(RARITIES) - 1)]
+            cards.append({
+                'id': (28000000 if card_type == 'Spell' else 27000000 if card_type == 'Building' else 26000000) + i,
+                'name': f'{card_type} {i}',
+                'maxLevel': MAX_LEVELS[rarity],
+                'elixirCost': max(1, min(9, int(rng.gauss(4, 1.5)))),
+                'rarity': rarity,
+                'type': card_type,
+                'iconUrls': {'medium': f'https://example.invalid/cards/{i}.png'}
+            })
+        return cards
+    
+    def _synthetic_deck(self, rng: random.Random) -> List[Dict]:
+        """Pick 8 distinct cards with levels"""
+        deck = []
+        for card in rng.sample(self.cards['items'], 8):
+            deck.append(dict(card, level=rng.randint(max(1, card['maxLevel'] - 4), card['maxLevel'])))
+        return deck
+    
+    def is_missing(self, tag: str) -> bool:
+        """Whether a synthetic tag should answer 404"""
+        return self._rng('missing', tag).random() < self.not_found_rate
+    
+    def player(self, tag: str) -> Optional[Dict]:
+        """Get a /players/{tag} response"""
+        recorded = self._load_fixture('players', f'{tag.lstrip("#")}.json')
+        if recorded is not None:
+            return recorded
+        if self.is_missing(tag):
+            return None
+        
+        rng = self._rng('player', tag)
+        wins = rng.randint(100, 8000)
+        trophies = rng.randint(1000, 9000)
+        return {
+            'tag': tag,
+            'name': f'Player {tag.lstrip("#")}',
+            'expLevel': rng.randint(10, 60),
+            'trophies': trophies,
+            'bestTrophies': trophies + rng.randint(0, 800),
+            'wins': wins,
+            'losses': rng.randint(100, 8000),
+            'battleCount': wins * 2,
+            'threeCrownWins': wins // rng.randint(3, 8),
+            'arena': {'id': 54000000 + trophies // 500, 'name': f'Arena {trophies // 500}'},
+            'clan': {'tag': f'#C{rng.randint(1000, 9999)}', 'name': f'Clan {rng.randint(1, 500)}'},
+            'currentDeck': self._synthetic_deck(self._rng('deck', tag)),
+            'currentFavouriteCard': rng.choice(self.cards['items'])
+        }
+    
+    def battlelog(self, tag: str) -> Optional[List[Dict]]:
+        """Get a /players/{tag}/battlelog response"""
+        recorded = self._load_fixture('battlelogs', f'{tag.lstrip("#")}.json')
+        if recorded is not None:
+            return recorded
+        if self.is_missing(tag):
+            return None
+        
+        rng = self._rng('battlelog', tag)
+        player_deck = self._synthetic_deck(self._rng('deck', tag))
+        battle_time = BATTLE_EPOCH + timedelta(minutes=rng.randint(0, 60 * 24 * 30))
+        battles = []
+        for _ in range(BATTLELOG_SIZE):
+            opponent_tag = f'#{rng.randint(10 ** 7, 10 ** 8 - 1):X}'
+            team_crowns, opponent_crowns = rng.randint(0, 3), rng.randint(0, 3)
+            battles.append({
+                'type': 'PvP',
+                'battleTime': battle_time.strftime('%Y%m%dT%H%M%S.000Z'),
+                'gameMode': {'id': 72000006, 'name': 'Ladder'},
+                'arena': {'id': 54000010, 'name': 'Arena 10'},
+                'team': [{'tag': tag, 'crowns': team_crowns, 'cards': player_deck}],
+                'opponent': [{'tag': opponent_tag, 'crowns': opponent_crowns, 'cards': self._synthetic_deck(rng)}]
+            })
+            battle_time -= timedelta(minutes=rng.randint(3, 120))
+        return battles
+
+
+def create_replay_app(data: ReplayData, latency_ms: float = 0, jitter_ms: float = 0,
+                      error_rate: float = 0.0, throttle_rate: float = 0.0,
+                      retry_after: int = 1, seed: int = 0) -> Flask:
+    """
+    Create the replay server application
+    
+    Args:
+        data: Fixture source
+        latency_ms: Base latency added to every response
+        jitter_ms: Uniform random latency added on top of latency_ms
+        error_rate: Fraction of requests answered with 503
+        throttle_rate: Fraction of requests answered with 429 and Retry-After
+        retry_after: Retry-After value (seconds) sent with injected 429s
+        seed: Seed for latency and fault injection
+    
+    Returns:
+        Flask: Replay server application
+    """
+    app = Flask(__name__)
+    rng = random.Random(seed)
+    rng_lock = threading.Lock()
+    stats = {'requests': 0, 'throttled': 0, 'errors': 0, 'not_found': 0}
+    
+    def inject():
+        """Apply latency and return an injected error response, if any"""
+        with rng_lock:
+            stats['requests'] += 1
+            delay = (latency_ms + rng.uniform(0, jitter_ms)) / 1000
+            roll = rng.random()
+            if roll < throttle_rate:
+                stats['throttled'] += 1
+            elif roll < throttle_rate + error_rate:
+                stats['errors'] += 1
+        if delay:
+            time.sleep(delay)
+        
+        if roll < throttle_rate:
+            response = jsonify({'reason': 'requestThrottled', 'message': 'Injected throttle'})
+            response.status_code = 429
+            response.headers['Retry-After'] = str(retry_after)
+            return response
+        if roll < throttle_rate + error_rate:
+            return jsonify({'reason': 'serviceUnavailable', 'message': 'Injected error'}), 503
+        return None
+    
+    def not_found():
+        with rng_lock:
+            stats['not_found'] += 1
+        return jsonify({'reason': 'notFound'}), 404
+    
+    @app.route('/v1/players/<path:player_tag>/battlelog')
+    def battlelog(player_tag):
+        injected = inject()
+        if injected is not None:
+            return injected
+        battles = data.battlelog(player_tag.upper())
+        return jsonify(battles) if battles is not None else not_found()
+    
+    @app.route('/v1/players/<path:player_tag>')
+    def player(player_tag):
+        injected = inject()
+        if injected is not None:
+            return injected
+        player_data = data.player(player_tag.upper())
+        return jsonify(player_data) if player_data is not None else not_found()
+    
+    @app.route('/v1/cards')
+    def cards():
+        injected = inject()
+        if injected is not None:
+            return injected
+        return jsonify(data.cards)
+    
+    @app.route('/_replay/stats')
+    def replay_stats():
+        return jsonify(stats)
+    
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline Clash Royale API replay server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8787)
+    parser.add_argument('--fixtures', default=None, help='Directory of recorded responses')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of 503 responses')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Fraction of 429 responses')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds on 429')
+    parser.add_argument('--not-found-rate', type=float, default=0.0, help='Fraction of unknown tags')
+    args = parser.parse_args()
+    
+    data = ReplayData(args.fixtures, seed=args.seed, not_found_rate=args.not_found_rate)
+    app = create_replay_app(
+        data,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+        seed=args.seed
+    )
+    print(f"Replay server on http://{args.host}:{args.port}/v1")
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,14 +2,17 @@
 Cards Routes
 Handles card data retrieval and management
 """
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from models import db, Card
-from services.clash_royale import get_api_service, ClashRoyaleAPIError
+from services.clash_royale import ClashRoyaleAPIError
+from services.card_catalog import get_card_catalog
+from services.query_budget import query_budget
 
 cards_bp = Blueprint('cards', __name__, url_prefix='/api/cards')
 
 
 @cards_bp.route('', methods=['GET'])
+@query_budget(1)
 def get_all_cards():
     """
     Get all cards from database
@@ -21,6 +24,8 @@ def get_all_cards():
     Returns:
         200: List of cards
         500: Server error
+    
+    Query budget: 1 statement
     """
     try:
         query = Card.query
@@ -52,7 +57,52 @@ def get_all_cards():
         }), 500
 
 
+@cards_bp.route('/catalog', methods=['GET'])
+@query_budget(2)
+def get_card_catalog_snapshot():
+    """
+    Get the full card catalog, versioned for client-side caching
+    
+    Player responses carry the catalog version as 'cardCatalogVersion'; the
+    version is also sent as the ETag, so clients revalidate with
+    If-None-Match and only download the catalog when it changed.
+    
+    Returns:
+        200: Catalog version and cards
+        304: Catalog unchanged since the version in If-None-Match
+        500: Server error
+    
+    Query budget: 2 statements (1 when answering 304)
+    """
+    try:
+        version = Card.catalog_version()
+        if version in request.if_none_match:
+            response = current_app.response_class(status=304)
+        else:
+            cards = Card.catalog()
+            response = jsonify({
+                'success': True,
+                'data': {
+                    'version': version,
+                    'cards': cards,
+                    'total': len(cards)
+                }
+            })
+        
+        response.set_etag(version)
+        response.cache_control.public = True
+        response.cache_control.max_age = current_app.config.get('CARD_CATALOG_MAX_AGE', 300)
+        return response
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Failed to fetch card catalog: {str(e)}'
+        }), 500
+
+
 @cards_bp.route('/<int:card_id>', methods=['GET'])
+@query_budget(1)
 def get_card(card_id):
     """
     Get specific card by ID
@@ -63,6 +113,8 @@ def get_card(card_id):
     Returns:
         200: Card data
         404: Card not found
+    
+    Query budget: 1 statement
     """
     card = Card.query.get(card_id)
     
@@ -89,15 +141,12 @@ def sync_cards():
         500: Sync failed
     """
     try:
-        api_service = get_api_service()
-        api_cards = api_service.get_cards()
+        catalog_cards = get_card_catalog().all()
         
         synced_count = 0
         updated_count = 0
         
-        for api_card in api_cards:
-            parsed_card = api_service.parse_card_data(api_card)
-            
+        for parsed_card in catalog_cards:
             # Check if card exists
             card = Card.query.filter_by(card_id=parsed_card['card_id']).first()
             
@@ -150,6 +199,7 @@ def sync_cards():
 
 
 @cards_bp.route('/statistics', methods=['GET'])
+@query_budget(1)
 def get_card_statistics():
     """
     Get card usage statistics
@@ -157,6 +207,8 @@ def get_card_statistics():
     Returns:
         200: Card statistics
         500: Server error
+    
+    Query budget: 1 statement
     """
     try:
         from sqlalchemy import func
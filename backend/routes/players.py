@@ -2,14 +2,38 @@
 Player Routes
 Handles player data retrieval and deck analysis
 """
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from services.player_service import PlayerService
-from services.clash_royale import ClashRoyaleAPIError
+from services.clash_royale import ClashRoyaleAPIError, ClashRoyaleNotFoundError, is_valid_tag
+from services.query_budget import query_budget
+from models import Card
 
 player_bp = Blueprint('player', __name__, url_prefix='/api/players')
 
 
+def _include_catalog() -> bool:
+    """Whether the request opted into the legacy embedded card catalog"""
+    return request.args.get('include_catalog', 'false').lower() == 'true'
+
+
+def _with_catalog(players: list) -> list:
+    """
+    Embed the full card catalog in player payloads (legacy 'cards' shape)
+    
+    Payloads are copied because service results may be shared between requests.
+    
+    Args:
+        players: Player dictionaries
+    
+    Returns:
+        list: Copies of the player dictionaries with 'cards' set
+    """
+    catalog = Card.catalog()
+    return [dict(player, cards=catalog) for player in players]
+
+
 @player_bp.route('/<player_tag>', methods=['GET'])
+@query_budget(14)
 def get_player(player_tag):
     """
     Get player information
@@ -19,16 +43,24 @@ def get_player(player_tag):
     
     Query params:
         refresh: Force refresh from API (true/false)
+        include_catalog: Embed the full card catalog as 'cards' (true/false)
     
     Returns:
         200: Player data
         400: Invalid request
         404: Player not found
         500: Server error
+    
+    Query budget: 14 statements for a fetch storing a new deck and its
+    missing cards (4 when served from cache: player, current deck, deck
+    cards with their cards, catalog version; plus the catalog with
+    include_catalog)
     """
     try:
         force_refresh = request.args.get('refresh', 'false').lower() == 'true'
         player_data = PlayerService.get_or_create_player(player_tag, force_refresh=force_refresh)
+        if _include_catalog():
+            player_data = _with_catalog([player_data])[0]
         
         return jsonify({
             'success': True,
@@ -39,7 +71,7 @@ def get_player(player_tag):
         return jsonify({
             'success': False,
             'error': str(e)
-        }), 404 if 'not found' in str(e).lower() else 400
+        }), 404 if isinstance(e, ClashRoyaleNotFoundError) else 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -48,6 +80,7 @@ def get_player(player_tag):
 
 
 @player_bp.route('/<player_tag>/analyze', methods=['GET'])
+@query_budget(21)
 def analyze_player_deck(player_tag):
     """
     Analyze player's current deck
@@ -55,11 +88,19 @@ def analyze_player_deck(player_tag):
     Args:
         player_tag: Player tag (with or without #)
     
+    Query params:
+        include_catalog: Embed the full card catalog in the player as 'cards' (true/false)
+    
     Returns:
         200: Analysis results
         400: Invalid request
         404: Player or deck not found
         500: Server error
+    
+    Query budget: 21 statements (forced player refresh as GET /<player_tag>,
+    the reloaded deck, the card table when the catalog changed, and the
+    stored analysis lookup and inserts; 12 when the deck is known and its
+    analysis cached)
     """
     try:
         # First ensure player data is fetched
@@ -69,10 +110,12 @@ def analyze_player_deck(player_tag):
             return jsonify({
                 'success': False,
                 'error': str(e)
-            }), 404 if 'not found' in str(e).lower() else 400
+            }), 404 if isinstance(e, ClashRoyaleNotFoundError) else 400
         
         # Analyze deck
         analysis_data = PlayerService.analyze_player_deck(player_tag)
+        if _include_catalog():
+            analysis_data = dict(analysis_data, player=_with_catalog([analysis_data['player']])[0])
         
         return jsonify({
             'success': True,
@@ -91,22 +134,184 @@ def analyze_player_deck(player_tag):
         }), 500
 
 
+@player_bp.route('/<player_tag>/improvements', methods=['GET'])
+@query_budget(15)
+def suggest_deck_improvements(player_tag):
+    """
+    Find the card swaps that most improve a player's current deck rating
+    
+    Every single and double swap against the full card catalog is scored.
+    
+    Args:
+        player_tag: Player tag (with or without #)
+    
+    Query params:
+        limit: Maximum number of swaps (default: 5, at most 50)
+        max_swaps: Largest number of cards replaced at once (1 or 2, default: 2)
+    
+    Returns:
+        200: Current score and rating with the best swaps
+        400: Invalid request
+        404: Player or deck not found
+        500: Server error
+        503: Optimizer unavailable (NumPy not installed)
+    
+    Query budget: 15 statements (player lookup as GET /<player_tag>, the
+    deck's card ids, and the card table when the catalog changed; 5 when
+    the player is served from cache)
+    """
+    try:
+        try:
+            limit = int(request.args.get('limit', 5))
+            max_swaps = int(request.args.get('max_swaps', 2))
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'error': 'Invalid limit or max_swaps parameter'
+            }), 400
+        
+        if limit < 1 or limit > 50:
+            return jsonify({
+                'success': False,
+                'error': 'Limit must be between 1 and 50'
+            }), 400
+        
+        if max_swaps not in (1, 2):
+            return jsonify({
+                'success': False,
+                'error': 'max_swaps must be 1 or 2'
+            }), 400
+        
+        try:
+            PlayerService.get_or_create_player(player_tag)
+        except ClashRoyaleAPIError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 404 if isinstance(e, ClashRoyaleNotFoundError) else 400
+        
+        return jsonify({
+            'success': True,
+            'data': PlayerService.suggest_deck_swaps(player_tag, limit=limit, max_swaps=max_swaps)
+        }), 200
+        
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 404
+    except RuntimeError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 503
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Failed to optimize deck: {str(e)}'
+        }), 500
+
+
+@player_bp.route('/<player_tag>/similar-decks', methods=['GET'])
+@query_budget(18)
+def find_similar_decks(player_tag):
+    """
+    Find the stored decks most similar to a player's current deck
+    
+    Decks are ranked by Jaccard similarity of their card sets, using the
+    in-memory deck index.
+    
+    Args:
+        player_tag: Player tag (with or without #)
+    
+    Query params:
+        limit: Maximum number of decks (default: 10, at most 50)
+    
+    Returns:
+        200: Similar decks with their players, similarity and shared card count
+        400: Invalid request
+        404: Player or deck not found
+        500: Server error
+        503: Search unavailable (NumPy not installed)
+    
+    Query budget: 18 statements (player lookup as GET /<player_tag>, the
+    deck's card ids, one chunk of index sync, and the matched decks with
+    their players and cards; 7 when the player is cached and the index
+    synced); a larger sync backlog continues in the background.
+    """
+    try:
+        try:
+            limit = int(request.args.get('limit', 10))
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'error': 'Invalid limit parameter'
+            }), 400
+        
+        if limit < 1 or limit > 50:
+            return jsonify({
+                'success': False,
+                'error': 'Limit must be between 1 and 50'
+            }), 400
+        
+        try:
+            PlayerService.get_or_create_player(player_tag)
+        except ClashRoyaleAPIError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 404 if isinstance(e, ClashRoyaleNotFoundError) else 400
+        
+        return jsonify({
+            'success': True,
+            'data': PlayerService.find_similar_decks(player_tag, limit=limit)
+        }), 200
+        
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 404
+    except RuntimeError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 503
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Failed to find similar decks: {str(e)}'
+        }), 500
+
+
 @player_bp.route('', methods=['GET'])
+@query_budget(6)
 def list_players():
     """
     Get list of all players with pagination
     
+    Pass the previous page's next_cursor as cursor to page through the
+    listing at constant cost; offset still works for existing clients.
+    total is an approximate count refreshed every PLAYER_COUNT_TTL seconds.
+    
     Query params:
         limit: Number of players per page (default: 20)
-        offset: Offset for pagination (default: 0)
+        cursor: Cursor from the previous page's next_cursor
+        offset: Offset for pagination (default: 0, ignored with cursor)
+        include_catalog: Embed the full card catalog in each player as 'cards' (true/false)
     
     Returns:
         200: List of players
         400: Invalid parameters
+    
+    Query budget: 6 statements for any page size or position (page, current
+    decks, deck cards, catalog version, the first count, and the catalog
+    with include_catalog)
     """
     try:
         limit = int(request.args.get('limit', 20))
         offset = int(request.args.get('offset', 0))
+        cursor = request.args.get('cursor') or None
         
         if limit < 1 or limit > 100:
             return jsonify({
@@ -120,7 +325,9 @@ def list_players():
                 'error': 'Offset must be non-negative'
             }), 400
         
-        result = PlayerService.get_all_players(limit=limit, offset=offset)
+        result = PlayerService.get_all_players(limit=limit, offset=offset, cursor=cursor)
+        if _include_catalog():
+            result = dict(result, players=_with_catalog(result['players']))
         
         return jsonify({
             'success': True,
@@ -130,7 +337,7 @@ def list_players():
     except ValueError:
         return jsonify({
             'success': False,
-            'error': 'Invalid limit or offset parameter'
+            'error': 'Invalid limit, offset or cursor parameter'
         }), 400
     except Exception as e:
         return jsonify({
@@ -139,17 +346,85 @@ def list_players():
         }), 500
 
 
+@player_bp.route('/batch', methods=['POST'])
+@query_budget(506)
+def batch_players():
+    """
+    Get several players in one request
+    
+    Request body:
+        {
+            "tags": ["#ABC123", "DEF456", ...]
+        }
+    
+    Query params:
+        include_catalog: Embed the full card catalog in each player as 'cards' (true/false)
+    
+    Returns:
+        200: Per-tag results (each with success and data or error)
+        400: Missing or too many tags
+        500: Server error
+    
+    Query budget: 506 statements, i.e. 6 plus 10 per fetched tag for
+    PLAYER_BATCH_MAX_TAGS (50) tags. Every tag cached costs 4 (players,
+    current decks, deck cards, catalog version; plus the catalog with
+    include_catalog); fetching adds a reload of the results and, per
+    fetched tag, its savepoint, writes and any missing cards.
+    """
+    data = request.get_json(silent=True) or {}
+    tags = data.get('tags')
+    max_tags = current_app.config.get('PLAYER_BATCH_MAX_TAGS', 50)
+    
+    if not isinstance(tags, list) or not tags or not all(isinstance(tag, str) and tag.strip() for tag in tags):
+        return jsonify({
+            'success': False,
+            'error': 'tags must be a non-empty list of player tags'
+        }), 400
+    
+    if len(tags) > max_tags:
+        return jsonify({
+            'success': False,
+            'error': f'At most {max_tags} tags can be requested at once'
+        }), 400
+    
+    try:
+        results = PlayerService.get_or_create_players(tags)
+        if _include_catalog():
+            embedded = iter(_with_catalog([result['data'] for result in results if result.get('success')]))
+            results = [dict(result, data=next(embedded)) if result.get('success') else result for result in results]
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'results': results,
+                'total': len(results)
+            }
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Failed to fetch players: {str(e)}'
+        }), 500
+
+
 @player_bp.route('/search', methods=['GET'])
+@query_budget(14)
 def search_players():
     """
     Search players by tag or name
     
     Query params:
         q: Search query (player tag or name)
+        include_catalog: Embed the full card catalog in each player as 'cards' (true/false)
     
     Returns:
         200: Search results
         400: Missing query parameter
+    
+    Query budget: 14 statements for a tag match (see get_player), 5 for a
+    name search (index lookup, players, current decks, deck cards, catalog
+    version)
     """
     query = request.args.get('q', '').strip()
     
@@ -160,28 +435,28 @@ def search_players():
         }), 400
     
     try:
-        # Try to fetch as player tag
-        if query.startswith('#') or len(query) <= 15:
+        # Try to fetch as player tag; anything outside the tag alphabet is a name
+        if is_valid_tag(PlayerService.normalize_tag(query)):
             try:
                 player_data = PlayerService.get_or_create_player(query)
+                players = [player_data]
                 return jsonify({
                     'success': True,
                     'data': {
-                        'players': [player_data],
+                        'players': _with_catalog(players) if _include_catalog() else players,
                         'total': 1
                     }
                 }), 200
             except ClashRoyaleAPIError:
                 pass
         
-        # Search in database by name
-        from models import Player
-        players = Player.query.filter(Player.name.ilike(f'%{query}%')).limit(10).all()
+        # Search in database by name (ranked, word-prefix matching)
+        players = PlayerService.search_players_by_name(query, limit=10)
         
         return jsonify({
             'success': True,
             'data': {
-                'players': [p.to_dict() for p in players],
+                'players': _with_catalog(players) if _include_catalog() else players,
                 'total': len(players)
             }
         }), 200
@@ -0,0 +1,189 @@
+"""
+Adaptive Player TTL
+Per-player cache durations scaled by how often the player's stats change
+"""
+import threading
+from typing import Dict, List, Optional, Tuple
+from flask import current_app
+from sqlalchemy import Integer, case, cast, func, or_
+
+
+def ttl_bounds() -> Tuple[int, int]:
+    """
+    Get the configured (minimum, maximum) player cache durations
+    
+    Returns:
+        Tuple[int, int]: Seconds for the most and the least active players
+    """
+    config = current_app.config
+    min_ttl = config.get('PLAYER_CACHE_MIN_DURATION', 60)
+    max_ttl = max(min_ttl, config.get('PLAYER_CACHE_MAX_DURATION', 1800))
+    return min_ttl, max_ttl
+
+
+def ttl_for_activity(activity: float) -> int:
+    """
+    Scale an activity score in [0, 1] to a cache duration
+    
+    Args:
+        activity: Smoothed fraction of fetches that found changed stats
+    
+    Returns:
+        int: Seconds, from the maximum (dormant) down to the minimum (always changing)
+    """
+    min_ttl, max_ttl = ttl_bounds()
+    return int(max_ttl - (max_ttl - min_ttl) * activity)
+
+
+def initial_activity() -> float:
+    """
+    Activity assumed for players without history
+    
+    Chosen so new players start at PLAYER_CACHE_DURATION.
+    
+    Returns:
+        float: Activity score in [0, 1]
+    """
+    min_ttl, max_ttl = ttl_bounds()
+    if max_ttl == min_ttl:
+        return 0.0
+    base = current_app.config.get('PLAYER_CACHE_DURATION', 300)
+    return min(1.0, max(0.0, (max_ttl - base) / (max_ttl - min_ttl)))
+
+
+def activity_updates(table, new) -> List[Tuple[str, object]]:
+    """
+    Build upsert assignments that update a player's fetch history
+    
+    A fetch counts as a change when battle_count or trophies differ from
+    the stored row. Activity is an exponential moving average of changes
+    (PLAYER_ACTIVITY_SMOOTHING weighs the newest fetch) and cache_ttl is
+    derived from it. Every expression reads only the stored row's previous
+    values, so the assignments must precede those of the stat columns (MySQL
+    applies ON DUPLICATE KEY UPDATE assignments in order).
+    
+    Args:
+        table: Player table
+        new: The incoming row (excluded or inserted)
+    
+    Returns:
+        List[Tuple[str, object]]: Ordered (column, expression) pairs
+    """
+    min_ttl, max_ttl = ttl_bounds()
+    smoothing = current_app.config.get('PLAYER_ACTIVITY_SMOOTHING', 0.3)
+    
+    changed = or_(table.c.battle_count != new.battle_count, table.c.trophies != new.trophies)
+    activity = (
+        func.coalesce(table.c.activity, initial_activity()) * (1 - smoothing)
+        + case((changed, smoothing), else_=0.0)
+    )
+    return [
+        ('cache_ttl', cast(max_ttl - (max_ttl - min_ttl) * activity, Integer)),
+        ('activity', activity),
+        ('change_count', func.coalesce(table.c.change_count, 0) + case((changed, 1), else_=0)),
+        ('fetch_count', func.coalesce(table.c.fetch_count, 0) + 1)
+    ]
+
+
+def initial_history() -> Dict:
+    """
+    History columns of a newly inserted player
+    
+    Returns:
+        Dict: Column values
+    """
+    activity = initial_activity()
+    return {
+        'activity': activity,
+        'cache_ttl': ttl_for_activity(activity),
+        'fetch_count': 1,
+        'change_count': 0
+    }
+
+
+def player_ttl(player) -> int:
+    """
+    Get a stored player's cache duration
+    
+    Args:
+        player: Player object
+    
+    Returns:
+        int: Seconds (PLAYER_CACHE_DURATION for rows without history)
+    """
+    if player.cache_ttl is None:
+        return current_app.config.get('PLAYER_CACHE_DURATION', 300)
+    return player.cache_ttl
+
+
+class AdaptiveTTLStats:
+    """
+    Hit ratio of player lookups and API calls saved by adaptive TTLs
+    
+    Savings are counted against the fixed PLAYER_CACHE_DURATION: a hit on a
+    player older than it is a fetch saved, a fetch of a player younger than
+    it is an extra fetch.
+    """
+    
+    def __init__(self, base_ttl: int):
+        """
+        Initialize the counters
+        
+        Args:
+            base_ttl: Fixed cache duration compared against
+        """
+        self.base_ttl = base_ttl
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.first_fetches = 0
+        self.saved = 0
+        self.extra = 0
+    
+    def record_hit(self, age: float) -> None:
+        """Count a lookup served from the database"""
+        with self.lock:
+            self.hits += 1
+            if age > self.base_ttl:
+                self.saved += 1
+    
+    def record_fetch(self, age: Optional[float]) -> None:
+        """Count a lookup that fetched from the API (age None for unknown players)"""
+        with self.lock:
+            if age is None:
+                self.first_fetches += 1
+                return
+            self.misses += 1
+            if age <= self.base_ttl:
+                self.extra += 1
+    
+    def get_stats(self) -> Dict:
+        """Get hit ratio and quota counters"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'first_fetches': self.first_fetches,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+                'fetches_saved': self.saved,
+                'extra_fetches': self.extra,
+                'quota_saved': self.saved - self.extra
+            }
+
+
+# Singleton instance
+_ttl_stats = None
+_ttl_stats_lock = threading.Lock()
+
+
+def get_ttl_stats() -> AdaptiveTTLStats:
+    """Get or create the adaptive TTL statistics singleton"""
+    global _ttl_stats
+    if _ttl_stats is None:
+        with _ttl_stats_lock:
+            if _ttl_stats is None:
+                _ttl_stats = AdaptiveTTLStats(
+                    base_ttl=current_app.config.get('PLAYER_CACHE_DURATION', 300)
+                )
+    return _ttl_stats
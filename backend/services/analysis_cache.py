@@ -0,0 +1,186 @@
+"""
+Analysis Cache
+Content-addressed deck analyses shared by every player running the same deck
+"""
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from models import db, Deck, DeckAnalysis, AnalysisCacheEntry
+from services.card_features import CardFeatureTable, get_card_table
+from services.deck_analyzer import DeckAnalyzer
+from services.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+def analysis_columns(analysis_result: Dict) -> Dict:
+    """
+    Map an analyzer result to DeckAnalysis column values
+    
+    Args:
+        analysis_result: Result of DeckAnalyzer.analyze_deck (or its variants)
+    
+    Returns:
+        Dict: Column values, without deck_id
+    """
+    metrics = analysis_result['metrics']
+    return {
+        'avg_elixir': metrics['avg_elixir'],
+        'air_targeting_count': metrics['air_targeting_count'],
+        'splash_damage_count': metrics['splash_damage_count'],
+        'win_condition_count': metrics['win_condition_count'],
+        'light_spell_count': metrics['light_spell_count'],
+        'heavy_spell_count': metrics['heavy_spell_count'],
+        'tank_count': metrics['tank_count'],
+        'strengths': analysis_result['strengths'],
+        'weaknesses': analysis_result['weaknesses'],
+        'suggestions': analysis_result['suggestions'],
+        'overall_rating': analysis_result['overall_rating']
+    }
+
+
+class AnalysisCache:
+    """
+    LRU of serialized analyses keyed by (deck_hash, analysis version)
+    
+    An analysis depends only on the deck's cards, their features and the
+    analyzer thresholds, so it is computed once per key. Misses fall through
+    to the analysis_cache table, and only then to the analyzer. Changing
+    ANALYSIS_THRESHOLDS changes every deck's version, and a card sync
+    changing a card's elixir cost or roles changes the version of the decks
+    holding it (DeckAnalyzer.analysis_version), so older entries are simply
+    never looked up again. Cached dictionaries are shared between callers
+    and must not be mutated.
+    """
+    
+    def __init__(self, max_entries: int):
+        """
+        Initialize the cache
+        
+        Args:
+            max_entries: Number of analyses kept in memory
+        """
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self._entries: 'OrderedDict[Hashable, Dict]' = OrderedDict()
+        self._flight = SingleFlight()
+        self.hits = 0
+        self.db_hits = 0
+        self.computed = 0
+    
+    def _get(self, key: Tuple[str, str]) -> Optional[Dict]:
+        """Look up a key in memory, marking it most recently used"""
+        with self.lock:
+            analysis = self._entries.get(key)
+            if analysis is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return analysis
+    
+    def _put(self, key: Tuple[str, str], analysis: Dict) -> None:
+        """Store an analysis in memory, evicting the least recently used"""
+        with self.lock:
+            self._entries[key] = analysis
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def get_or_compute(self, deck: Deck, analyzer: DeckAnalyzer) -> Dict:
+        """
+        Get the analysis of a deck, computing and storing it on first use
+        
+        Args:
+            deck: Deck with its deck cards (and their cards) loaded
+            analyzer: Analyzer whose analysis version keys the cache
+        
+        Returns:
+            Dict: Serialized DeckAnalysis
+        
+        Raises:
+            ValueError: If the deck does not have exactly 8 cards
+        """
+        table = get_card_table()
+        card_ids = [dc.card_id for dc in deck.deck_cards]
+        key = (deck.deck_hash, analyzer.analysis_version(card_ids, table))
+        analysis = self._get(key)
+        if analysis is not None:
+            return analysis
+        
+        # Players with the same deck missing at once share one load or computation
+        analysis = self._flight.do(key, lambda: self._load_or_compute(key, deck, card_ids, analyzer, table))
+        self._put(key, analysis)
+        return analysis
+    
+    def _load(self, key: Tuple[str, str]) -> Optional[Dict]:
+        """Read a stored analysis for a key"""
+        entry = AnalysisCacheEntry.query.options(joinedload(AnalysisCacheEntry.analysis)).filter_by(
+            deck_hash=key[0], thresholds_version=key[1]
+        ).first()
+        return entry.analysis.to_dict() if entry else None
+    
+    def _load_or_compute(self, key: Tuple[str, str], deck: Deck, card_ids: List[int],
+                         analyzer: DeckAnalyzer, table: CardFeatureTable) -> Dict:
+        """Read the analysis from the table, or run the analyzer and store it"""
+        analysis = self._load(key)
+        if analysis is not None:
+            with self.lock:
+                self.db_hits += 1
+            return analysis
+        
+        analysis_result = analyzer.analyze_card_ids(card_ids, table)
+        # Callers commit their own work before analyzing, so a failed insert can roll back the session
+        deck_analysis = DeckAnalysis(deck_id=deck.id, **analysis_columns(analysis_result))
+        try:
+            db.session.add(deck_analysis)
+            db.session.flush()
+            db.session.add(AnalysisCacheEntry(
+                deck_hash=key[0],
+                thresholds_version=key[1],
+                analysis_id=deck_analysis.id
+            ))
+            db.session.flush()
+            analysis = deck_analysis.to_dict()
+            db.session.commit()
+        except IntegrityError:
+            # Another process stored this key first; serve its analysis
+            db.session.rollback()
+            logger.info(f"Analysis for deck {key[0][:8]} stored concurrently, reusing it")
+            analysis = self._load(key)
+            if analysis is None:
+                raise
+        
+        with self.lock:
+            self.computed += 1
+        return analysis
+    
+    def get_stats(self) -> Dict:
+        """Get cache size and hit counters"""
+        with self.lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'db_hits': self.db_hits,
+                'computed': self.computed
+            }
+
+
+# Singleton instance
+_analysis_cache = None
+_analysis_cache_lock = threading.Lock()
+
+
+def get_analysis_cache() -> AnalysisCache:
+    """Get or create the analysis cache singleton"""
+    global _analysis_cache
+    if _analysis_cache is None:
+        with _analysis_cache_lock:
+            if _analysis_cache is None:
+                _analysis_cache = AnalysisCache(
+                    max_entries=current_app.config.get('ANALYSIS_CACHE_SIZE', 1024)
+                )
+    return _analysis_cache
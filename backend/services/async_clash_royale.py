@@ -0,0 +1,302 @@
+"""
+Async Clash Royale API Service
+asyncio-based sibling of ClashRoyaleAPIService for concurrent fan-out fetches
+"""
+import asyncio
+import logging
+import threading
+from typing import Dict, List, Union
+from flask import current_app
+from services.clash_royale import (
+    ClashRoyaleAPIError, ClashRoyaleUnavailableError, ClashRoyaleAPIService, check_status, is_retryable_status
+)
+from services.circuit_breaker import get_circuit_breaker
+from services.rate_limiter import get_rate_limiter, parse_retry_after, backoff_delay
+
+logger = logging.getLogger(__name__)
+
+try:
+    import aiohttp
+except ImportError as e:
+    logger.warning("aiohttp not installed: %s", e)
+    aiohttp = None
+
+
+class AsyncClashRoyaleAPIService:
+    """Async service for interacting with Clash Royale API"""
+    
+    def __init__(self, api_key: str = None, base_url: str = None, timeout: int = None,
+                 max_concurrency: int = None):
+        """
+        Initialize the async API service
+        
+        Args:
+            api_key: Clash Royale API key
+            base_url: Base URL for the API (defaults to RoyaleAPI proxy)
+            timeout: Request timeout in seconds
+            max_concurrency: Maximum number of in-flight requests per event loop
+        """
+        if aiohttp is None:
+            raise RuntimeError("aiohttp is required for the async Clash Royale client")
+        
+        config = current_app.config
+        self.api_key = (api_key or config.get('CLASH_ROYALE_API_KEY', '')).strip()
+        self.base_url = base_url or current_app.config.get('CLASH_ROYALE_API_BASE_URL', 'https://proxy.royaleapi.dev/v1')
+        self.timeout = timeout or config.get('CLASH_ROYALE_API_TIMEOUT', 10)
+        self.max_concurrency = max_concurrency or config.get('CLASH_ROYALE_API_MAX_CONCURRENCY', 10)
+        self.pool_maxsize = config.get('CLASH_ROYALE_API_POOL_MAXSIZE', 10)
+        
+        if not self.api_key:
+            raise ValueError("Clash Royale API key is required")
+        
+        self.headers = {
+            'Authorization': f'Bearer {self.api_key}',
+            'Accept': 'application/json'
+        }
+        
+        # Shares the process-wide token bucket with the sync client
+        self.rate_limiter = get_rate_limiter()
+        self.circuit_breaker = get_circuit_breaker()
+        self.max_queue_wait = config.get('CLASH_ROYALE_API_MAX_QUEUE_WAIT', 5)
+        self.status_retries = config.get('CLASH_ROYALE_API_STATUS_RETRIES', 3)
+        self.backoff_base = config.get('CLASH_ROYALE_API_BACKOFF_BASE', 0.5)
+        self.backoff_max = config.get('CLASH_ROYALE_API_BACKOFF_MAX', 8)
+        
+        # aiohttp sessions and semaphores are bound to the loop that created them
+        self._state = threading.local()
+    
+    def _get_session(self) -> 'aiohttp.ClientSession':
+        """Get the client session for the running event loop, creating it if needed"""
+        loop = asyncio.get_running_loop()
+        if getattr(self._state, 'loop', None) is not loop or self._state.session.closed:
+            connector = aiohttp.TCPConnector(limit_per_host=self.pool_maxsize)
+            self._state.session = aiohttp.ClientSession(
+                headers=self.headers,
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+            self._state.semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._state.loop = loop
+        return self._state.session
+    
+    async def close(self) -> None:
+        """Close the client session bound to the running event loop"""
+        session = getattr(self._state, 'session', None)
+        if session is not None and getattr(self._state, 'loop', None) is asyncio.get_running_loop():
+            await session.close()
+        self._state.loop = None
+        self._state.session = None
+    
+    async def _make_request(self, endpoint: str, params: Dict = None,
+                            not_found_message: str = "Resource not found") -> Dict:
+        """
+        Make a request to the Clash Royale API
+        
+        Args:
+            endpoint: API endpoint (e.g., '/players/%23ABC123')
+            params: Query parameters
+            not_found_message: Error message if the API answers 404
+        
+        Returns:
+            Dict: API response data
+        
+        Raises:
+            ClashRoyaleAPIError: If API request fails
+        """
+        url = f"{self.base_url}{endpoint}"
+        session = self._get_session()
+        
+        allowed, is_trial = self.circuit_breaker.acquire()
+        if not allowed:
+            raise ClashRoyaleUnavailableError("Clash Royale API temporarily unavailable")
+        upstream_healthy = None
+        
+        try:
+            async with self._state.semaphore:
+                attempt = 0
+                while True:
+                    wait = self.rate_limiter.reserve(max_wait=self.max_queue_wait)
+                    if wait is None:
+                        raise ClashRoyaleAPIError("API rate limit exceeded")
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                    
+                    async with session.get(url, params=params) as response:
+                        if is_retryable_status(response.status) and attempt < self.status_retries:
+                            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                        else:
+                            upstream_healthy = response.status < 500
+                            check_status(response.status, not_found_message)
+                            return await response.json(content_type=None)
+                    
+                    await asyncio.sleep(backoff_delay(attempt, self.backoff_base, self.backoff_max, retry_after))
+                    attempt += 1
+        
+        except asyncio.TimeoutError:
+            upstream_healthy = False
+            raise ClashRoyaleUnavailableError("API request timed out")
+        except aiohttp.ClientConnectionError:
+            upstream_healthy = False
+            raise ClashRoyaleUnavailableError("Failed to connect to Clash Royale API")
+        except aiohttp.ClientError as e:
+            upstream_healthy = False
+            logger.error(f"Clash Royale API request failed: {str(e)}")
+            raise ClashRoyaleUnavailableError("Clash Royale API request failed. Please try again later.")
+        finally:
+            if upstream_healthy is True:
+                self.circuit_breaker.record_success(is_trial)
+            elif upstream_healthy is False:
+                self.circuit_breaker.record_failure(is_trial)
+            else:
+                self.circuit_breaker.release(is_trial)
+    
+    async def get_player(self, player_tag: str) -> Dict:
+        """
+        Get player information
+        
+        Args:
+            player_tag: Player tag (with or without #)
+        
+        Returns:
+            Dict: Player data
+        
+        Raises:
+            ClashRoyaleAPIError: If request fails
+        """
+        formatted_tag = ClashRoyaleAPIService.format_player_tag(player_tag)
+        return await self._make_request(f'/players/{formatted_tag}', not_found_message="Player not found")
+    
+    async def get_player_battles(self, player_tag: str) -> List[Dict]:
+        """
+        Get player's recent battles
+        
+        Args:
+            player_tag: Player tag (with or without #)
+        
+        Returns:
+            List[Dict]: List of recent battles
+        
+        Raises:
+            ClashRoyaleAPIError: If request fails
+        """
+        formatted_tag = ClashRoyaleAPIService.format_player_tag(player_tag)
+        return await self._make_request(
+            f'/players/{formatted_tag}/battlelog', not_found_message="Battle log not found"
+        )
+    
+    async def get_cards(self) -> List[Dict]:
+        """
+        Get all available cards
+        
+        Returns:
+            List[Dict]: List of all cards
+        
+        Raises:
+            ClashRoyaleAPIError: If request fails
+        """
+        response = await self._make_request('/cards', not_found_message="Card catalog not found")
+        return response.get('items', [])
+    
+    async def gather_players(self, player_tags: List[str]) -> Dict[str, Union[Dict, ClashRoyaleAPIError]]:
+        """
+        Fetch several players concurrently
+        
+        Concurrency is bounded by max_concurrency; a failed lookup does not
+        cancel the others.
+        
+        Args:
+            player_tags: Player tags (with or without #)
+        
+        Returns:
+            Dict: Maps each tag as given to its player data or the ClashRoyaleAPIError raised
+        """
+        return await self._gather(self.get_player, player_tags)
+    
+    async def gather_battles(self, player_tags: List[str]) -> Dict[str, Union[List[Dict], ClashRoyaleAPIError]]:
+        """
+        Fetch several players' battlelogs concurrently
+        
+        Args:
+            player_tags: Player tags (with or without #)
+            
+        Returns:
+            Dict: Maps each tag as given to its battlelog or the ClashRoyaleAPIError raised
+        """
+        return await self._gather(self.get_player_battles, player_tags)
+    
+    async def _gather(self, fetch, player_tags: List[str]) -> Dict:
+        """Run fetch for every tag concurrently, collecting API errors per tag"""
+        results = await asyncio.gather(
+            *(fetch(tag) for tag in player_tags),
+            return_exceptions=True
+        )
+        
+        gathered = {}
+        for tag, result in zip(player_tags, results):
+            if isinstance(result, BaseException) and not isinstance(result, ClashRoyaleAPIError):
+                raise result
+            gathered[tag] = result
+        return gathered
+    
+    def run_sync(self, coro_factory):
+        """
+        Run a coroutine from synchronous code (Flask routes, CLI commands)
+        
+        A private event loop is used for the call and the session it opened is
+        closed afterwards. If the calling thread already runs a loop, the work
+        is moved to a helper thread.
+        
+        Args:
+            coro_factory: Callable taking this service and returning a coroutine
+        
+        Returns:
+            The coroutine's result
+        """
+        async def runner():
+            try:
+                return await coro_factory(self)
+            finally:
+                await self.close()
+        
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(runner())
+        
+        result = {}
+        
+        def target():
+            try:
+                result['value'] = asyncio.run(runner())
+            except BaseException as e:
+                result['error'] = e
+        
+        thread = threading.Thread(target=target)
+        thread.start()
+        thread.join()
+        if 'error' in result:
+            raise result['error']
+        return result['value']
+    
+    def gather_players_sync(self, player_tags: List[str]) -> Dict[str, Union[Dict, ClashRoyaleAPIError]]:
+        """Synchronous bridge for gather_players"""
+        return self.run_sync(lambda service: service.gather_players(player_tags))
+    
+    def gather_battles_sync(self, player_tags: List[str]) -> Dict[str, Union[List[Dict], ClashRoyaleAPIError]]:
+        """Synchronous bridge for gather_battles"""
+        return self.run_sync(lambda service: service.gather_battles(player_tags))
+
+
+# Singleton instance
+_async_api_service = None
+_async_api_service_lock = threading.Lock()
+
+
+def get_async_api_service() -> AsyncClashRoyaleAPIService:
+    """Get or create the async API service singleton"""
+    global _async_api_service
+    if _async_api_service is None:
+        with _async_api_service_lock:
+            if _async_api_service is None:
+                _async_api_service = AsyncClashRoyaleAPIService()
+    return _async_api_service
@@ -0,0 +1,96 @@
+"""
+Background Refresh
+Deduplicated off-request work executed on a small thread pool
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Hashable
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundRefresher:
+    """
+    Runs refresh jobs in an app context on a bounded thread pool
+    
+    At most one job per key is queued or running at a time; scheduling a key
+    that is already pending is a no-op.
+    """
+    
+    def __init__(self, max_workers: int):
+        """
+        Initialize the refresher
+        
+        Args:
+            max_workers: Number of refresh threads
+        """
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='refresh')
+        self.lock = threading.Lock()
+        self.pending = set()
+        self.scheduled = 0
+        self.deduplicated = 0
+        self.failed = 0
+    
+    def schedule(self, key: Hashable, fn: Callable[[], object]) -> bool:
+        """
+        Schedule fn to run in the background unless key is already pending
+        
+        Args:
+            key: Identity of the job (e.g. a normalized player tag)
+            fn: Zero-argument callable, run inside the current app's context
+        
+        Returns:
+            bool: True if a new job was scheduled
+        """
+        with self.lock:
+            if key in self.pending:
+                self.deduplicated += 1
+                return False
+            self.pending.add(key)
+            self.scheduled += 1
+        
+        app = current_app._get_current_object()
+        self.executor.submit(self._run, app, key, fn)
+        return True
+    
+    def _run(self, app, key: Hashable, fn: Callable[[], object]) -> None:
+        """Run a job and clear its key"""
+        try:
+            with app.app_context():
+                fn()
+        except Exception as e:
+            with self.lock:
+                self.failed += 1
+            logger.warning(f"Background refresh of {key} failed: {str(e)}")
+        finally:
+            with self.lock:
+                self.pending.discard(key)
+    
+    def get_stats(self) -> Dict:
+        """Get job counters"""
+        with self.lock:
+            return {
+                'pending': len(self.pending),
+                'scheduled': self.scheduled,
+                'deduplicated': self.deduplicated,
+                'failed': self.failed
+            }
+
+
+# Singleton instance
+_refresher = None
+_refresher_lock = threading.Lock()
+
+
+def get_refresher() -> BackgroundRefresher:
+    """Get or create the background refresher singleton"""
+    global _refresher
+    if _refresher is None:
+        with _refresher_lock:
+            if _refresher is None:
+                _refresher = BackgroundRefresher(
+                    max_workers=current_app.config.get('PLAYER_REFRESH_WORKERS', 2)
+                )
+    return _refresher
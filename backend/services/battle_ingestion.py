@@ -0,0 +1,201 @@
+"""
+Battle Ingestion Service
+Streams player battlelogs into deduplicated battle storage
+"""
+import logging
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from flask import current_app
+from models import db, Player, Battle, BattleDeck, BattleIngestState
+from services.clash_royale import ClashRoyaleAPIError
+
+logger = logging.getLogger(__name__)
+
+BATTLE_TIME_FORMAT = '%Y%m%dT%H%M%S.%fZ'
+
+
+class BattleIngestionService:
+    """Service for ingesting battlelogs of stored players"""
+    
+    @staticmethod
+    def parse_battle_time(value: str) -> Optional[datetime]:
+        """
+        Parse an API battleTime value (e.g. '20240101T120000.000Z')
+        
+        Args:
+            value: Raw battleTime string
+        
+        Returns:
+            Optional[datetime]: Naive UTC datetime, or None if unparseable
+        """
+        try:
+            return datetime.strptime(value, BATTLE_TIME_FORMAT)
+        except (TypeError, ValueError):
+            return None
+    
+    @staticmethod
+    def parse_battle(entry: Dict) -> Optional[Tuple[Dict, List[Dict]]]:
+        """
+        Parse a battlelog entry into a battle row and its per-participant decks
+        
+        Args:
+            entry: Raw battlelog entry from the API
+        
+        Returns:
+            Optional[Tuple[Dict, List[Dict]]]: Battle row and deck rows, or
+                None if the entry has no usable time or participants
+        """
+        battle_time = BattleIngestionService.parse_battle_time(entry.get('battleTime'))
+        team = entry.get('team') or []
+        opponent = entry.get('opponent') or []
+        participants = [('team', p) for p in team] + [('opponent', p) for p in opponent]
+        tags = [p.get('tag') for _, p in participants if p.get('tag')]
+        
+        if battle_time is None or not tags:
+            return None
+        
+        battle = {
+            'battle_key': Battle.generate_key(entry['battleTime'], tags),
+            'battle_time': battle_time,
+            'battle_type': entry.get('type'),
+            'game_mode': (entry.get('gameMode') or {}).get('name'),
+            'arena_id': (entry.get('arena') or {}).get('id'),
+            'team_crowns': max((p.get('crowns', 0) for p in team), default=0),
+            'opponent_crowns': max((p.get('crowns', 0) for p in opponent), default=0),
+            'created_at': datetime.utcnow()
+        }
+        decks = {}
+        for side, p in participants:
+            if p.get('tag') and p['tag'] not in decks:
+                decks[p['tag']] = {
+                    'side': side,
+                    'player_tag': p['tag'],
+                    'crowns': p.get('crowns', 0),
+                    'card_ids': [card.get('id') for card in p.get('cards', [])]
+                }
+        return battle, list(decks.values())
+    
+    @staticmethod
+    def ingest_battles(chunk_size: int = None, limit: int = None) -> Dict:
+        """
+        Ingest battlelogs for every stored player
+        
+        Players are walked in id order one chunk at a time: each chunk's
+        battlelogs are fetched concurrently, battles older than the player's
+        high-water mark are skipped, the rest are deduplicated by battle key
+        (within the chunk and against stored battles) and bulk inserted, then
+        the chunk is committed and released from the session.
+        
+        Args:
+            chunk_size: Players per fetch/commit (defaults to BATTLE_INGEST_CHUNK_SIZE)
+            limit: Stop after this many players
+        
+        Returns:
+            Dict: Run statistics
+        """
+        from services.async_clash_royale import get_async_api_service
+        
+        chunk_size = chunk_size or current_app.config.get('BATTLE_INGEST_CHUNK_SIZE', 100)
+        api_service = get_async_api_service()
+        started = time.monotonic()
+        stats = {
+            'players': 0,
+            'errors': 0,
+            'battles_parsed': 0,
+            'battles_inserted': 0,
+            'decks_inserted': 0
+        }
+        
+        last_id = 0
+        while limit is None or stats['players'] < limit:
+            size = chunk_size if limit is None else min(chunk_size, limit - stats['players'])
+            chunk = db.session.query(Player.id, Player.player_tag).filter(
+                Player.id > last_id
+            ).order_by(Player.id).limit(size).all()
+            if not chunk:
+                break
+            last_id = chunk[-1].id
+            stats['players'] += len(chunk)
+            
+            BattleIngestionService._ingest_chunk(api_service, chunk, stats)
+            db.session.commit()
+            db.session.expunge_all()
+        
+        elapsed = time.monotonic() - started
+        stats['elapsed_seconds'] = round(elapsed, 2)
+        stats['players_per_second'] = round(stats['players'] / elapsed, 2) if elapsed else 0.0
+        return stats
+    
+    @staticmethod
+    def _ingest_chunk(api_service, chunk: List, stats: Dict) -> None:
+        """Fetch, dedupe and insert the battles of one chunk of players"""
+        player_ids = {row.player_tag: row.id for row in chunk}
+        states = {
+            state.player_id: state
+            for state in BattleIngestState.query.filter(BattleIngestState.player_id.in_(player_ids.values())).all()
+        }
+        
+        battlelogs = api_service.gather_battles_sync(list(player_ids))
+        
+        battles = {}
+        decks = {}
+        for player_tag, battlelog in battlelogs.items():
+            if isinstance(battlelog, ClashRoyaleAPIError):
+                logger.warning(f"Failed to fetch battlelog for {player_tag}: {str(battlelog)}")
+                stats['errors'] += 1
+                continue
+            
+            player_id = player_ids[player_tag]
+            state = states.get(player_id)
+            high_water = state.last_battle_time if state else None
+            newest = high_water
+            
+            for entry in battlelog:
+                battle_time = BattleIngestionService.parse_battle_time(entry.get('battleTime'))
+                if battle_time is None or (high_water is not None and battle_time <= high_water):
+                    continue
+                
+                parsed = BattleIngestionService.parse_battle(entry)
+                if parsed is None:
+                    continue
+                stats['battles_parsed'] += 1
+                battle, battle_decks = parsed
+                battles.setdefault(battle['battle_key'], battle)
+                decks.setdefault(battle['battle_key'], battle_decks)
+                newest = battle_time if newest is None else max(newest, battle_time)
+            
+            if newest is not None and newest != high_water:
+                if state is None:
+                    db.session.add(BattleIngestState(player_id=player_id, last_battle_time=newest))
+                else:
+                    state.last_battle_time = newest
+        
+        if not battles:
+            return
+        
+        # The same battle shows up in both participants' logs
+        existing = {
+            key for (key,) in db.session.query(Battle.battle_key).filter(Battle.battle_key.in_(list(battles)))
+        }
+        new_battles = [battle for key, battle in battles.items() if key not in existing]
+        if not new_battles:
+            return
+        
+        db.session.execute(db.insert(Battle), new_battles)
+        battle_ids = dict(
+            db.session.query(Battle.battle_key, Battle.id).filter(
+                Battle.battle_key.in_([battle['battle_key'] for battle in new_battles])
+            )
+        )
+        
+        deck_rows = [
+            dict(deck, battle_id=battle_ids[battle['battle_key']])
+            for battle in new_battles
+            for deck in decks[battle['battle_key']]
+        ]
+        if deck_rows:
+            db.session.execute(db.insert(BattleDeck), deck_rows)
+        
+        stats['battles_inserted'] += len(new_battles)
+        stats['decks_inserted'] += len(deck_rows)
@@ -0,0 +1,261 @@
+"""
+Bulk Re-analysis Service
+Recomputes stored deck analyses after the analysis thresholds or card features change
+"""
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+from flask import current_app
+from models import db, upsert, Deck, DeckCard, DeckAnalysis, AnalysisCacheEntry, ReanalysisCheckpoint
+from services.card_features import CardFeatureTable, get_card_table
+from services.deck_analyzer import DeckAnalyzer, CardFeatureMatrix, DECK_SIZE, np
+from services.analysis_cache import analysis_columns
+
+logger = logging.getLogger(__name__)
+
+# (deck id, deck hash, analysis version, card ids in position order) of a deck sent to a worker
+DeckTask = Tuple[int, str, str, List[int]]
+
+# Chunks queued per worker, so workers stay busy while the parent writes
+CHUNKS_PER_WORKER = 2
+
+# Analyzer state of a worker process, set by _init_worker
+_worker_state = None
+
+
+def _init_worker(thresholds: Dict, table: CardFeatureTable) -> None:
+    """
+    Set up the analyzer of a worker process
+    
+    Workers have no app context or database session: the thresholds and
+    the card table are passed in once.
+    """
+    global _worker_state
+    matrix = CardFeatureMatrix(table) if np is not None else None
+    _worker_state = (DeckAnalyzer(thresholds), table, matrix)
+
+
+def analyze_chunk(decks: List[DeckTask]) -> List[Tuple[int, str, str, Dict]]:
+    """
+    Analyze a chunk of decks in a worker process
+    
+    Args:
+        decks: Decks whose cards are all in the worker's card table
+    
+    Returns:
+        List[Tuple[int, str, str, Dict]]: (deck id, deck hash, analysis version, analysis) per deck
+    """
+    analyzer, table, matrix = _worker_state
+    if matrix is not None:
+        results = analyzer.analyze_decks([card_ids for _, _, _, card_ids in decks], matrix)
+    else:
+        results = [analyzer.analyze_card_ids(card_ids, table) for _, _, _, card_ids in decks]
+    return [
+        (deck_id, deck_hash, version, result)
+        for (deck_id, deck_hash, version, _), result in zip(decks, results)
+    ]
+
+
+class BulkReanalysisService:
+    """Service for re-analyzing every stored deck under the current thresholds"""
+    
+    @staticmethod
+    def reanalyze(chunk_size: int = None, workers: int = None, limit: int = None, restart: bool = False,
+                  progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """
+        Re-analyze stored decks for the current ANALYSIS_THRESHOLDS and card features
+        
+        Decks are read in id order one chunk at a time and analyzed in a
+        process pool while the parent writes finished chunks in order. Each
+        chunk's analyses and analysis_cache entries are bulk inserted and
+        committed together with the checkpoint (the last deck id written for
+        these thresholds), so an interrupted run resumes after the last
+        committed chunk. Decks already analyzed under their analysis version
+        (e.g. by the analyze endpoint) are skipped; after a card sync changes
+        some cards, restart picks up the decks holding them.
+        
+        Args:
+            chunk_size: Decks per worker task/commit (defaults to REANALYSIS_CHUNK_SIZE)
+            workers: Analyzer processes (defaults to REANALYSIS_WORKERS, else one
+                per CPU); 1 analyzes in this process
+            limit: Stop after reading this many decks
+            restart: Ignore the checkpoint and start from the first deck
+            progress: Called with the run statistics after each committed chunk
+        
+        Returns:
+            Dict: Run statistics
+        """
+        config = current_app.config
+        chunk_size = chunk_size or config.get('REANALYSIS_CHUNK_SIZE', 1000)
+        workers = workers or config.get('REANALYSIS_WORKERS') or os.cpu_count() or 1
+        
+        analyzer = DeckAnalyzer()
+        table = get_card_table(refresh=True)
+        version = analyzer.thresholds_version
+        
+        checkpoint = db.session.get(ReanalysisCheckpoint, version)
+        last_read = 0
+        if checkpoint is not None:
+            if restart:
+                db.session.delete(checkpoint)
+            else:
+                last_read = checkpoint.last_deck_id
+        db.session.commit()
+        
+        logger.info(f"Re-analyzing decks for thresholds version {version} after deck {last_read} with {workers} worker(s)")
+        started = time.monotonic()
+        stats = {
+            'thresholds_version': version,
+            'resumed_after_deck': last_read,
+            'decks': 0,
+            'analyzed': 0,
+            'already_analyzed': 0,
+            'skipped': 0
+        }
+        
+        executor = None
+        if workers > 1:
+            executor = ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_worker, initargs=(analyzer.thresholds, table)
+            )
+        else:
+            _init_worker(analyzer.thresholds, table)
+        
+        # (last deck id of the chunk, future of its analyses), in deck id order
+        pending: 'deque[Tuple[int, Future]]' = deque()
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(pending) < workers * CHUNKS_PER_WORKER:
+                    size = chunk_size if limit is None else min(chunk_size, limit - stats['decks'])
+                    chunk = BulkReanalysisService._read_chunk(last_read, size, analyzer, table, stats) if size else None
+                    if chunk is None:
+                        exhausted = True
+                        break
+                    last_read, tasks = chunk
+                    pending.append((last_read, BulkReanalysisService._submit(executor, tasks)))
+                
+                if not pending:
+                    break
+                
+                chunk_last_id, future = pending.popleft()
+                results = future.result()
+                BulkReanalysisService._write_chunk(results, version, chunk_last_id)
+                db.session.commit()
+                
+                stats['analyzed'] += len(results)
+                stats['last_deck_id'] = chunk_last_id
+                BulkReanalysisService._update_rate(stats, started)
+                if progress:
+                    progress(dict(stats))
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+        
+        BulkReanalysisService._update_rate(stats, started)
+        return stats
+    
+    @staticmethod
+    def _submit(executor: Optional[ProcessPoolExecutor], tasks: List[DeckTask]) -> Future:
+        """Analyze a chunk in the pool, or right away without one"""
+        if executor is not None:
+            return executor.submit(analyze_chunk, tasks)
+        future = Future()
+        future.set_result(analyze_chunk(tasks))
+        return future
+    
+    @staticmethod
+    def _read_chunk(last_id: int, size: int, analyzer: DeckAnalyzer, table: CardFeatureTable,
+                    stats: Dict) -> Optional[Tuple[int, List[DeckTask]]]:
+        """
+        Read the next chunk of decks after a deck id
+        
+        Returns:
+            Optional[Tuple[int, List[DeckTask]]]: The chunk's last deck id and
+                the decks to analyze, or None when no decks are left
+        """
+        decks = db.session.query(Deck.id, Deck.deck_hash).filter(
+            Deck.id > last_id
+        ).order_by(Deck.id).limit(size).all()
+        if not decks:
+            return None
+        stats['decks'] += len(decks)
+        
+        card_ids = {deck.id: [] for deck in decks}
+        for deck_id, card_id in db.session.query(DeckCard.deck_id, DeckCard.card_id).filter(
+            DeckCard.deck_id.in_(list(card_ids))
+        ).order_by(DeckCard.deck_id, DeckCard.position):
+            card_ids[deck_id].append(card_id)
+        
+        # Incomplete decks cannot be analyzed; cards missing from the table were deleted
+        candidates = []
+        for deck in decks:
+            cards = card_ids[deck.id]
+            if len(cards) == DECK_SIZE and all(card_id in table.row_of_id for card_id in cards):
+                candidates.append((deck.id, deck.deck_hash, analyzer.analysis_version(cards, table), cards))
+            else:
+                stats['skipped'] += 1
+        
+        done = {
+            (deck_hash, version) for deck_hash, version in db.session.query(
+                AnalysisCacheEntry.deck_hash, AnalysisCacheEntry.thresholds_version
+            ).filter(
+                AnalysisCacheEntry.deck_hash.in_([deck_hash for _, deck_hash, _, _ in candidates])
+            )
+        }
+        tasks = [task for task in candidates if (task[1], task[2]) not in done]
+        stats['already_analyzed'] += len(candidates) - len(tasks)
+        
+        return decks[-1].id, tasks
+    
+    @staticmethod
+    def _write_chunk(results: List[Tuple[int, str, str, Dict]], version: str, last_deck_id: int) -> None:
+        """Bulk insert a chunk's analyses and cache entries and advance the checkpoint"""
+        # DATETIME columns may drop microseconds; the timestamp only finds this chunk's rows
+        now = datetime.utcnow().replace(microsecond=0)
+        
+        if results:
+            db.session.execute(db.insert(DeckAnalysis), [
+                dict(analysis_columns(result), deck_id=deck_id, created_at=now)
+                for deck_id, _, _, result in results
+            ])
+            analysis_ids = dict(
+                db.session.query(DeckAnalysis.deck_id, db.func.max(DeckAnalysis.id)).filter(
+                    DeckAnalysis.deck_id.in_([deck_id for deck_id, _, _, _ in results]),
+                    DeckAnalysis.created_at >= now
+                ).group_by(DeckAnalysis.deck_id)
+            )
+            db.session.execute(
+                upsert(AnalysisCacheEntry, ['deck_hash', 'thresholds_version'], ['analysis_id']),
+                [
+                    {
+                        'deck_hash': deck_hash,
+                        'thresholds_version': analysis_version,
+                        'analysis_id': analysis_ids[deck_id],
+                        'created_at': now
+                    }
+                    for deck_id, deck_hash, analysis_version, _ in results
+                ]
+            )
+        
+        db.session.execute(
+            upsert(ReanalysisCheckpoint, ['thresholds_version'], ['last_deck_id', 'updated_at'],
+                   increment_columns=['decks_analyzed']),
+            [{
+                'thresholds_version': version,
+                'last_deck_id': last_deck_id,
+                'decks_analyzed': len(results),
+                'updated_at': now
+            }]
+        )
+    
+    @staticmethod
+    def _update_rate(stats: Dict, started: float) -> None:
+        """Set the elapsed time and throughput of a run"""
+        elapsed = time.monotonic() - started
+        stats['elapsed_seconds'] = round(elapsed, 2)
+        stats['decks_per_second'] = round(stats['analyzed'] / elapsed, 2) if elapsed else 0.0
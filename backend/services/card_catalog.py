@@ -0,0 +1,138 @@
+"""
+Card Catalog
+Process-level cache of the Clash Royale card catalog indexed by API card id
+"""
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+from flask import current_app
+from services.clash_royale import ClashRoyaleAPIService, get_api_service
+from services.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+class CardCatalog:
+    """
+    TTL cache of parsed card data
+    
+    The first read blocks on a download. Reads after CARDS_CACHE_DURATION
+    keep serving the stale catalog while a background thread refreshes it.
+    """
+    
+    def __init__(self, api_service: ClashRoyaleAPIService, ttl: int):
+        """
+        Initialize the catalog
+        
+        Args:
+            api_service: API service used to download the catalog
+            ttl: Seconds before the catalog is considered stale
+        """
+        self.api_service = api_service
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self._flight = SingleFlight()
+        self._cards: Dict[int, Dict] = {}
+        self._fetched_at: Optional[float] = None
+        self._refreshing = False
+        self.loads = 0
+    
+    def _load(self) -> None:
+        """Download the catalog and swap it in"""
+        api_cards = self.api_service.get_cards()
+        cards = {}
+        for api_card in api_cards:
+            parsed_card = self.api_service.parse_card_data(api_card)
+            cards[parsed_card['card_id']] = parsed_card
+        
+        with self.lock:
+            self._cards = cards
+            self._fetched_at = time.monotonic()
+            self.loads += 1
+    
+    def _background_refresh(self) -> None:
+        """Refresh the catalog, keeping the stale copy if the download fails"""
+        try:
+            self._flight.do('cards', self._load)
+        except Exception as e:
+            logger.warning(f"Background card catalog refresh failed: {str(e)}")
+        finally:
+            with self.lock:
+                self._refreshing = False
+    
+    def _ensure_loaded(self) -> None:
+        """Load the catalog if empty, or schedule a refresh if stale"""
+        with self.lock:
+            loaded = self._fetched_at is not None
+            stale = loaded and time.monotonic() - self._fetched_at > self.ttl
+            start_refresh = stale and not self._refreshing
+            if start_refresh:
+                self._refreshing = True
+        
+        if not loaded:
+            self._flight.do('cards', self._load)
+        elif start_refresh:
+            threading.Thread(target=self._background_refresh, daemon=True).start()
+    
+    def refresh(self) -> None:
+        """Download the catalog now, blocking until it is replaced"""
+        self._flight.do('cards', self._load)
+    
+    def get(self, card_id: int) -> Optional[Dict]:
+        """
+        Get a parsed card by its API card id
+        
+        Args:
+            card_id: Clash Royale API card id
+        
+        Returns:
+            Optional[Dict]: Parsed card data, or None if not in the catalog
+        
+        Raises:
+            ClashRoyaleAPIError: If the catalog has never been loaded and the download fails
+        """
+        self._ensure_loaded()
+        return self._cards.get(card_id)
+    
+    def all(self) -> List[Dict]:
+        """
+        Get every parsed card in the catalog
+        
+        Returns:
+            List[Dict]: Parsed card data
+        
+        Raises:
+            ClashRoyaleAPIError: If the catalog has never been loaded and the download fails
+        """
+        self._ensure_loaded()
+        return list(self._cards.values())
+    
+    def get_stats(self) -> Dict:
+        """Get catalog size, age and load count"""
+        with self.lock:
+            return {
+                'cards': len(self._cards),
+                'age_seconds': round(time.monotonic() - self._fetched_at, 1) if self._fetched_at is not None else None,
+                'ttl_seconds': self.ttl,
+                'loads': self.loads,
+                'refreshing': self._refreshing
+            }
+
+
+# Singleton instance
+_card_catalog = None
+_card_catalog_lock = threading.Lock()
+
+
+def get_card_catalog() -> CardCatalog:
+    """Get or create the card catalog singleton"""
+    global _card_catalog
+    if _card_catalog is None:
+        with _card_catalog_lock:
+            if _card_catalog is None:
+                _card_catalog = CardCatalog(
+                    api_service=get_api_service(),
+                    ttl=current_app.config.get('CARDS_CACHE_DURATION', 86400)
+                )
+    return _card_catalog
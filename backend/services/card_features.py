@@ -0,0 +1,200 @@
+"""
+Card Feature Table
+Compact, read-only card attributes used by the deck analyzer without the ORM
+"""
+import hashlib
+import threading
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from models import db, Card
+
+# Role bits of CardFeatureTable.bits
+AIR_TARGETING = 1
+SPLASH_DAMAGE = 2
+WIN_CONDITION = 4
+TANK = 8
+SPELL = 16
+LIGHT_SPELL = 32
+HEAVY_SPELL = 64
+
+FLAG_BITS = (
+    ('is_air_targeting', AIR_TARGETING),
+    ('is_splash_damage', SPLASH_DAMAGE),
+    ('is_win_condition', WIN_CONDITION),
+    ('is_tank', TANK),
+    ('is_spell', SPELL),
+)
+SPELL_TYPE_BITS = {'light': LIGHT_SPELL, 'heavy': HEAVY_SPELL}
+
+# Columns read from the cards table, in FeatureRow order
+FEATURE_COLUMNS = (
+    Card.id, Card.name, Card.elixir_cost,
+    Card.is_air_targeting, Card.is_splash_damage, Card.is_win_condition, Card.is_tank, Card.is_spell,
+    Card.spell_type
+)
+
+# (id, name, elixir_cost, is_air_targeting, is_splash_damage, is_win_condition, is_tank, is_spell, spell_type)
+FeatureRow = Tuple[Optional[int], str, int, bool, bool, bool, bool, bool, Optional[str]]
+
+
+def encode_bits(row: FeatureRow) -> int:
+    """Pack a feature row's role flags and spell type into bits"""
+    bits = 0
+    for value, (_, bit) in zip(row[3:8], FLAG_BITS):
+        if value:
+            bits |= bit
+    return bits | SPELL_TYPE_BITS.get(row[8], 0)
+
+
+class CardFeatureTable:
+    """
+    Immutable column store of card features, one row per card
+    
+    Elixir costs and role bits are packed arrays exposed as read-only
+    memoryviews; names are a tuple. Rows are addressed by position, and
+    card ids (cards.id) map to rows through row_of_id.
+    """
+    
+    __slots__ = ('version', 'ids', 'names', 'elixir', 'bits', 'row_of_id')
+    
+    def __init__(self, rows: Iterable[FeatureRow], version: Optional[str] = None):
+        """
+        Build the table
+        
+        Args:
+            rows: Feature rows (see FEATURE_COLUMNS)
+            version: Catalog version the rows were read at
+        """
+        rows = list(rows)
+        set_ = object.__setattr__
+        set_(self, 'version', version)
+        set_(self, 'ids', tuple(row[0] for row in rows))
+        set_(self, 'names', tuple(row[1] for row in rows))
+        set_(self, 'elixir', memoryview(array('h', (row[2] or 0 for row in rows))).toreadonly())
+        set_(self, 'bits', memoryview(array('B', (encode_bits(row) for row in rows))).toreadonly())
+        set_(self, 'row_of_id', {card_id: i for i, card_id in enumerate(self.ids) if card_id is not None})
+    
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+    
+    def __reduce__(self):
+        """Pickle as packed columns (memoryviews are not picklable), e.g. for worker processes"""
+        return _unpickle_table, (self.version, self.ids, self.names, self.elixir.tobytes(), self.bits.tobytes())
+    
+    def __len__(self) -> int:
+        return len(self.names)
+    
+    @classmethod
+    def from_cards(cls, cards: Sequence[Card]) -> 'CardFeatureTable':
+        """
+        Build a table from Card objects, in the given order
+        
+        Args:
+            cards: Card objects (or anything with the same attributes)
+        
+        Returns:
+            CardFeatureTable: Table whose rows follow the input order
+        """
+        return cls(tuple(getattr(card, column.key) for column in FEATURE_COLUMNS) for card in cards)
+    
+    @classmethod
+    def load(cls, version: Optional[str] = None) -> 'CardFeatureTable':
+        """
+        Read the whole catalog from the cards table
+        
+        Args:
+            version: Catalog version being loaded
+        
+        Returns:
+            CardFeatureTable: Table ordered by card id
+        """
+        return cls(db.session.query(*FEATURE_COLUMNS).order_by(Card.id), version=version)
+    
+    def rows(self, card_ids: Iterable[int]) -> List[int]:
+        """
+        Map card ids to table rows
+        
+        Args:
+            card_ids: Card ids (cards.id)
+        
+        Returns:
+            List[int]: Row of each id
+        
+        Raises:
+            KeyError: If an id is not in the table
+        """
+        row_of_id = self.row_of_id
+        return [row_of_id[card_id] for card_id in card_ids]
+    
+    def features_digest(self, rows: Iterable[int]) -> str:
+        """
+        Digest of everything the analyzer reads from some rows
+        
+        Unlike version, it ignores card fields analyses do not depend on
+        (icons, rarity, levels) and every other card, so it only changes
+        when one of these cards' name, elixir cost or roles change.
+        
+        Args:
+            rows: Table rows, in any order
+        
+        Returns:
+            str: Hex digest of the rows' ids, names, elixir costs and role bits
+        """
+        features = [(self.ids[row], self.names[row], self.elixir[row], self.bits[row]) for row in rows]
+        return hashlib.sha1(repr(sorted(features)).encode()).hexdigest()
+    
+    def count(self, rows: Iterable[int], bit: int) -> int:
+        """Number of rows having a role bit"""
+        bits = self.bits
+        return sum(1 for row in rows if bits[row] & bit)
+    
+    def get_stats(self) -> Dict:
+        """Get table size"""
+        return {
+            'version': self.version,
+            'cards': len(self),
+            'array_bytes': self.elixir.nbytes + self.bits.nbytes
+        }
+
+
+def _unpickle_table(version: Optional[str], ids: Tuple, names: Tuple, elixir: bytes, bits: bytes) -> CardFeatureTable:
+    """Rebuild a pickled CardFeatureTable"""
+    table = CardFeatureTable.__new__(CardFeatureTable)
+    set_ = object.__setattr__
+    set_(table, 'version', version)
+    set_(table, 'ids', ids)
+    set_(table, 'names', names)
+    set_(table, 'elixir', memoryview(array('h', elixir)).toreadonly())
+    set_(table, 'bits', memoryview(array('B', bits)).toreadonly())
+    set_(table, 'row_of_id', {card_id: i for i, card_id in enumerate(ids) if card_id is not None})
+    return table
+
+
+# Singleton instance
+_card_table = None
+_card_table_lock = threading.Lock()
+
+
+def get_card_table(refresh: bool = False) -> CardFeatureTable:
+    """
+    Get the feature table of the current card catalog
+    
+    The table is rebuilt when Card.catalog_version() changes (or when
+    refresh is set), so this needs an app context; the returned table
+    does not.
+    
+    Args:
+        refresh: Rebuild even if the version is unchanged
+    
+    Returns:
+        CardFeatureTable: Table of every stored card
+    """
+    global _card_table
+    version = Card.catalog_version()
+    table = _card_table
+    if refresh or table is None or table.version != version:
+        with _card_table_lock:
+            table = _card_table
+            if refresh or table is None or table.version != version:
+                table = _card_table = CardFeatureTable.load(version)
+    return table
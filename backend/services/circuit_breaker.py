@@ -0,0 +1,145 @@
+"""
+Circuit Breaker
+Fails fast on upstream outages instead of waiting out every timeout
+"""
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, Tuple
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """
+    Thread-safe consecutive-failure circuit breaker
+    
+    Closed: calls go through and failures are counted. After
+    failure_threshold consecutive failures the breaker opens and rejects
+    calls for recovery_timeout seconds. It then goes half-open and lets a
+    single trial call through: success closes it, failure re-opens it.
+    """
+    
+    def __init__(self, failure_threshold: int, recovery_timeout: float, history_size: int = 20):
+        """
+        Initialize the breaker
+        
+        Args:
+            failure_threshold: Consecutive failures that open the breaker
+            recovery_timeout: Seconds to stay open before a trial call
+            history_size: Number of recent transitions kept for health output
+        """
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.rejected = 0
+        self.transitions = deque(maxlen=history_size)
+    
+    def _transition(self, state: str, reason: str) -> None:
+        """Move to a new state, recording the transition (lock must be held)"""
+        logger.warning(f"Circuit breaker {self.state} -> {state}: {reason}")
+        self.transitions.append({
+            'from': self.state,
+            'to': state,
+            'reason': reason,
+            'at': datetime.utcnow().isoformat()
+        })
+        self.state = state
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+        self.trial_in_flight = False
+    
+    def acquire(self) -> Tuple[bool, bool]:
+        """
+        Check whether a call may go to the upstream
+        
+        The call that gets the half-open trial must pass is_trial back to
+        record_success, record_failure or release; outcomes of other calls
+        (e.g. ones started before the breaker opened) never end the trial.
+        
+        Returns:
+            Tuple[bool, bool]: Whether the call may proceed (False if the
+                breaker is open or a half-open trial is running), and whether
+                it is the half-open trial call
+        """
+        with self.lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.recovery_timeout:
+                self._transition(HALF_OPEN, 'recovery timeout elapsed')
+            
+            if self.state == CLOSED:
+                return True, False
+            if self.state == HALF_OPEN and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True, True
+            
+            self.rejected += 1
+            return False, False
+    
+    def record_success(self, is_trial: bool = False) -> None:
+        """Record a call that reached a healthy upstream"""
+        with self.lock:
+            self.consecutive_failures = 0
+            if is_trial and self.state == HALF_OPEN:
+                self._transition(CLOSED, 'trial call succeeded')
+    
+    def record_failure(self, is_trial: bool = False) -> None:
+        """Record a call that failed because the upstream is unhealthy"""
+        with self.lock:
+            self.consecutive_failures += 1
+            if is_trial and self.state == HALF_OPEN:
+                self._transition(OPEN, 'trial call failed')
+            elif self.state == CLOSED and self.consecutive_failures >= self.failure_threshold:
+                self._transition(OPEN, f'{self.consecutive_failures} consecutive failures')
+    
+    def release(self, is_trial: bool = False) -> None:
+        """Finish a call whose outcome says nothing about upstream health"""
+        if not is_trial:
+            return
+        with self.lock:
+            if self.state == HALF_OPEN:
+                self.trial_in_flight = False
+    
+    def get_state(self) -> Dict:
+        """Get breaker state and recent transitions"""
+        with self.lock:
+            retry_in = None
+            if self.state == OPEN:
+                retry_in = round(max(0.0, self.recovery_timeout - (time.monotonic() - self.opened_at)), 1)
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'failure_threshold': self.failure_threshold,
+                'recovery_timeout': self.recovery_timeout,
+                'retry_in_seconds': retry_in,
+                'rejected': self.rejected,
+                'transitions': list(self.transitions)
+            }
+
+
+# Singleton instance
+_circuit_breaker = None
+_circuit_breaker_lock = threading.Lock()
+
+
+def get_circuit_breaker() -> CircuitBreaker:
+    """Get or create the Clash Royale API circuit breaker"""
+    global _circuit_breaker
+    if _circuit_breaker is None:
+        with _circuit_breaker_lock:
+            if _circuit_breaker is None:
+                _circuit_breaker = CircuitBreaker(
+                    failure_threshold=current_app.config.get('CLASH_ROYALE_API_BREAKER_FAILURES', 5),
+                    recovery_timeout=current_app.config.get('CLASH_ROYALE_API_BREAKER_RESET', 30)
+                )
+    return _circuit_breaker
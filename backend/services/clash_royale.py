@@ -2,9 +2,20 @@
 Clash Royale API Service
 Handles all interactions with the Clash Royale official API
 """
+import logging
+import re
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from typing import Dict, List, Optional
 from flask import current_app
+from services.rate_limiter import get_rate_limiter, parse_retry_after, backoff_delay
+from services.single_flight import SingleFlight
+from services.circuit_breaker import get_circuit_breaker
+
+logger = logging.getLogger(__name__)
 
 
 class ClashRoyaleAPIError(Exception):
@@ -12,6 +23,67 @@ class ClashRoyaleAPIError(Exception):
     pass
 
 
+class ClashRoyaleUnavailableError(ClashRoyaleAPIError):
+    """Raised when the API is down, failing, or short-circuited by the circuit breaker"""
+    pass
+
+
+class ClashRoyaleNotFoundError(ClashRoyaleAPIError):
+    """Raised when the API answers 404 or the tag is known to be missing"""
+    pass
+
+
+class InvalidPlayerTagError(ClashRoyaleAPIError):
+    """Raised for tags that cannot exist, before any upstream call"""
+    pass
+
+
+# Player and clan tags only use these characters (no vowels, no 1, O or I)
+TAG_ALPHABET = '0289PYLQGRJCUV'
+_TAG_RE = re.compile(f'^#[{TAG_ALPHABET}]{{3,14}}$')
+
+
+def is_valid_tag(tag: str) -> bool:
+    """
+    Check a normalized tag ('#' plus upper-case characters) against the game's tag format
+    
+    Args:
+        tag: Normalized tag
+        
+    Returns:
+        bool: True if the tag could exist
+    """
+    return bool(_TAG_RE.match(tag))
+
+
+def is_retryable_status(status_code: int) -> bool:
+    """Whether a response status is worth retrying (throttled or server error)"""
+    return status_code == 429 or status_code >= 500
+
+
+def check_status(status_code: int, not_found_message: str = "Resource not found") -> None:
+    """
+    Map a Clash Royale API status code to a ClashRoyaleAPIError
+    
+    Args:
+        status_code: HTTP status code of the API response
+        not_found_message: Error message for a 404 from this endpoint
+        
+    Raises:
+        ClashRoyaleAPIError: If the status code is not 200
+    """
+    if status_code == 404:
+        raise ClashRoyaleNotFoundError(not_found_message)
+    elif status_code == 403:
+        raise ClashRoyaleAPIError("Invalid API key or access forbidden")
+    elif status_code == 429:
+        raise ClashRoyaleAPIError("API rate limit exceeded")
+    elif status_code >= 500:
+        raise ClashRoyaleUnavailableError("Clash Royale API server error")
+    elif status_code != 200:
+        raise ClashRoyaleAPIError(f"API request failed with status {status_code}")
+
+
 class ClashRoyaleAPIService:
     """Service for interacting with Clash Royale API"""
     
@@ -26,7 +98,7 @@ class ClashRoyaleAPIService:
         """
         self.api_key = (api_key or current_app.config.get('CLASH_ROYALE_API_KEY', '')).strip()
         # Use RoyaleAPI proxy which bypasses IP restrictions but still needs API key
-        self.base_url = base_url or 'https://proxy.royaleapi.dev/v1'
+        self.base_url = base_url or current_app.config.get('CLASH_ROYALE_API_BASE_URL', 'https://proxy.royaleapi.dev/v1')
         self.timeout = timeout or current_app.config.get('CLASH_ROYALE_API_TIMEOUT', 10)
         
         if not self.api_key:
@@ -36,14 +108,97 @@ class ClashRoyaleAPIService:
             'Authorization': f'Bearer {self.api_key}',
             'Accept': 'application/json'
         }
+        
+        self.session = self._create_session()
+        self._cards_flight = SingleFlight()
+        
+        # Client-side throttling shared by every caller in this process
+        config = current_app.config
+        self.rate_limiter = get_rate_limiter()
+        self.circuit_breaker = get_circuit_breaker()
+        self.max_queue_wait = config.get('CLASH_ROYALE_API_MAX_QUEUE_WAIT', 5)
+        self.status_retries = config.get('CLASH_ROYALE_API_STATUS_RETRIES', 3)
+        self.backoff_base = config.get('CLASH_ROYALE_API_BACKOFF_BASE', 0.5)
+        self.backoff_max = config.get('CLASH_ROYALE_API_BACKOFF_MAX', 8)
     
-    def _make_request(self, endpoint: str, params: Dict = None) -> Dict:
+    def _create_session(self) -> requests.Session:
+        """
+        Create a pooled keep-alive session for the API host
+        
+        The session is shared by every thread using the singleton, so the
+        urllib3 pool underneath is sized from config to match the number of
+        worker threads that may call the API at once.
+        
+        Returns:
+            requests.Session: Session with a mounted pooled HTTPAdapter
+        """
+        config = current_app.config
+        retries = Retry(
+            total=config.get('CLASH_ROYALE_API_MAX_RETRIES', 2),
+            backoff_factor=config.get('CLASH_ROYALE_API_RETRY_BACKOFF', 0.3),
+            allowed_methods=frozenset(['GET']),
+            raise_on_status=False,
+            # Only connection failures are retried: a read timeout already spent
+            # the full timeout, and the circuit breaker must see it as one failure
+            read=0,
+            # 429/5xx are retried in _make_request where the token bucket can see them
+            status=0,
+            respect_retry_after_header=False
+        )
+        self.adapter = HTTPAdapter(
+            pool_connections=config.get('CLASH_ROYALE_API_POOL_CONNECTIONS', 4),
+            pool_maxsize=config.get('CLASH_ROYALE_API_POOL_MAXSIZE', 10),
+            pool_block=config.get('CLASH_ROYALE_API_POOL_BLOCK', False),
+            max_retries=retries
+        )
+        
+        session = requests.Session()
+        session.mount('https://', self.adapter)
+        session.mount('http://', self.adapter)
+        session.headers.update(self.headers)
+        session.headers['Connection'] = (
+            'keep-alive' if config.get('CLASH_ROYALE_API_KEEPALIVE', True) else 'close'
+        )
+        return session
+    
+    def get_pool_stats(self) -> Dict:
+        """
+        Get connection pool hit/miss counters
+        
+        A miss is a request that had to open a new connection (TCP + TLS
+        handshake); a hit is a request served on a reused keep-alive connection.
+        
+        Returns:
+            Dict: Aggregated counters across all host pools
+        """
+        requests_made = 0
+        connections_opened = 0
+        pools = self.adapter.poolmanager.pools
+        for key in pools.keys():
+            try:
+                pool = pools[key]
+            except KeyError:
+                # Evicted since keys() was read
+                continue
+            requests_made += pool.num_requests
+            connections_opened += pool.num_connections
+        
+        return {
+            'requests': requests_made,
+            'hits': max(requests_made - connections_opened, 0),
+            'misses': connections_opened,
+            'hit_ratio': round((requests_made - connections_opened) / requests_made, 4) if requests_made else 0.0
+        }
+    
+    def _make_request(self, endpoint: str, params: Dict = None,
+                      not_found_message: str = "Resource not found") -> Dict:
         """
         Make a request to the Clash Royale API
         
         Args:
             endpoint: API endpoint (e.g., '/players/%23ABC123')
             params: Query parameters
+            not_found_message: Error message if the API answers 404
             
         Returns:
             Dict: API response data
@@ -53,38 +208,65 @@ class ClashRoyaleAPIService:
         """
         url = f"{self.base_url}{endpoint}"
         
+        # Fail fast while the upstream is known to be down
+        allowed, is_trial = self.circuit_breaker.acquire()
+        if not allowed:
+            raise ClashRoyaleUnavailableError("Clash Royale API temporarily unavailable")
+        upstream_healthy = None
+        
         try:
-            response = requests.get(
-                url,
-                headers=self.headers,
-                params=params,
-                timeout=self.timeout
-            )
-            
-            # Check for API errors
-            if response.status_code == 404:
-                raise ClashRoyaleAPIError("Player not found")
-            elif response.status_code == 403:
-                raise ClashRoyaleAPIError("Invalid API key or access forbidden")
-            elif response.status_code == 429:
-                raise ClashRoyaleAPIError("API rate limit exceeded")
-            elif response.status_code >= 500:
-                raise ClashRoyaleAPIError("Clash Royale API server error")
-            elif response.status_code != 200:
-                raise ClashRoyaleAPIError(f"API request failed with status {response.status_code}")
-            
-            return response.json()
+            attempt = 0
+            while True:
+                # Queue behind other callers for a token from the shared bucket
+                wait = self.rate_limiter.reserve(max_wait=self.max_queue_wait)
+                if wait is None:
+                    raise ClashRoyaleAPIError("API rate limit exceeded")
+                if wait > 0:
+                    time.sleep(wait)
+                
+                response = self.session.get(
+                    url,
+                    params=params,
+                    timeout=self.timeout
+                )
+                
+                # Retry throttled and server errors with backoff
+                if is_retryable_status(response.status_code) and attempt < self.status_retries:
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    delay = backoff_delay(attempt, self.backoff_base, self.backoff_max, retry_after)
+                    logger.warning(
+                        f"Clash Royale API returned {response.status_code}, "
+                        f"retrying in {delay:.2f}s (attempt {attempt + 1}/{self.status_retries})"
+                    )
+                    response.close()
+                    time.sleep(delay)
+                    attempt += 1
+                    continue
+                
+                # Check for API errors
+                upstream_healthy = response.status_code < 500
+                check_status(response.status_code, not_found_message)
+                
+                return response.json()
             
         except requests.exceptions.Timeout:
-            raise ClashRoyaleAPIError("API request timed out")
+            upstream_healthy = False
+            raise ClashRoyaleUnavailableError("API request timed out")
         except requests.exceptions.ConnectionError:
-            raise ClashRoyaleAPIError("Failed to connect to Clash Royale API")
+            upstream_healthy = False
+            raise ClashRoyaleUnavailableError("Failed to connect to Clash Royale API")
         except requests.exceptions.RequestException as e:
+            upstream_healthy = False
             # Log the full error for debugging, but don't expose sensitive details to client
-            import logging
-            logger = logging.getLogger(__name__)
             logger.error(f"Clash Royale API request failed: {str(e)}")
-            raise ClashRoyaleAPIError("Clash Royale API request failed. Please try again later.")
+            raise ClashRoyaleUnavailableError("Clash Royale API request failed. Please try again later.")
+        finally:
+            if upstream_healthy is True:
+                self.circuit_breaker.record_success(is_trial)
+            elif upstream_healthy is False:
+                self.circuit_breaker.record_failure(is_trial)
+            else:
+                self.circuit_breaker.release(is_trial)
     
     @staticmethod
     def format_player_tag(tag: str) -> str:
@@ -118,7 +300,7 @@ class ClashRoyaleAPIService:
         """
         formatted_tag = self.format_player_tag(player_tag)
         endpoint = f'/players/{formatted_tag}'
-        return self._make_request(endpoint)
+        return self._make_request(endpoint, not_found_message="Player not found")
     
     def get_player_battles(self, player_tag: str) -> List[Dict]:
         """
@@ -135,7 +317,7 @@ class ClashRoyaleAPIService:
         """
         formatted_tag = self.format_player_tag(player_tag)
         endpoint = f'/players/{formatted_tag}/battlelog'
-        return self._make_request(endpoint)
+        return self._make_request(endpoint, not_found_message="Battle log not found")
     
     def get_cards(self) -> List[Dict]:
         """
@@ -148,7 +330,10 @@ class ClashRoyaleAPIService:
             ClashRoyaleAPIError: If request fails
         """
         endpoint = '/cards'
-        response = self._make_request(endpoint)
+        # Concurrent catalog downloads share a single upstream request
+        response = self._cards_flight.do(
+            endpoint, lambda: self._make_request(endpoint, not_found_message="Card catalog not found")
+        )
         return response.get('items', [])
     
     def extract_current_deck(self, player_data: Dict) -> List[Dict]:
@@ -256,11 +441,14 @@ class ClashRoyaleAPIService:
 
 # Singleton instance
 _api_service = None
+_api_service_lock = threading.Lock()
 
 
 def get_api_service() -> ClashRoyaleAPIService:
     """Get or create the API service singleton"""
     global _api_service
     if _api_service is None:
-        _api_service = ClashRoyaleAPIService()
+        with _api_service_lock:
+            if _api_service is None:
+                _api_service = ClashRoyaleAPIService()
     return _api_service
\ No newline at end of file
@@ -2,24 +2,296 @@
 Deck Analysis Service
 Implements rule-based deck analysis logic
 """
-from typing import Dict, List, Tuple
+import hashlib
+import json
+import logging
+from string import Formatter
+from typing import Dict, Iterable, List, Optional, Sequence
 from flask import current_app
 from models import Card
+from services.card_features import (
+    CardFeatureTable, get_card_table, AIR_TARGETING, SPLASH_DAMAGE, WIN_CONDITION, TANK, SPELL,
+    LIGHT_SPELL, HEAVY_SPELL
+)
+
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+except ImportError as e:
+    logger.warning("NumPy not installed, batch deck analysis unavailable: %s", e)
+    np = None
+
+DECK_SIZE = 8
+
+# Rules are predicates over metrics that work on plain numbers (one deck) and on
+# NumPy arrays (one value per deck), so conditions combine with & rather than `and`.
+# Descriptions are str.format templates over the metrics.
+STRENGTH_RULES = [
+    {
+        'when': lambda m, t: m['avg_elixir'] < t['low_elixir'],
+        'category': 'Cycle Speed',
+        'title': 'Fast Cycle Deck',
+        'description': "With an average elixir cost of {avg_elixir}, this deck cycles extremely fast, allowing you to quickly return to key cards and apply constant pressure."
+    },
+    {
+        'when': lambda m, t: (t['low_elixir'] <= m['avg_elixir']) & (m['avg_elixir'] <= t['high_elixir']),
+        'category': 'Balance',
+        'title': 'Well-Balanced Elixir',
+        'description': "Average elixir of {avg_elixir} provides a good balance between defense and offense without being too heavy or too light."
+    },
+    {
+        'when': lambda m, t: m['air_targeting_count'] >= t['min_air_defense'] + 1,
+        'category': 'Air Defense',
+        'title': 'Excellent Air Defense',
+        'description': "With {air_targeting_count} air-targeting cards, this deck is well-equipped to handle aerial threats like Balloon, Lava Hound, and flying troops."
+    },
+    {
+        'when': lambda m, t: m['splash_damage_count'] >= t['min_splash'],
+        'category': 'Area Damage',
+        'title': 'Strong Splash Damage',
+        'description': "Having {splash_damage_count} splash damage cards makes this deck effective against swarm troops like Skeleton Army, Minion Horde, and Goblin Gang."
+    },
+    {
+        'when': lambda m, t: m['win_condition_count'] >= 2,
+        'category': 'Win Conditions',
+        'title': 'Multiple Win Conditions',
+        'description': "This deck has {win_condition_count} win conditions, making it unpredictable and harder for opponents to defend against."
+    },
+    {
+        'when': lambda m, t: (m['light_spell_count'] >= 1) & (m['heavy_spell_count'] >= 1),
+        'category': 'Spells',
+        'title': 'Balanced Spell Suite',
+        'description': "Having both light ({light_spell_count}) and heavy ({heavy_spell_count}) spells provides versatility in dealing with various threats and supporting pushes."
+    },
+    {
+        'when': lambda m, t: m['tank_count'] >= 2,
+        'category': 'Tank Support',
+        'title': 'Strong Tank Presence',
+        'description': "With {tank_count} tanks, this deck can create powerful pushes by protecting support troops and applying sustained pressure."
+    },
+]
+
+WEAKNESS_RULES = [
+    {
+        'when': lambda m, t: m['avg_elixir'] > t['high_elixir'],
+        'category': 'Cycle Speed',
+        'title': 'Heavy Deck - Slow Cycle',
+        'description': "Average elixir of {avg_elixir} makes this deck slow to cycle. You may struggle against faster decks and have difficulty defending when low on elixir.",
+        'severity': 'high'
+    },
+    {
+        'when': lambda m, t: m['air_targeting_count'] < t['min_air_defense'],
+        'category': 'Air Defense',
+        'title': 'Vulnerable to Air Attacks',
+        'description': "Only {air_targeting_count} air-targeting card(s) in this deck. You'll struggle against air-heavy decks with Balloon, Lava Hound, or mass flying troops.",
+        'severity': 'high'
+    },
+    {
+        'when': lambda m, t: m['splash_damage_count'] < t['min_splash'],
+        'category': 'Area Damage',
+        'title': 'Weak Against Swarm Decks',
+        'description': "With only {splash_damage_count} splash damage card(s), you may struggle to defend against swarm troops like Skeleton Army, Goblin Gang, and Minion Horde.",
+        'severity': 'high'
+    },
+    {
+        'when': lambda m, t: m['heavy_spell_count'] == 0,
+        'category': 'Spells',
+        'title': 'No Heavy Spell',
+        'description': "Without a heavy spell (Fireball, Rocket, Lightning, Poison), you'll have difficulty dealing with buildings like X-Bow, Mortar, or Tesla, and may struggle to finish low-HP towers.",
+        'severity': 'medium'
+    },
+    {
+        'when': lambda m, t: m['light_spell_count'] == 0,
+        'category': 'Spells',
+        'title': 'No Light Spell',
+        'description': "Without a light spell (Zap, Log, Arrows, Snowball), you may struggle to counter swarm troops quickly and reset charging units like Prince or Inferno Dragon.",
+        'severity': 'medium'
+    },
+    {
+        'when': lambda m, t: m['win_condition_count'] < t['min_win_conditions'],
+        'category': 'Win Conditions',
+        'title': 'No Clear Win Condition',
+        'description': "This deck lacks a clear win condition. Without a reliable tower-targeting card, you may struggle to deal consistent tower damage.",
+        'severity': 'high'
+    },
+    {
+        'when': lambda m, t: m['win_condition_count'] > t['max_win_conditions'],
+        'category': 'Win Conditions',
+        'title': 'Too Many Win Conditions',
+        'description': "Having {win_condition_count} win conditions might make the deck unfocused. Consider replacing one with a support or defensive card.",
+        'severity': 'low'
+    },
+    {
+        'when': lambda m, t: m['total_spells'] >= 4,
+        'category': 'Spells',
+        'title': 'Too Spell-Heavy',
+        'description': "With {total_spells} spells, you may lack troops for defense and counter-pushes. Consider replacing one spell with a versatile troop.",
+        'severity': 'medium'
+    },
+]
+
+SEVERITY_SCORES = {'high': 3, 'medium': 2, 'low': 1}
+
+# Lowest net score (strengths minus half the weakness severity) of each rating, best first
+RATING_SCORES = [(4, 'excellent'), (2, 'good'), (0, 'average')]
+LOWEST_RATING = 'poor'
+
+# Card additions suggested for a weakness, with the roles kept when picking removals
+SUGGESTION_RULES = [
+    {
+        'when': lambda m, t: m['air_targeting_count'] < t['min_air_defense'],
+        'type': 'Add Air Defense',
+        'reason': 'Deck is vulnerable to air attacks',
+        'candidates': ['Musketeer', 'Mega Minion', 'Archers', 'Electro Wizard', 'Baby Dragon', 'Tesla', 'Inferno Tower'],
+        'removal': {'exclude_types': ['air_targeting']}
+    },
+    {
+        'when': lambda m, t: m['splash_damage_count'] < t['min_splash'],
+        'type': 'Add Splash Damage',
+        'reason': 'Deck struggles against swarm troops',
+        'candidates': ['Valkyrie', 'Baby Dragon', 'Wizard', 'Bomber', 'Arrows', 'Fireball', 'Log'],
+        'removal': {'exclude_types': ['splash']}
+    },
+    {
+        'when': lambda m, t: m['heavy_spell_count'] == 0,
+        'type': 'Add Heavy Spell',
+        'reason': 'Need spell to deal with buildings and finish towers',
+        'candidates': ['Fireball', 'Rocket', 'Lightning', 'Poison'],
+        'removal': {'prefer_type': 'spell'}
+    },
+    {
+        'when': lambda m, t: m['light_spell_count'] == 0,
+        'type': 'Add Light Spell',
+        'reason': 'Need quick response to swarm troops and charging units',
+        'candidates': ['Zap', 'Log', 'Arrows', 'Snowball'],
+        'removal': {'prefer_type': 'spell'}
+    },
+    {
+        'when': lambda m, t: m['win_condition_count'] < t['min_win_conditions'],
+        'type': 'Add Win Condition',
+        'reason': 'Deck needs a reliable way to deal tower damage',
+        'candidates': ['Hog Rider', 'Giant', 'Royal Giant', 'Balloon', 'Miner', 'Graveyard'],
+        'removal': {'exclude_types': ['win_condition']}
+    },
+]
+
+CHEAPER_ALTERNATIVES = ['Knight', 'Skeletons', 'Ice Spirit', 'Ice Golem']
+
+# Roles kept by a suggestion's exclude_types
+EXCLUDE_TYPE_BITS = {'air_targeting': AIR_TARGETING, 'splash': SPLASH_DAMAGE, 'win_condition': WIN_CONDITION}
+
+DEFAULT_THRESHOLDS = {
+    'high_elixir': 4.5,
+    'low_elixir': 3.0,
+    'min_air_defense': 2,
+    'min_splash': 2,
+    'min_win_conditions': 1,
+    'max_win_conditions': 3,
+}
+
+
+class CardFeatureMatrix:
+    """
+    NumPy view of a CardFeatureTable, addressed by cards.id
+    
+    Matrix rows are the table's rows, so batch results can be rendered
+    straight from the table.
+    """
+    
+    def __init__(self, table: CardFeatureTable):
+        """
+        Build the matrix
+        
+        Args:
+            table: Card feature table
+        """
+        self.table = table
+        ids = np.array(table.ids, dtype=np.int64)
+        self.row_of_id = np.full(int(ids.max()) + 1 if len(ids) else 1, -1, dtype=np.int32)
+        self.row_of_id[ids] = np.arange(len(ids), dtype=np.int32)
+        
+        self.elixir = np.frombuffer(table.elixir, dtype=np.int16).astype(np.int32)
+        bits = np.frombuffer(table.bits, dtype=np.uint8)
+        self.flags = {
+            bit: ((bits & bit) != 0).astype(np.int8)
+            for bit in (AIR_TARGETING, SPLASH_DAMAGE, WIN_CONDITION, TANK, LIGHT_SPELL, HEAVY_SPELL)
+        }
+        
+        # Deck averages exactly as round() computes them for the scalar analyzer
+        max_total = DECK_SIZE * int(self.elixir.max()) if len(table) else 0
+        self.avg_elixir = np.array([round(total / DECK_SIZE, 2) for total in range(max_total + 1)])
+    
+    def rows(self, deck_card_ids) -> 'np.ndarray':
+        """
+        Map a matrix of card ids to matrix rows
+        
+        Args:
+            deck_card_ids: N x 8 card ids (cards.id)
+        
+        Returns:
+            np.ndarray: N x 8 row indexes
+        
+        Raises:
+            ValueError: If the shape is wrong or an id is not in the catalog
+        """
+        ids = np.asarray(deck_card_ids, dtype=np.int64)
+        if ids.ndim != 2 or ids.shape[1] != DECK_SIZE:
+            raise ValueError(f"Expected an N x {DECK_SIZE} matrix of card ids, got shape {ids.shape}")
+        
+        known = (ids >= 0) & (ids < len(self.row_of_id))
+        rows = np.where(known, self.row_of_id[np.where(known, ids, 0)], -1)
+        if (rows < 0).any():
+            unknown = sorted(set(ids[rows < 0].tolist()))
+            raise ValueError(f"Unknown card ids: {unknown[:10]}")
+        return rows
 
 
 class DeckAnalyzer:
     """Analyzes Clash Royale decks and provides insights"""
     
-    def __init__(self):
-        """Initialize the deck analyzer with thresholds from config"""
-        self.thresholds = current_app.config.get('ANALYSIS_THRESHOLDS', {
-            'high_elixir': 4.5,
-            'low_elixir': 3.0,
-            'min_air_defense': 2,
-            'min_splash': 2,
-            'min_win_conditions': 1,
-            'max_win_conditions': 3,
-        })
+    def __init__(self, thresholds: Optional[Dict] = None):
+        """
+        Initialize the deck analyzer
+        
+        Args:
+            thresholds: Analysis thresholds; defaults to ANALYSIS_THRESHOLDS
+                from the app config. Passing them lets the analyzer run
+                outside an app context (e.g. in worker processes).
+        """
+        if thresholds is None:
+            thresholds = current_app.config.get('ANALYSIS_THRESHOLDS', DEFAULT_THRESHOLDS)
+        self.thresholds = thresholds
+        # Identifies the rule set; stored analyses are keyed by analysis_version()
+        self.thresholds_version = hashlib.sha1(
+            json.dumps(self.thresholds, sort_keys=True).encode()
+        ).hexdigest()[:16]
+        # CardFeatureMatrix of the current card table, used by analyze_decks
+        self._feature_matrix: Optional[CardFeatureMatrix] = None
+    
+    def analysis_version(self, card_ids: Sequence[int], table: Optional[CardFeatureTable] = None) -> str:
+        """
+        Identify the analysis this analyzer produces for a deck
+        
+        An analysis depends only on the thresholds and on its own cards'
+        names, elixir costs and roles, so stored analyses are keyed by both:
+        a card sync that changes a card's cost or roles yields a new version
+        for the decks holding it, and every other deck keeps its analysis.
+        
+        Args:
+            card_ids: Card ids (cards.id) of the deck
+            table: Card feature table; defaults to the current catalog's
+        
+        Returns:
+            str: Short hex digest of thresholds_version and the cards' features
+        
+        Raises:
+            KeyError: If a card is not in the table
+        """
+        table = table or get_card_table()
+        return hashlib.sha1(
+            f'{self.thresholds_version}:{table.features_digest(table.rows(card_ids))}'.encode()
+        ).hexdigest()[:16]
     
     def analyze_deck(self, cards: List[Card]) -> Dict:
         """
@@ -27,24 +299,71 @@ class DeckAnalyzer:
         
         Args:
             cards: List of Card objects (should be 8 cards)
-            
+        
         Returns:
             Dict: Complete analysis with metrics, strengths, weaknesses, and suggestions
         """
-        if len(cards) != 8:
-            raise ValueError(f"Deck must contain exactly 8 cards, got {len(cards)}")
+        return self.analyze_rows(CardFeatureTable.from_cards(cards), range(len(cards)))
+    
+    def analyze_card_ids(self, card_ids: Sequence[int], table: Optional[CardFeatureTable] = None) -> Dict:
+        """
+        Analyze a deck given by card ids
+        
+        Args:
+            card_ids: The deck's 8 card ids (cards.id)
+            table: Card feature table; defaults to the current catalog's
+                (which needs an app context)
+        
+        Returns:
+            Dict: Complete analysis, as analyze_deck
+        
+        Raises:
+            ValueError: If the deck does not have 8 cards or a card id is unknown
+        """
+        card_ids = list(card_ids)
+        refresh = table is None
+        table = table or get_card_table()
+        try:
+            rows = table.rows(card_ids)
+        except KeyError:
+            if not refresh:
+                raise ValueError(f"Unknown card ids in deck: {card_ids}")
+            # The cards may have been stored after the catalog version was read
+            table = get_card_table(refresh=True)
+            try:
+                rows = table.rows(card_ids)
+            except KeyError:
+                raise ValueError(f"Unknown card ids in deck: {card_ids}")
+        return self.analyze_rows(table, rows)
+    
+    def analyze_rows(self, table: CardFeatureTable, rows: Sequence[int]) -> Dict:
+        """
+        Analyze a deck given by card feature table rows
+        
+        Args:
+            table: Card feature table
+            rows: The deck's 8 rows in the table
+        
+        Returns:
+            Dict: Complete analysis, as analyze_deck
+        
+        Raises:
+            ValueError: If the deck does not have exactly 8 cards
+        """
+        if len(rows) != DECK_SIZE:
+            raise ValueError(f"Deck must contain exactly 8 cards, got {len(rows)}")
         
         # Calculate metrics
-        metrics = self._calculate_metrics(cards)
+        metrics = self._calculate_metrics(table, rows)
         
         # Analyze strengths
-        strengths = self._analyze_strengths(cards, metrics)
+        strengths = self._analyze_strengths(metrics)
         
         # Analyze weaknesses
-        weaknesses = self._analyze_weaknesses(cards, metrics)
+        weaknesses = self._analyze_weaknesses(metrics)
         
         # Generate suggestions
-        suggestions = self._generate_suggestions(cards, metrics, weaknesses)
+        suggestions = self._generate_suggestions(table, rows, metrics)
         
         # Calculate overall rating
         overall_rating = self._calculate_overall_rating(strengths, weaknesses)
@@ -57,17 +376,175 @@ class DeckAnalyzer:
             'overall_rating': overall_rating
         }
     
-    def _calculate_metrics(self, cards: List[Card]) -> Dict:
+    def feature_matrix(self) -> CardFeatureMatrix:
+        """
+        Get the card feature matrix, rebuilding it when the catalog changes
+        
+        Returns:
+            CardFeatureMatrix: Matrix of the current card catalog
+        
+        Raises:
+            RuntimeError: If NumPy is not installed
+        """
+        if np is None:
+            raise RuntimeError("Batch deck analysis requires NumPy")
+        
+        table = get_card_table()
+        matrix = self._feature_matrix
+        if matrix is None or matrix.table is not table:
+            matrix = self._feature_matrix = CardFeatureMatrix(table)
+        return matrix
+    
+    def analyze_decks(self, deck_card_ids, matrix: Optional[CardFeatureMatrix] = None) -> List[Dict]:
+        """
+        Analyze many decks at once
+        
+        Metrics, rule matches and ratings are computed as array operations
+        over the card feature matrix; only matched rules are rendered per
+        deck. Each result equals analyze_deck on the same cards.
+        
+        Args:
+            deck_card_ids: N x 8 card ids (cards.id), one row per deck
+            matrix: Feature matrix to use (defaults to the current catalog's)
+        
+        Returns:
+            List[Dict]: One analysis per deck, in input order
+        
+        Raises:
+            ValueError: If the matrix shape is wrong or a card id is unknown
+            RuntimeError: If NumPy is not installed
+        """
+        matrix = matrix or self.feature_matrix()
+        if not len(deck_card_ids):
+            return []
+        rows = matrix.rows(deck_card_ids)
+        
+        flags = matrix.flags
+        light = flags[LIGHT_SPELL][rows].sum(axis=1)
+        heavy = flags[HEAVY_SPELL][rows].sum(axis=1)
+        columns = {
+            'avg_elixir': matrix.avg_elixir[matrix.elixir[rows].sum(axis=1)],
+            'air_targeting_count': flags[AIR_TARGETING][rows].sum(axis=1),
+            'splash_damage_count': flags[SPLASH_DAMAGE][rows].sum(axis=1),
+            'win_condition_count': flags[WIN_CONDITION][rows].sum(axis=1),
+            'light_spell_count': light,
+            'heavy_spell_count': heavy,
+            'tank_count': flags[TANK][rows].sum(axis=1),
+            'total_spells': light + heavy
+        }
+        
+        strength_masks = np.array([rule['when'](columns, self.thresholds) for rule in STRENGTH_RULES])
+        weakness_masks = np.array([rule['when'](columns, self.thresholds) for rule in WEAKNESS_RULES])
+        suggestion_masks = np.array([rule['when'](columns, self.thresholds) for rule in SUGGESTION_RULES])
+        heavy_decks = columns['avg_elixir'] > self.thresholds['high_elixir']
+        
+        net_score = self._net_scores(strength_masks, weakness_masks)
+        ratings = self.ratings(net_score)
+        
+        strengths = self._render_matches(STRENGTH_RULES, strength_masks, columns, self._render_strength)
+        weaknesses = self._render_matches(WEAKNESS_RULES, weakness_masks, columns, self._render_weakness)
+        
+        # The first card with the highest cost, as the scalar analyzer's stable sort picks it
+        heaviest = rows[np.arange(len(rows)), matrix.elixir[rows].argmax(axis=1)]
+        
+        # Back to Python values for JSON
+        table = matrix.table
+        metric_rows = zip(*(column.tolist() for column in columns.values()))
+        results = []
+        for i, (deck_rows, values, suggest, heavy_deck, heaviest_row, rating) in enumerate(zip(
+            rows.tolist(), metric_rows, suggestion_masks.T.tolist(), heavy_decks.tolist(),
+            heaviest.tolist(), ratings.tolist()
+        )):
+            suggestions = []
+            if any(suggest):
+                card_names = [table.names[row] for row in deck_rows]
+                for rule, matched in zip(SUGGESTION_RULES, suggest):
+                    if matched:
+                        suggestion = self._render_suggestion(rule, card_names, table, deck_rows)
+                        if suggestion:
+                            suggestions.append(suggestion)
+            if heavy_deck:
+                suggestions.append(self._render_reduce_elixir(table.names[heaviest_row]))
+            
+            results.append({
+                'metrics': dict(zip(columns, values)),
+                'strengths': strengths[i],
+                'weaknesses': weaknesses[i],
+                'suggestions': suggestions,
+                'overall_rating': rating
+            })
+        
+        return results
+    
+    def score_metrics(self, columns: Dict):
+        """
+        Net rating score of metrics, as _calculate_overall_rating computes it
+        
+        Args:
+            columns: Metric arrays, one value per deck
+        
+        Returns:
+            np.ndarray: Net score per deck
+        """
+        return self._net_scores(
+            np.array([rule['when'](columns, self.thresholds) for rule in STRENGTH_RULES]),
+            np.array([rule['when'](columns, self.thresholds) for rule in WEAKNESS_RULES])
+        )
+    
+    @staticmethod
+    def _net_scores(strength_masks, weakness_masks):
+        """Net score per deck from rules x decks match matrices"""
+        severity = np.array([SEVERITY_SCORES.get(rule['severity'], 1) for rule in WEAKNESS_RULES])
+        return strength_masks.sum(axis=0) - (severity @ weakness_masks) / 2
+    
+    @staticmethod
+    def ratings(net_score):
+        """Rating per deck for an array of net scores"""
+        return np.select(
+            [net_score >= score for score, _ in RATING_SCORES], [rating for _, rating in RATING_SCORES], LOWEST_RATING
+        )
+    
+    @staticmethod
+    def _render_matches(rules: List[Dict], masks, columns: Dict, render) -> List[List[Dict]]:
+        """
+        Render matched rules for every deck, in rule order
+        
+        A rule's text depends only on the metrics its template names, so each
+        distinct combination of those values is rendered once and copied.
+        
+        Args:
+            rules: Rule table
+            masks: Rules x decks boolean matrix of matches
+            columns: Metric arrays, one value per deck
+            render: Renders a rule for a metrics dict
+        
+        Returns:
+            List[List[Dict]]: Rendered rules per deck
+        """
+        rendered = [[] for _ in range(masks.shape[1])]
+        for rule, mask in zip(rules, masks):
+            decks = np.flatnonzero(mask)
+            fields = [field for _, field, _, _ in Formatter().parse(rule['description']) if field]
+            keys = zip(*(columns[field][decks].tolist() for field in fields)) if fields else [()] * len(decks)
+            cache = {}
+            for deck, key in zip(decks.tolist(), keys):
+                item = cache.get(key)
+                if item is None:
+                    item = cache[key] = render(rule, dict(zip(fields, key)))
+                rendered[deck].append(dict(item))
+        return rendered
+    
+    def _calculate_metrics(self, table: CardFeatureTable, rows: Sequence[int]) -> Dict:
         """Calculate deck metrics"""
-        total_elixir = sum(card.elixir_cost for card in cards)
-        avg_elixir = round(total_elixir / len(cards), 2)
+        total_elixir = sum(table.elixir[row] for row in rows)
+        avg_elixir = round(total_elixir / len(rows), 2)
         
-        air_targeting_count = sum(1 for card in cards if card.is_air_targeting)
-        splash_damage_count = sum(1 for card in cards if card.is_splash_damage)
-        win_condition_count = sum(1 for card in cards if card.is_win_condition)
-        tank_count = sum(1 for card in cards if card.is_tank)
+        air_targeting_count = table.count(rows, AIR_TARGETING)
+        splash_damage_count = table.count(rows, SPLASH_DAMAGE)
+        win_condition_count = table.count(rows, WIN_CONDITION)
+        tank_count = table.count(rows, TANK)
         
-        spell_counts = self._count_spells(cards)
+        spell_counts = self._count_spells(table, rows)
         
         return {
             'avg_elixir': avg_elixir,
@@ -80,10 +557,10 @@ class DeckAnalyzer:
             'total_spells': spell_counts['total']
         }
     
-    def _count_spells(self, cards: List[Card]) -> Dict:
+    def _count_spells(self, table: CardFeatureTable, rows: Sequence[int]) -> Dict:
         """Count spell types in deck"""
-        light_spells = sum(1 for card in cards if card.spell_type == 'light')
-        heavy_spells = sum(1 for card in cards if card.spell_type == 'heavy')
+        light_spells = table.count(rows, LIGHT_SPELL)
+        heavy_spells = table.count(rows, HEAVY_SPELL)
         
         return {
             'light': light_spells,
@@ -91,268 +568,115 @@ class DeckAnalyzer:
             'total': light_spells + heavy_spells
         }
     
-    def _analyze_strengths(self, cards: List[Card], metrics: Dict) -> List[Dict]:
+    @staticmethod
+    def _render_strength(rule: Dict, metrics: Dict) -> Dict:
+        """Render a matched strength rule"""
+        return {
+            'category': rule['category'],
+            'title': rule['title'],
+            'description': rule['description'].format(**metrics)
+        }
+    
+    @staticmethod
+    def _render_weakness(rule: Dict, metrics: Dict) -> Dict:
+        """Render a matched weakness rule"""
+        return {
+            'category': rule['category'],
+            'title': rule['title'],
+            'description': rule['description'].format(**metrics),
+            'severity': rule['severity']
+        }
+    
+    def _analyze_strengths(self, metrics: Dict) -> List[Dict]:
         """Identify deck strengths"""
-        strengths = []
-        
-        # Fast cycle deck
-        if metrics['avg_elixir'] < self.thresholds['low_elixir']:
-            strengths.append({
-                'category': 'Cycle Speed',
-                'title': 'Fast Cycle Deck',
-                'description': f"With an average elixir cost of {metrics['avg_elixir']}, this deck cycles extremely fast, allowing you to quickly return to key cards and apply constant pressure."
-            })
-        
-        # Good elixir balance
-        if self.thresholds['low_elixir'] <= metrics['avg_elixir'] <= self.thresholds['high_elixir']:
-            strengths.append({
-                'category': 'Balance',
-                'title': 'Well-Balanced Elixir',
-                'description': f"Average elixir of {metrics['avg_elixir']} provides a good balance between defense and offense without being too heavy or too light."
-            })
-        
-        # Strong air defense
-        if metrics['air_targeting_count'] >= self.thresholds['min_air_defense'] + 1:
-            strengths.append({
-                'category': 'Air Defense',
-                'title': 'Excellent Air Defense',
-                'description': f"With {metrics['air_targeting_count']} air-targeting cards, this deck is well-equipped to handle aerial threats like Balloon, Lava Hound, and flying troops."
-            })
-        
-        # Good splash damage
-        if metrics['splash_damage_count'] >= self.thresholds['min_splash']:
-            strengths.append({
-                'category': 'Area Damage',
-                'title': 'Strong Splash Damage',
-                'description': f"Having {metrics['splash_damage_count']} splash damage cards makes this deck effective against swarm troops like Skeleton Army, Minion Horde, and Goblin Gang."
-            })
-        
-        # Multiple win conditions
-        if metrics['win_condition_count'] >= 2:
-            strengths.append({
-                'category': 'Win Conditions',
-                'title': 'Multiple Win Conditions',
-                'description': f"This deck has {metrics['win_condition_count']} win conditions, making it unpredictable and harder for opponents to defend against."
-            })
-        
-        # Good spell balance
-        if metrics['light_spell_count'] >= 1 and metrics['heavy_spell_count'] >= 1:
-            strengths.append({
-                'category': 'Spells',
-                'title': 'Balanced Spell Suite',
-                'description': f"Having both light ({metrics['light_spell_count']}) and heavy ({metrics['heavy_spell_count']}) spells provides versatility in dealing with various threats and supporting pushes."
-            })
-        
-        # Tank synergy
-        if metrics['tank_count'] >= 2:
-            strengths.append({
-                'category': 'Tank Support',
-                'title': 'Strong Tank Presence',
-                'description': f"With {metrics['tank_count']} tanks, this deck can create powerful pushes by protecting support troops and applying sustained pressure."
-            })
-        
-        return strengths
+        return [
+            self._render_strength(rule, metrics)
+            for rule in STRENGTH_RULES if rule['when'](metrics, self.thresholds)
+        ]
     
-    def _analyze_weaknesses(self, cards: List[Card], metrics: Dict) -> List[Dict]:
+    def _analyze_weaknesses(self, metrics: Dict) -> List[Dict]:
         """Identify deck weaknesses"""
-        weaknesses = []
-        
-        # Heavy deck
-        if metrics['avg_elixir'] > self.thresholds['high_elixir']:
-            weaknesses.append({
-                'category': 'Cycle Speed',
-                'title': 'Heavy Deck - Slow Cycle',
-                'description': f"Average elixir of {metrics['avg_elixir']} makes this deck slow to cycle. You may struggle against faster decks and have difficulty defending when low on elixir.",
-                'severity': 'high'
-            })
-        
-        # Weak air defense
-        if metrics['air_targeting_count'] < self.thresholds['min_air_defense']:
-            weaknesses.append({
-                'category': 'Air Defense',
-                'title': 'Vulnerable to Air Attacks',
-                'description': f"Only {metrics['air_targeting_count']} air-targeting card(s) in this deck. You'll struggle against air-heavy decks with Balloon, Lava Hound, or mass flying troops.",
-                'severity': 'high'
-            })
-        
-        # Weak against swarms
-        if metrics['splash_damage_count'] < self.thresholds['min_splash']:
-            weaknesses.append({
-                'category': 'Area Damage',
-                'title': 'Weak Against Swarm Decks',
-                'description': f"With only {metrics['splash_damage_count']} splash damage card(s), you may struggle to defend against swarm troops like Skeleton Army, Goblin Gang, and Minion Horde.",
-                'severity': 'high'
-            })
-        
-        # No big spell
-        if metrics['heavy_spell_count'] == 0:
-            weaknesses.append({
-                'category': 'Spells',
-                'title': 'No Heavy Spell',
-                'description': "Without a heavy spell (Fireball, Rocket, Lightning, Poison), you'll have difficulty dealing with buildings like X-Bow, Mortar, or Tesla, and may struggle to finish low-HP towers.",
-                'severity': 'medium'
-            })
-        
-        # No small spell
-        if metrics['light_spell_count'] == 0:
-            weaknesses.append({
-                'category': 'Spells',
-                'title': 'No Light Spell',
-                'description': "Without a light spell (Zap, Log, Arrows, Snowball), you may struggle to counter swarm troops quickly and reset charging units like Prince or Inferno Dragon.",
-                'severity': 'medium'
-            })
-        
-        # No win condition
-        if metrics['win_condition_count'] < self.thresholds['min_win_conditions']:
-            weaknesses.append({
-                'category': 'Win Conditions',
-                'title': 'No Clear Win Condition',
-                'description': "This deck lacks a clear win condition. Without a reliable tower-targeting card, you may struggle to deal consistent tower damage.",
-                'severity': 'high'
-            })
-        
-        # Too many win conditions
-        if metrics['win_condition_count'] > self.thresholds['max_win_conditions']:
-            weaknesses.append({
-                'category': 'Win Conditions',
-                'title': 'Too Many Win Conditions',
-                'description': f"Having {metrics['win_condition_count']} win conditions might make the deck unfocused. Consider replacing one with a support or defensive card.",
-                'severity': 'low'
-            })
-        
-        # Too spell-heavy
-        if metrics['total_spells'] >= 4:
-            weaknesses.append({
-                'category': 'Spells',
-                'title': 'Too Spell-Heavy',
-                'description': f"With {metrics['total_spells']} spells, you may lack troops for defense and counter-pushes. Consider replacing one spell with a versatile troop.",
-                'severity': 'medium'
-            })
-        
-        return weaknesses
+        return [
+            self._render_weakness(rule, metrics)
+            for rule in WEAKNESS_RULES if rule['when'](metrics, self.thresholds)
+        ]
     
-    def _generate_suggestions(self, cards: List[Card], metrics: Dict, weaknesses: List[Dict]) -> List[Dict]:
+    def _generate_suggestions(self, table: CardFeatureTable, rows: Sequence[int], metrics: Dict) -> List[Dict]:
         """Generate card replacement suggestions based on weaknesses"""
         suggestions = []
-        card_names = [card.name for card in cards]
+        card_names = [table.names[row] for row in rows]
         
-        # Suggest air defense if weak
-        if metrics['air_targeting_count'] < self.thresholds['min_air_defense']:
-            air_defense_suggestions = ['Musketeer', 'Mega Minion', 'Archers', 'Electro Wizard', 'Baby Dragon', 'Tesla', 'Inferno Tower']
-            available_suggestions = [card for card in air_defense_suggestions if card not in card_names]
-            
-            if available_suggestions:
-                suggestions.append({
-                    'type': 'Add Air Defense',
-                    'reason': 'Deck is vulnerable to air attacks',
-                    'consider_adding': available_suggestions[:3],
-                    'consider_removing': self._suggest_removals(cards, exclude_types=['air_targeting'])
-                })
-        
-        # Suggest splash if weak
-        if metrics['splash_damage_count'] < self.thresholds['min_splash']:
-            splash_suggestions = ['Valkyrie', 'Baby Dragon', 'Wizard', 'Bomber', 'Arrows', 'Fireball', 'Log']
-            available_suggestions = [card for card in splash_suggestions if card not in card_names]
-            
-            if available_suggestions:
-                suggestions.append({
-                    'type': 'Add Splash Damage',
-                    'reason': 'Deck struggles against swarm troops',
-                    'consider_adding': available_suggestions[:3],
-                    'consider_removing': self._suggest_removals(cards, exclude_types=['splash'])
-                })
-        
-        # Suggest big spell if missing
-        if metrics['heavy_spell_count'] == 0:
-            heavy_spell_suggestions = ['Fireball', 'Rocket', 'Lightning', 'Poison']
-            available_suggestions = [card for card in heavy_spell_suggestions if card not in card_names]
-            
-            if available_suggestions:
-                suggestions.append({
-                    'type': 'Add Heavy Spell',
-                    'reason': 'Need spell to deal with buildings and finish towers',
-                    'consider_adding': available_suggestions[:3],
-                    'consider_removing': self._suggest_removals(cards, prefer_type='spell')
-                })
-        
-        # Suggest small spell if missing
-        if metrics['light_spell_count'] == 0:
-            light_spell_suggestions = ['Zap', 'Log', 'Arrows', 'Snowball']
-            available_suggestions = [card for card in light_spell_suggestions if card not in card_names]
-            
-            if available_suggestions:
-                suggestions.append({
-                    'type': 'Add Light Spell',
-                    'reason': 'Need quick response to swarm troops and charging units',
-                    'consider_adding': available_suggestions[:3],
-                    'consider_removing': self._suggest_removals(cards, prefer_type='spell')
-                })
-        
-        # Suggest win condition if missing
-        if metrics['win_condition_count'] < self.thresholds['min_win_conditions']:
-            win_con_suggestions = ['Hog Rider', 'Giant', 'Royal Giant', 'Balloon', 'Miner', 'Graveyard']
-            available_suggestions = [card for card in win_con_suggestions if card not in card_names]
-            
-            if available_suggestions:
-                suggestions.append({
-                    'type': 'Add Win Condition',
-                    'reason': 'Deck needs a reliable way to deal tower damage',
-                    'consider_adding': available_suggestions[:3],
-                    'consider_removing': self._suggest_removals(cards, exclude_types=['win_condition'])
-                })
-        
-        # Suggest reducing elixir if too heavy
+        for rule in SUGGESTION_RULES:
+            if rule['when'](metrics, self.thresholds):
+                suggestion = self._render_suggestion(rule, card_names, table, rows)
+                if suggestion:
+                    suggestions.append(suggestion)
+        
+        # Suggest reducing elixir if too heavy (the first of the most expensive cards)
         if metrics['avg_elixir'] > self.thresholds['high_elixir']:
-            heavy_cards = sorted([card for card in cards], key=lambda c: c.elixir_cost, reverse=True)
-            suggestions.append({
-                'type': 'Reduce Elixir Cost',
-                'reason': 'Deck cycles too slowly',
-                'consider_replacing': heavy_cards[0].name if heavy_cards else None,
-                'with_cheaper_alternatives': ['Knight', 'Skeletons', 'Ice Spirit', 'Ice Golem']
-            })
+            heaviest = max(rows, key=lambda row: table.elixir[row], default=None)
+            suggestions.append(self._render_reduce_elixir(table.names[heaviest] if heaviest is not None else None))
         
         return suggestions
     
-    def _suggest_removals(self, cards: List[Card], exclude_types: List[str] = None, prefer_type: str = None) -> List[str]:
+    def _render_suggestion(self, rule: Dict, card_names: List[str], table: CardFeatureTable,
+                           rows: Sequence[int]) -> Optional[Dict]:
+        """Render a matched suggestion rule, or None if every candidate is already in the deck"""
+        available_suggestions = [card for card in rule['candidates'] if card not in card_names]
+        if not available_suggestions:
+            return None
+        
+        return {
+            'type': rule['type'],
+            'reason': rule['reason'],
+            'consider_adding': available_suggestions[:3],
+            'consider_removing': self._suggest_removals(table, rows, **rule['removal'])
+        }
+    
+    @staticmethod
+    def _render_reduce_elixir(heaviest_card: Optional[str]) -> Dict:
+        """Render the suggestion to replace the most expensive card"""
+        return {
+            'type': 'Reduce Elixir Cost',
+            'reason': 'Deck cycles too slowly',
+            'consider_replacing': heaviest_card,
+            'with_cheaper_alternatives': list(CHEAPER_ALTERNATIVES)
+        }
+    
+    @staticmethod
+    def _suggest_removals(table: CardFeatureTable, rows: Iterable[int], exclude_types: List[str] = None,
+                          prefer_type: str = None) -> List[str]:
         """Suggest cards that could be removed"""
-        exclude_types = exclude_types or []
+        # Skip cards with important roles
+        keep = 0
+        for exclude_type in exclude_types or []:
+            keep |= EXCLUDE_TYPE_BITS.get(exclude_type, 0)
         candidates = []
         
-        for card in cards:
-            # Skip cards with important roles
-            if 'air_targeting' in exclude_types and card.is_air_targeting:
-                continue
-            if 'splash' in exclude_types and card.is_splash_damage:
-                continue
-            if 'win_condition' in exclude_types and card.is_win_condition:
+        for row in rows:
+            bits = table.bits[row]
+            if bits & keep:
                 continue
             
             # Prefer removing spells if specified
-            if prefer_type == 'spell' and card.is_spell:
-                candidates.insert(0, card.name)
+            if prefer_type == 'spell' and bits & SPELL:
+                candidates.insert(0, table.names[row])
             else:
-                candidates.append(card.name)
+                candidates.append(table.names[row])
         
         return candidates[:2]
     
     def _calculate_overall_rating(self, strengths: List[Dict], weaknesses: List[Dict]) -> str:
         """Calculate overall deck rating"""
         strength_score = len(strengths)
-        weakness_score = sum(
-            3 if w.get('severity') == 'high' else 2 if w.get('severity') == 'medium' else 1
-            for w in weaknesses
-        )
+        weakness_score = sum(SEVERITY_SCORES.get(w.get('severity'), 1) for w in weaknesses)
         
         net_score = strength_score - (weakness_score / 2)
         
-        if net_score >= 4:
-            return 'excellent'
-        elif net_score >= 2:
-            return 'good'
-        elif net_score >= 0:
-            return 'average'
-        else:
-            return 'poor'
+        for min_score, rating in RATING_SCORES:
+            if net_score >= min_score:
+                return rating
+        return LOWEST_RATING
 
 
 # Singleton instance
@@ -364,4 +688,4 @@ def get_analyzer() -> DeckAnalyzer:
     global _analyzer
     if _analyzer is None:
         _analyzer = DeckAnalyzer()
-    return _analyzer
\ No newline at end of file
+    return _analyzer
@@ -0,0 +1,342 @@
+"""
+Deck Similarity Index
+In-memory inverted index of stored decks for nearest-neighbour lookups by Jaccard similarity
+"""
+import logging
+import threading
+import time
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import db, Deck, DeckCard
+
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+except ImportError as e:
+    logger.warning("NumPy not installed, similar deck search unavailable: %s", e)
+    np = None
+
+
+class DeckSimilarityIndex:
+    """
+    Posting lists of the decks containing each card
+    
+    Each indexed deck gets a slot; per card, the slots of the decks holding
+    it are kept in a packed array. A query adds up its cards' posting lists
+    into per-slot overlap counts, from which Jaccard similarity follows
+    exactly: |A & B| / (|A| + |B| - |A & B|). Only decks sharing a card with
+    the query are ever touched, at about 37 bytes per indexed deck.
+    
+    The index is filled from the decks table in id order and kept current
+    incrementally: decks created in this process are added once their
+    transaction commits (see index_after_commit), and decks written by other
+    processes are picked up by syncing
+    ids past the high-water mark at most every sync_interval seconds. The
+    initial fill of a large table runs in the background; until it is
+    caught up, queries only see the decks loaded so far.
+    """
+    
+    def __init__(self, chunk_size: int, sync_interval: float, sync_overlap: int):
+        """
+        Initialize an empty index
+        
+        Args:
+            chunk_size: Decks read per query when syncing
+            sync_interval: Minimum seconds between syncs on the query path
+            sync_overlap: Deck ids below the high-water mark re-read on each
+                sync, for transactions that committed out of id order
+        """
+        self.chunk_size = chunk_size
+        self.sync_interval = sync_interval
+        self.sync_overlap = sync_overlap
+        self.lock = threading.Lock()
+        self.sync_lock = threading.Lock()
+        self.deck_ids = array('i')
+        self.sizes = array('b')
+        self.postings: Dict[int, array] = {}
+        # Bitmap of indexed deck ids, so a deck is never added twice
+        self.indexed = bytearray()
+        self.max_size = 0
+        self.high_water = 0
+        self.last_sync: Optional[float] = None
+        # Whether the last sync reached the end of the decks table
+        self.caught_up = False
+        self.queries = 0
+    
+    def __len__(self) -> int:
+        return len(self.deck_ids)
+    
+    def __contains__(self, deck_id: int) -> bool:
+        """Whether a deck id is indexed"""
+        byte = deck_id >> 3
+        return byte < len(self.indexed) and bool(self.indexed[byte] & (1 << (deck_id & 7)))
+    
+    def add(self, deck_id: int, card_ids: Sequence[int]) -> bool:
+        """
+        Index a deck
+        
+        Args:
+            deck_id: Deck id (decks.id)
+            card_ids: The deck's card ids (cards.id)
+        
+        Returns:
+            bool: False if the deck was already indexed
+        """
+        with self.lock:
+            return self._add(deck_id, card_ids)
+    
+    def _add(self, deck_id: int, card_ids: Sequence[int]) -> bool:
+        """Index a deck (lock held)"""
+        if deck_id in self:
+            return False
+        byte = deck_id >> 3
+        if byte >= len(self.indexed):
+            self.indexed.extend(bytes(max(byte + 1 - len(self.indexed), len(self.indexed))))
+        self.indexed[byte] |= 1 << (deck_id & 7)
+        
+        slot = len(self.deck_ids)
+        self.deck_ids.append(deck_id)
+        self.sizes.append(len(card_ids))
+        self.max_size = max(self.max_size, len(card_ids))
+        for card_id in card_ids:
+            postings = self.postings.get(card_id)
+            if postings is None:
+                postings = self.postings[card_id] = array('i')
+            postings.append(slot)
+        return True
+    
+    def sync(self, force: bool = False, max_chunks: Optional[int] = None, blocking: bool = True) -> int:
+        """
+        Index decks stored since the last sync
+        
+        Args:
+            force: Sync even if the last sync is more recent than sync_interval
+            max_chunks: Stop after reading this many chunks (caught_up tells
+                whether decks are left)
+            blocking: Wait for a sync running in another thread instead of
+                returning right away
+        
+        Returns:
+            int: Number of decks added
+        """
+        now = time.monotonic()
+        if not force and self.caught_up and now - self.last_sync < self.sync_interval:
+            return 0
+        
+        if not self.sync_lock.acquire(blocking=blocking):
+            return 0
+        try:
+            if not force and self.caught_up and time.monotonic() - self.last_sync < self.sync_interval:
+                return 0
+            
+            added = 0
+            chunks = 0
+            # Until caught up, continue from the high-water mark; afterwards re-read the overlap
+            last_id = max(0, self.high_water - self.sync_overlap) if self.caught_up else self.high_water
+            self.caught_up = False
+            while max_chunks is None or chunks < max_chunks:
+                chunks += 1
+                deck_ids = [
+                    deck_id for (deck_id,) in db.session.query(Deck.id).filter(
+                        Deck.id > last_id
+                    ).order_by(Deck.id).limit(self.chunk_size)
+                ]
+                if not deck_ids:
+                    self.caught_up = True
+                    break
+                last_id = deck_ids[-1]
+                
+                new_ids = [deck_id for deck_id in deck_ids if deck_id not in self]
+                if new_ids:
+                    added += self._add_rows(db.session.query(DeckCard.deck_id, DeckCard.card_id).filter(
+                        DeckCard.deck_id.in_(new_ids)
+                    ).order_by(DeckCard.deck_id))
+                
+                if len(deck_ids) < self.chunk_size:
+                    self.caught_up = True
+                    break
+            
+            self.high_water = max(self.high_water, last_id)
+            self.last_sync = time.monotonic()
+        finally:
+            self.sync_lock.release()
+        
+        if added:
+            logger.info(f"Indexed {added} decks for similarity search ({len(self)} total)")
+        return added
+    
+    def _add_rows(self, rows: Iterable[Tuple[int, int]]) -> int:
+        """Index decks from (deck id, card id) rows grouped by deck"""
+        decks: Dict[int, List[int]] = {}
+        for deck_id, card_id in rows:
+            decks.setdefault(deck_id, []).append(card_id)
+        with self.lock:
+            return sum(1 for deck_id, card_ids in decks.items() if self._add(deck_id, card_ids))
+    
+    def similar(self, card_ids: Sequence[int], limit: int = 10,
+                exclude_deck_id: Optional[int] = None) -> List[Tuple[int, float, int]]:
+        """
+        Find the indexed decks most similar to a set of cards
+        
+        Ties are broken by the lower (older) deck id.
+        
+        Args:
+            card_ids: Query card ids (cards.id)
+            limit: Maximum number of decks
+            exclude_deck_id: Deck left out of the results (e.g. the query deck)
+        
+        Returns:
+            List[Tuple[int, float, int]]: (deck id, Jaccard similarity, shared
+                cards), most similar first; decks sharing no card are omitted
+        
+        Raises:
+            RuntimeError: If NumPy is not installed
+        """
+        if np is None:
+            raise RuntimeError("Similar deck search requires NumPy")
+        
+        query = list(set(card_ids))
+        with self.lock:
+            self.queries += 1
+            lists = [self.postings[card_id] for card_id in query if card_id in self.postings]
+            if not lists:
+                return []
+            # Copy out of the arrays so they can keep growing once the lock is released
+            hits = np.concatenate([np.frombuffer(postings, dtype=np.int32) for postings in lists])
+            overlap = np.bincount(hits, minlength=len(self.deck_ids))
+            slots = np.flatnonzero(overlap >= self._min_overlap(overlap, len(query), limit))
+            shared = overlap[slots]
+            sizes = np.frombuffer(self.sizes, dtype=np.int8)[slots].astype(np.int32)
+            deck_ids = np.frombuffer(self.deck_ids, dtype=np.int32)[slots]
+            del lists
+        
+        if exclude_deck_id is not None:
+            keep = deck_ids != exclude_deck_id
+            deck_ids, shared, sizes = deck_ids[keep], shared[keep], sizes[keep]
+        
+        similarity = shared / (len(query) + sizes - shared)
+        if len(similarity) > limit:
+            # Everything at least as similar as the limit-th best, ties included
+            cutoff = np.partition(similarity, len(similarity) - limit)[len(similarity) - limit]
+            top = np.flatnonzero(similarity >= cutoff)
+        else:
+            top = np.arange(len(similarity))
+        top = top[np.lexsort((deck_ids[top], -similarity[top]))][:limit]
+        
+        return [
+            (deck_id, round(score, 4), count)
+            for deck_id, score, count in zip(deck_ids[top].tolist(), similarity[top].tolist(), shared[top].tolist())
+        ]
+    
+    def _min_overlap(self, overlap, query_size: int, limit: int) -> int:
+        """
+        Smallest overlap a deck needs to possibly rank in the top limit (lock held)
+        
+        With t the highest overlap reached by limit + 1 decks (one may be
+        excluded), the limit-th best similarity is at least
+        t / (query_size + max_size - t), while a deck sharing o cards scores
+        at most o / query_size. Most decks share a card or two with any
+        query, so this prunes almost all of them before scoring.
+        """
+        at_least = np.cumsum(np.bincount(overlap, minlength=query_size + 1)[::-1])[::-1]
+        reached = np.flatnonzero(at_least[1:] >= limit + 1)
+        if not len(reached):
+            return 1
+        t = int(reached[-1]) + 1
+        bound_denominator = query_size + self.max_size - t
+        # Smallest o with o / query_size >= t / bound_denominator
+        return max(1, -(-t * query_size // bound_denominator))
+    
+    def get_stats(self) -> Dict:
+        """Get index size and counters"""
+        with self.lock:
+            postings_bytes = sum(postings.buffer_info()[1] * postings.itemsize for postings in self.postings.values())
+            return {
+                'decks': len(self.deck_ids),
+                'cards': len(self.postings),
+                'high_water': self.high_water,
+                'array_bytes': (
+                    len(self.deck_ids) * self.deck_ids.itemsize + len(self.sizes) + postings_bytes + len(self.indexed)
+                ),
+                'seconds_since_sync': round(time.monotonic() - self.last_sync, 1) if self.last_sync else None,
+                'queries': self.queries
+            }
+
+
+# Session.info key of the decks waiting for their transaction to commit
+PENDING_DECKS = 'deck_index_pending'
+
+
+def index_after_commit(session: Session, deck_id: int, card_ids: Sequence[int]) -> None:
+    """
+    Index a deck once the session's transaction commits
+    
+    Until then the deck may still be rolled back, with its savepoint or the
+    whole transaction, and its id reused. Decks written in a savepoint that
+    rolls back are dropped.
+    
+    Args:
+        session: Session the deck was written in
+        deck_id: Deck id (decks.id)
+        card_ids: The deck's card ids (cards.id)
+    """
+    transaction = session.get_nested_transaction() or session.get_transaction()
+    session.info.setdefault(PENDING_DECKS, []).append((transaction, deck_id, list(card_ids)))
+
+
+def _index_committed(session: Session) -> None:
+    """Index the pending decks once the outermost transaction has committed"""
+    if session.in_nested_transaction():
+        # Only a savepoint was released
+        return
+    pending = session.info.pop(PENDING_DECKS, None)
+    if pending:
+        get_deck_index()._add_rows(
+            (deck_id, card_id) for _, deck_id, card_ids in pending for card_id in card_ids
+        )
+
+
+def _drop_rolled_back(session: Session, previous_transaction) -> None:
+    """Forget the pending decks written in a transaction or savepoint that rolled back"""
+    pending = session.info.get(PENDING_DECKS)
+    if not pending:
+        return
+    kept = []
+    for entry in pending:
+        transaction = entry[0]
+        while transaction is not None and transaction is not previous_transaction:
+            transaction = transaction.parent
+        if transaction is None:
+            kept.append(entry)
+    session.info[PENDING_DECKS] = kept
+
+
+def init_deck_index() -> None:
+    """Install the session hooks that index decks after commit"""
+    if not event.contains(Session, 'after_commit', _index_committed):
+        event.listen(Session, 'after_commit', _index_committed)
+    if not event.contains(Session, 'after_soft_rollback', _drop_rolled_back):
+        event.listen(Session, 'after_soft_rollback', _drop_rolled_back)
+
+
+# Singleton instance
+_deck_index = None
+_deck_index_lock = threading.Lock()
+
+
+def get_deck_index() -> DeckSimilarityIndex:
+    """Get or create the per-process deck similarity index"""
+    global _deck_index
+    if _deck_index is None:
+        with _deck_index_lock:
+            if _deck_index is None:
+                _deck_index = DeckSimilarityIndex(
+                    chunk_size=current_app.config.get('DECK_INDEX_CHUNK_SIZE', 5000),
+                    sync_interval=current_app.config.get('DECK_INDEX_SYNC_INTERVAL', 10),
+                    sync_overlap=current_app.config.get('DECK_INDEX_SYNC_OVERLAP', 1000)
+                )
+    return _deck_index
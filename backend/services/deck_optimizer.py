@@ -0,0 +1,275 @@
+"""
+Deck Optimizer
+Searches the card catalog for the swaps that most improve a deck's rating
+"""
+import threading
+from itertools import combinations
+from typing import Dict, Optional, Sequence
+from services.card_features import AIR_TARGETING, SPLASH_DAMAGE, WIN_CONDITION, TANK, LIGHT_SPELL, HEAVY_SPELL
+from services.deck_analyzer import DeckAnalyzer, CardFeatureMatrix, DECK_SIZE, get_analyzer, np
+
+# Feature columns of a card signature; the last six are role flags
+SIGNATURE_FLAGS = (AIR_TARGETING, SPLASH_DAMAGE, WIN_CONDITION, TANK, LIGHT_SPELL, HEAVY_SPELL)
+
+# Metrics computed from summed signature columns (index into the signature)
+COUNT_METRICS = (
+    ('air_targeting_count', 1),
+    ('splash_damage_count', 2),
+    ('win_condition_count', 3),
+    ('tank_count', 4),
+    ('light_spell_count', 5),
+    ('heavy_spell_count', 6),
+)
+
+# Cards with the same effect as a suggested card listed per swap
+MAX_ALTERNATIVES = 3
+
+MAX_SWAP_CARDS = 2
+
+
+class CatalogSignatures:
+    """
+    Catalog cards grouped by their effect on deck metrics
+    
+    Cards with equal elixir cost and role flags change every metric, and so
+    the rating, in the same way; swaps are scored once per signature rather
+    than once per card.
+    """
+    
+    def __init__(self, matrix: CardFeatureMatrix):
+        """
+        Group the matrix rows
+        
+        Args:
+            matrix: Card feature matrix
+        """
+        self.matrix = matrix
+        features = np.column_stack(
+            [matrix.elixir] + [matrix.flags[bit] for bit in SIGNATURE_FLAGS]
+        ).astype(np.int32)
+        self.features = features
+        self.signatures, self.signature_of_row = np.unique(features, axis=0, return_inverse=True)
+        self.signature_of_row = self.signature_of_row.reshape(-1)
+        self.sizes = np.bincount(self.signature_of_row, minlength=len(self.signatures))
+        
+        # Rows of each signature, in id order
+        order = np.argsort(self.signature_of_row, kind='stable')
+        self.members = np.split(order, np.cumsum(self.sizes)[:-1])
+        
+        # Every unordered pair of signatures, for double swaps
+        first, second = np.triu_indices(len(self.signatures))
+        self.pairs = np.column_stack([first, second])
+        self.pair_features = self.signatures[first] + self.signatures[second]
+        self.pair_list = [tuple(pair) for pair in self.pairs.tolist()]
+
+
+class DeckOptimizer:
+    """
+    Finds the single and double card swaps that most raise a deck's net
+    rating score
+    
+    Each candidate deck's metrics are the current deck's sums minus the
+    removed cards' features plus the added signatures' features, scored in
+    one array operation with the analyzer's rules.
+    """
+    
+    def __init__(self, analyzer: DeckAnalyzer):
+        """
+        Initialize the optimizer
+        
+        Args:
+            analyzer: Analyzer whose thresholds and rules define the score
+        """
+        self.analyzer = analyzer
+        self.lock = threading.Lock()
+        self._signatures: Optional[CatalogSignatures] = None
+    
+    def signatures(self) -> CatalogSignatures:
+        """Get the catalog signatures, regrouping them when the catalog changes"""
+        matrix = self.analyzer.feature_matrix()
+        signatures = self._signatures
+        if signatures is None or signatures.matrix is not matrix:
+            with self.lock:
+                signatures = self._signatures
+                if signatures is None or signatures.matrix is not matrix:
+                    signatures = self._signatures = CatalogSignatures(matrix)
+        return signatures
+    
+    def optimize(self, card_ids: Sequence[int], limit: int = 5, max_swaps: int = MAX_SWAP_CARDS) -> Dict:
+        """
+        Find the best swaps for a deck
+        
+        Swaps are ordered by score gain, then fewer cards swapped, then the
+        smallest change in elixir cost. Only swaps that raise the score are
+        returned.
+        
+        Args:
+            card_ids: The deck's 8 card ids (cards.id)
+            limit: Maximum number of swaps returned
+            max_swaps: Largest number of cards replaced at once (1 or 2)
+        
+        Returns:
+            Dict: Current score and rating, and the best swaps
+        
+        Raises:
+            ValueError: If the deck is not 8 known cards or max_swaps is out of range
+            RuntimeError: If NumPy is not installed
+        """
+        if not 1 <= max_swaps <= MAX_SWAP_CARDS:
+            raise ValueError(f"max_swaps must be between 1 and {MAX_SWAP_CARDS}")
+        
+        signatures = self.signatures()
+        matrix = signatures.matrix
+        rows = matrix.rows([list(card_ids)])[0]
+        deck_features = signatures.features[rows]
+        base = deck_features.sum(axis=0)
+        current_score = float(self._scores(matrix, base[np.newaxis])[0])
+        
+        # Cards of each signature that are not already in the deck
+        available = signatures.sizes - np.bincount(
+            signatures.signature_of_row[rows], minlength=len(signatures.signatures)
+        )
+        
+        # One block per swap size, each (removed deck positions) x (added signatures)
+        blocks = [self._single_swaps(signatures, base, deck_features, available)]
+        if max_swaps >= 2:
+            blocks.append(self._double_swaps(signatures, base, deck_features, available))
+        
+        features = np.concatenate([block['features'] for block in blocks])
+        valid = np.concatenate([block['valid'] for block in blocks])
+        sizes = np.concatenate([np.full(len(block['valid']), len(block['added'][0])) for block in blocks])
+        offsets = np.cumsum([0] + [len(block['valid']) for block in blocks])
+        
+        scores = self._scores(matrix, features)
+        gains = scores - current_score
+        candidates = np.flatnonzero(valid & (gains > 0))
+        
+        # np.lexsort sorts by the last key first
+        elixir_change = np.abs(features[candidates, 0] - base[0])
+        order = candidates[np.lexsort((candidates, elixir_change, sizes[candidates], -gains[candidates]))][:limit]
+        
+        table = matrix.table
+        deck_rows = set(rows.tolist())
+        ratings = self.analyzer.ratings(scores[order]).tolist()
+        swaps = []
+        for index, rating in zip(order.tolist(), ratings):
+            block_index = int(np.searchsorted(offsets, index, side='right')) - 1
+            block = blocks[block_index]
+            removed, added = divmod(index - int(offsets[block_index]), len(block['added']))
+            add_rows, alternatives = self._pick_cards(signatures, block['added'][added], deck_rows)
+            swaps.append({
+                'remove': [table.names[rows[position]] for position in block['removed'][removed]],
+                'add': [table.names[row] for row in add_rows],
+                'alternatives': [[table.names[row] for row in options] for options in alternatives],
+                'score': float(scores[index]),
+                'score_gain': float(gains[index]),
+                'overall_rating': rating,
+                'metrics': self._metrics(matrix, features[index])
+            })
+        
+        return {
+            'score': current_score,
+            'overall_rating': self.analyzer.ratings(np.array([current_score])).tolist()[0],
+            'swaps': swaps,
+            'candidates_evaluated': int(valid.sum())
+        }
+    
+    @staticmethod
+    def _single_swaps(signatures: CatalogSignatures, base, deck_features, available) -> Dict:
+        """
+        Every replacement of one deck card by one signature
+        
+        Returns:
+            Dict: removed positions and added signatures, whose product (row
+                major) indexes the summed features and validity of each swap
+        """
+        count = len(signatures.signatures)
+        features = (base - deck_features)[:, np.newaxis, :] + signatures.signatures[np.newaxis, :, :]
+        return {
+            'removed': [(position,) for position in range(DECK_SIZE)],
+            'added': [(signature,) for signature in range(count)],
+            'features': features.reshape(-1, features.shape[-1]),
+            'valid': np.tile(available >= 1, DECK_SIZE)
+        }
+    
+    @staticmethod
+    def _double_swaps(signatures: CatalogSignatures, base, deck_features, available) -> Dict:
+        """Every replacement of two deck cards by an unordered pair of signatures"""
+        positions = list(combinations(range(DECK_SIZE), 2))
+        removed_features = np.array([deck_features[i] + deck_features[j] for i, j in positions])
+        features = (base - removed_features)[:, np.newaxis, :] + signatures.pair_features[np.newaxis, :, :]
+        
+        first, second = signatures.pairs[:, 0], signatures.pairs[:, 1]
+        pair_valid = np.where(
+            first == second,
+            available[first] >= 2,
+            (available[first] >= 1) & (available[second] >= 1)
+        )
+        return {
+            'removed': positions,
+            'added': signatures.pair_list,
+            'features': features.reshape(-1, features.shape[-1]),
+            'valid': np.tile(pair_valid, len(positions))
+        }
+    
+    def _scores(self, matrix: CardFeatureMatrix, features):
+        """Net rating score of each row of summed deck features"""
+        return self.analyzer.score_metrics(self._columns(matrix, features))
+    
+    @staticmethod
+    def _columns(matrix: CardFeatureMatrix, features) -> Dict:
+        """Metric arrays from summed deck features, as DeckAnalyzer computes them"""
+        columns = {'avg_elixir': matrix.avg_elixir[features[..., 0]]}
+        for metric, column in COUNT_METRICS:
+            columns[metric] = features[..., column]
+        columns['total_spells'] = columns['light_spell_count'] + columns['heavy_spell_count']
+        return columns
+    
+    def _metrics(self, matrix: CardFeatureMatrix, features) -> Dict:
+        """Metrics dict of one candidate deck, in the analyzer's key order"""
+        columns = self._columns(matrix, features)
+        return {
+            metric: columns[metric].item()
+            for metric in (
+                'avg_elixir', 'air_targeting_count', 'splash_damage_count', 'win_condition_count',
+                'light_spell_count', 'heavy_spell_count', 'tank_count', 'total_spells'
+            )
+        }
+    
+    @staticmethod
+    def _pick_cards(signatures: CatalogSignatures, added: Sequence[int], deck_rows: set):
+        """
+        Pick concrete cards for added signatures
+        
+        Returns:
+            Tuple[List[int], List[List[int]]]: Rows added, and the other
+                available rows with the same effect for each of them
+        """
+        taken = set(deck_rows)
+        add_rows = []
+        alternatives = []
+        for signature in added:
+            options = [row for row in signatures.members[signature].tolist() if row not in taken]
+            add_rows.append(options[0])
+            taken.add(options[0])
+            alternatives.append(options[1:1 + MAX_ALTERNATIVES])
+        
+        # Both cards of a same-signature pair are interchangeable with the same alternatives
+        if len(added) == 2 and added[0] == added[1]:
+            alternatives[0] = alternatives[1]
+        return add_rows, alternatives
+
+
+# Singleton instance
+_optimizer = None
+_optimizer_lock = threading.Lock()
+
+
+def get_optimizer() -> DeckOptimizer:
+    """Get or create the deck optimizer singleton"""
+    global _optimizer
+    if _optimizer is None:
+        with _optimizer_lock:
+            if _optimizer is None:
+                _optimizer = DeckOptimizer(get_analyzer())
+    return _optimizer
@@ -0,0 +1,409 @@
+"""
+Hot Players
+Access-frequency tracking and proactive refresh of popular players
+"""
+import heapq
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from flask import current_app
+from sqlalchemy import case, or_
+from models import db, upsert, Player, PlayerAccess
+from services.background_refresh import get_refresher
+from services.negative_cache import get_missing_players
+from services.adaptive_ttl import ttl_bounds, player_ttl
+
+logger = logging.getLogger(__name__)
+
+# Players considered per refresh slot when filtering by per-player expiry
+DUE_CANDIDATE_FACTOR = 4
+
+# Half-lives per access count era (see access_weight); weights stay below 2 ** ERA_HALF_LIVES
+ERA_HALF_LIVES = 64
+
+
+def access_weight(half_life: float, now: Optional[float] = None) -> Tuple[datetime, float]:
+    """
+    Weight of an access made now, for forward-decayed access counts
+    
+    Rather than decaying every stored count over time, each access is
+    weighted by 2 ** ((now - era start) / half_life): a count divided by the
+    current weight is the exponentially decayed count, and counts compare
+    correctly without ever being rewritten. Eras of ERA_HALF_LIVES
+    half-lives keep weights in float range; a count last updated in the
+    previous era is carried over by dividing it by 2 ** ERA_HALF_LIVES.
+    
+    Args:
+        half_life: Seconds for counts to halve
+        now: Unix time (defaults to the current time)
+    
+    Returns:
+        Tuple[datetime, float]: Start of the current era (naive UTC, like
+            updated_at) and the weight of an access
+    """
+    now = time.time() if now is None else now
+    era_seconds = half_life * ERA_HALF_LIVES
+    era_start = now // era_seconds * era_seconds
+    return datetime.utcfromtimestamp(era_start), 2.0 ** ((now - era_start) / half_life)
+
+
+def weighted_hits(table, era_start: datetime):
+    """SQL expression of stored access counts in the current era's weights"""
+    return case(
+        (table.c.updated_at >= era_start, table.c.hits),
+        else_=table.c.hits * 2.0 ** -ERA_HALF_LIVES
+    )
+
+
+class CountMinSketch:
+    """
+    Fixed-size frequency estimator
+    
+    Estimates never undercount; collisions can only inflate them, by at most
+    about total / width with high probability.
+    """
+    
+    def __init__(self, width: int, depth: int):
+        """
+        Initialize the sketch
+        
+        Args:
+            width: Counters per row
+            depth: Number of rows (independent hashes)
+        """
+        self.width = width
+        self.depth = depth
+        self.rows = [[0] * width for _ in range(depth)]
+    
+    def _indexes(self, key: str):
+        """Counter index of a key in each row"""
+        return [hash((row, key)) % self.width for row in range(self.depth)]
+    
+    def add(self, key: str) -> int:
+        """
+        Count one occurrence of a key
+        
+        Returns:
+            int: The key's new estimated count
+        """
+        estimate = None
+        for row, index in zip(self.rows, self._indexes(key)):
+            row[index] += 1
+            estimate = row[index] if estimate is None else min(estimate, row[index])
+        return estimate
+    
+    def estimate(self, key: str) -> int:
+        """Estimated count of a key"""
+        return min(row[index] for row, index in zip(self.rows, self._indexes(key)))
+    
+    def clear(self) -> None:
+        """Reset every counter"""
+        for row in self.rows:
+            row[:] = [0] * self.width
+
+
+class AccessTracker:
+    """
+    Per-process counts of player lookups, flushed to the player_access table
+    
+    Lookups are counted in a count-min sketch; the heaviest tags of the
+    current window are kept as candidates, with a min-heap finding the
+    coldest one to evict. Every flush_interval seconds the candidates'
+    counts are added to player_access in one upsert, scheduled off the
+    request path, and a new window starts.
+    """
+    
+    def __init__(self, width: int, depth: int, max_candidates: int, flush_interval: float, half_life: float):
+        """
+        Initialize the tracker
+        
+        Args:
+            width: Sketch counters per row
+            depth: Sketch rows
+            max_candidates: Number of heaviest tags flushed per window
+            flush_interval: Seconds between flushes
+            half_life: Seconds for access counts to halve
+        """
+        self.sketch = CountMinSketch(width, depth)
+        self.max_candidates = max_candidates
+        self.flush_interval = flush_interval
+        self.half_life = half_life
+        self.lock = threading.Lock()
+        self.candidates: Dict[str, int] = {}
+        # (estimate, tag) of the candidates; entries whose estimate has since grown are stale
+        self._heap: List[Tuple[int, str]] = []
+        self.window_started = time.monotonic()
+        self.recorded = 0
+        self.flushed = 0
+    
+    def record(self, player_tag: str) -> None:
+        """
+        Count a lookup of a normalized player tag
+        
+        Args:
+            player_tag: Normalized player tag
+        """
+        with self.lock:
+            estimate = self.sketch.add(player_tag)
+            self.recorded += 1
+            if player_tag in self.candidates or len(self.candidates) < self.max_candidates:
+                self._set_candidate(player_tag, estimate)
+            else:
+                coldest_estimate, coldest = self._coldest()
+                if estimate > coldest_estimate:
+                    heapq.heappop(self._heap)
+                    del self.candidates[coldest]
+                    self._set_candidate(player_tag, estimate)
+            due = time.monotonic() - self.window_started >= self.flush_interval
+        
+        if due:
+            get_refresher().schedule('player_access_flush', self.flush)
+    
+    def _set_candidate(self, player_tag: str, estimate: int) -> None:
+        """Add or update a candidate (lock held)"""
+        self.candidates[player_tag] = estimate
+        heapq.heappush(self._heap, (estimate, player_tag))
+        # Drop stale entries once they outnumber the live ones
+        if len(self._heap) > 2 * max(len(self.candidates), self.max_candidates):
+            self._heap = [(count, tag) for tag, count in self.candidates.items()]
+            heapq.heapify(self._heap)
+    
+    def _coldest(self) -> Tuple[int, str]:
+        """The candidate with the lowest estimate (lock held)"""
+        heap = self._heap
+        while heap[0][0] != self.candidates.get(heap[0][1]):
+            heapq.heappop(heap)
+        return heap[0]
+    
+    def _take_window(self) -> Dict[str, int]:
+        """Hand over the current window's candidates and start a new window"""
+        with self.lock:
+            counts, self.candidates = self.candidates, {}
+            self._heap = []
+            self.sketch.clear()
+            self.window_started = time.monotonic()
+            return counts
+    
+    def flush(self) -> int:
+        """
+        Add the current window's counts to player_access
+        
+        Returns:
+            int: Number of tags written
+        """
+        counts = self._take_window()
+        if not counts:
+            return 0
+        
+        now = time.time()
+        era_start, weight = access_weight(self.half_life, now)
+        table = PlayerAccess.__table__
+        
+        def add_hits(new):
+            # Counts from the previous era are converted to this era's weights first
+            return [('hits', weighted_hits(table, era_start) + new.hits)]
+        
+        db.session.execute(
+            upsert(PlayerAccess, ['player_tag'], ['updated_at'], update_expressions=add_hits),
+            [
+                {'player_tag': tag, 'hits': hits * weight, 'updated_at': datetime.utcfromtimestamp(now)}
+                for tag, hits in counts.items()
+            ]
+        )
+        db.session.commit()
+        
+        with self.lock:
+            self.flushed += len(counts)
+        return len(counts)
+    
+    def get_stats(self) -> Dict:
+        """Get window size and counters"""
+        with self.lock:
+            return {
+                'candidates': len(self.candidates),
+                'max_candidates': self.max_candidates,
+                'window_seconds': round(time.monotonic() - self.window_started, 1),
+                'recorded': self.recorded,
+                'flushed': self.flushed
+            }
+
+
+class HotPlayerScheduler:
+    """
+    Refreshes the most accessed players shortly before their cache expires
+    
+    Meant to run in its own worker process (flask refresh-hot-players), not
+    in the web workers. Each cycle drops players whose access count has
+    decayed away, then refreshes at most its share of the API budget,
+    hottest players first.
+    """
+    
+    def __init__(self, budget_per_minute: int, interval: float, lead: float, min_hits: float, half_life: float):
+        """
+        Initialize the scheduler
+        
+        Args:
+            budget_per_minute: Maximum player fetches per minute
+            interval: Seconds between cycles
+            lead: Seconds before expiry a player becomes due
+            min_hits: Minimum decayed access count for a player to be refreshed
+            half_life: Seconds for access counts to halve
+        """
+        self.budget_per_minute = budget_per_minute
+        self.interval = interval
+        self.lead = lead
+        self.min_hits = min_hits
+        self.half_life = half_life
+    
+    @property
+    def budget_per_cycle(self) -> int:
+        """Player fetches allowed in one cycle"""
+        return max(1, int(self.budget_per_minute * self.interval / 60))
+    
+    def prune(self) -> int:
+        """
+        Drop players whose decayed access count fell below half of min_hits
+        
+        Counts are forward-decayed (see access_weight), so only the cold
+        rows are written; counts older than the previous era are always cold.
+        
+        Returns:
+            int: Number of rows deleted
+        """
+        era_start, weight = access_weight(self.half_life)
+        previous_era_start = era_start - timedelta(seconds=self.half_life * ERA_HALF_LIVES)
+        deleted = PlayerAccess.query.filter(or_(
+            PlayerAccess.updated_at < previous_era_start,
+            weighted_hits(PlayerAccess.__table__, era_start) < self.min_hits / 2 * weight
+        )).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+    
+    def due_players(self, limit: int) -> List[str]:
+        """
+        Get the hottest players whose cache expires within the lead time
+        
+        Players past the hard cache duration are skipped: they are refreshed
+        on their next request anyway.
+        
+        Args:
+            limit: Maximum number of tags
+        
+        Returns:
+            List[str]: Player tags, hottest first
+        """
+        min_ttl, max_ttl = ttl_bounds()
+        hard_cache_duration = current_app.config.get('PLAYER_CACHE_HARD_DURATION', max_ttl)
+        now = datetime.utcnow()
+        era_start, weight = access_weight(self.half_life)
+        hits = weighted_hits(PlayerAccess.__table__, era_start)
+        
+        # TTLs differ per player, so the query only bounds by the shortest one
+        # and the per-player expiry is checked on an oversized candidate list
+        rows = db.session.query(Player.player_tag, Player.last_fetched, Player.cache_ttl).join(
+            PlayerAccess, PlayerAccess.player_tag == Player.player_tag
+        ).filter(
+            hits >= self.min_hits * weight,
+            Player.last_fetched <= now - timedelta(seconds=max(0, min_ttl - self.lead)),
+            Player.last_fetched > now - timedelta(seconds=max(hard_cache_duration, max_ttl))
+        ).order_by(hits.desc()).limit(limit * DUE_CANDIDATE_FACTOR)
+        
+        missing_players = get_missing_players()
+        due = []
+        for row in rows:
+            age = (now - row.last_fetched).total_seconds()
+            cache_duration = player_ttl(row)
+            if cache_duration - self.lead <= age <= max(hard_cache_duration, cache_duration) \
+                    and row.player_tag not in missing_players:
+                due.append(row.player_tag)
+                if len(due) == limit:
+                    break
+        return due
+    
+    def run_once(self) -> Dict:
+        """
+        Run one cycle: drop cold counts, then refresh due players within the budget
+        
+        Returns:
+            Dict: Cycle statistics
+        """
+        from services.player_service import PlayerService
+        
+        self.prune()
+        tags = self.due_players(self.budget_per_cycle)
+        errors = PlayerService.refresh_players(tags) if tags else {}
+        
+        return {
+            'due': len(tags),
+            'refreshed': sum(1 for error in errors.values() if error is None),
+            'errors': sum(1 for error in errors.values() if error is not None),
+            'budget': self.budget_per_cycle
+        }
+    
+    def run(self, cycles: Optional[int] = None) -> None:
+        """
+        Run cycles every interval seconds
+        
+        Args:
+            cycles: Number of cycles, or None to run until interrupted
+        """
+        completed = 0
+        while cycles is None or completed < cycles:
+            started = time.monotonic()
+            try:
+                stats = self.run_once()
+                logger.info(
+                    f"Hot player refresh: {stats['refreshed']}/{stats['due']} refreshed "
+                    f"({stats['errors']} errors, budget {stats['budget']})"
+                )
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Hot player refresh cycle failed: {str(e)}")
+            completed += 1
+            
+            if cycles is None or completed < cycles:
+                time.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+
+# Singleton instance
+_access_tracker = None
+_access_tracker_lock = threading.Lock()
+
+
+def get_access_tracker() -> AccessTracker:
+    """Get or create the per-process access tracker"""
+    global _access_tracker
+    if _access_tracker is None:
+        with _access_tracker_lock:
+            if _access_tracker is None:
+                _access_tracker = AccessTracker(
+                    width=current_app.config.get('HOT_PLAYER_SKETCH_WIDTH', 2048),
+                    depth=current_app.config.get('HOT_PLAYER_SKETCH_DEPTH', 4),
+                    max_candidates=current_app.config.get('HOT_PLAYER_CANDIDATES', 512),
+                    flush_interval=current_app.config.get('HOT_PLAYER_FLUSH_INTERVAL', 60),
+                    half_life=current_app.config.get('HOT_PLAYER_HALF_LIFE', 3600)
+                )
+    return _access_tracker
+
+
+def create_scheduler(budget_per_minute: Optional[int] = None, interval: Optional[float] = None) -> HotPlayerScheduler:
+    """
+    Create a scheduler from the app config
+    
+    Args:
+        budget_per_minute: Override HOT_PLAYER_REFRESH_BUDGET
+        interval: Override HOT_PLAYER_REFRESH_INTERVAL
+    
+    Returns:
+        HotPlayerScheduler: New scheduler
+    """
+    config = current_app.config
+    return HotPlayerScheduler(
+        budget_per_minute=budget_per_minute or config.get('HOT_PLAYER_REFRESH_BUDGET', 60),
+        interval=interval or config.get('HOT_PLAYER_REFRESH_INTERVAL', 30),
+        lead=config.get('HOT_PLAYER_REFRESH_LEAD', 60),
+        min_hits=config.get('HOT_PLAYER_MIN_HITS', 3),
+        half_life=config.get('HOT_PLAYER_HALF_LIFE', 3600)
+    )
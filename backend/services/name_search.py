@@ -0,0 +1,150 @@
+"""
+Player Name Search
+Dialect-native text index over player names with prefix and ranked matching
+"""
+import logging
+import re
+from typing import List
+from flask import current_app
+from sqlalchemy import text
+from models import db, Player
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'player_name_fts'
+MYSQL_INDEX = 'ft_players_name'
+POSTGRES_INDEX = 'ix_players_name_trgm'
+
+# InnoDB ignores FULLTEXT tokens shorter than innodb_ft_min_token_size (3 by default)
+MYSQL_MIN_TOKEN = 3
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+SQLITE_DDL = [
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+    f"name, content='players', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    # Triggers keep the external-content index in step with every write,
+    # including INSERT ... ON CONFLICT DO UPDATE upserts
+    f"CREATE TRIGGER IF NOT EXISTS players_name_fts_insert AFTER INSERT ON players BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, name) VALUES (new.id, new.name); END",
+    f"CREATE TRIGGER IF NOT EXISTS players_name_fts_delete AFTER DELETE ON players BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name) VALUES ('delete', old.id, old.name); END",
+    f"CREATE TRIGGER IF NOT EXISTS players_name_fts_update AFTER UPDATE OF name ON players BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name) VALUES ('delete', old.id, old.name); "
+    f"INSERT INTO {FTS_TABLE}(rowid, name) VALUES (new.id, new.name); END",
+    # Index players stored before the search table existed
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+
+def _tokens(query: str) -> List[str]:
+    """Split a search query into word tokens"""
+    return _TOKEN_RE.findall(query.lower())
+
+
+def ensure_name_search_index() -> str:
+    """
+    Create the name search index for the current database if missing
+    
+    Must run inside an app context after db.create_all(). The backend in use
+    is recorded in app.extensions['name_search'].
+    
+    Returns:
+        str: Backend in use ('fts5', 'fulltext', 'trigram' or 'like')
+    """
+    dialect = db.engine.dialect.name
+    backend = 'like'
+    
+    try:
+        with db.engine.begin() as conn:
+            if dialect == 'sqlite':
+                exists = conn.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                    {'name': FTS_TABLE}
+                ).first()
+                if not exists:
+                    for statement in SQLITE_DDL:
+                        conn.execute(text(statement))
+                backend = 'fts5'
+            
+            elif dialect == 'mysql':
+                exists = conn.execute(
+                    text(
+                        "SELECT 1 FROM information_schema.statistics WHERE table_schema = DATABASE() "
+                        "AND table_name = 'players' AND index_name = :name"
+                    ),
+                    {'name': MYSQL_INDEX}
+                ).first()
+                if not exists:
+                    conn.execute(text(f"ALTER TABLE players ADD FULLTEXT INDEX {MYSQL_INDEX} (name)"))
+                backend = 'fulltext'
+            
+            elif dialect == 'postgresql':
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                conn.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS {POSTGRES_INDEX} ON players USING gin (name gin_trgm_ops)"
+                ))
+                backend = 'trigram'
+    except Exception as e:
+        logger.warning(f"Player name search index unavailable on {dialect}, using LIKE: {str(e)}")
+        backend = 'like'
+    
+    current_app.extensions['name_search'] = backend
+    return backend
+
+
+def search_player_ids(query: str, limit: int = 10) -> List[int]:
+    """
+    Find players whose names match a query, best match first
+    
+    Every word of the query must match the start of a word in the name
+    ('roy kin' finds 'Royal King').
+    
+    Args:
+        query: Free-text name query
+        limit: Maximum number of ids
+    
+    Returns:
+        List[int]: Player ids ranked by relevance
+    """
+    backend = current_app.extensions.get('name_search', 'like')
+    tokens = _tokens(query)
+    
+    if backend == 'fts5' and tokens:
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        # FTS5 orders by its bm25 rank inside the index scan, keeping only the top limit
+        rows = db.session.execute(
+            text(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match ORDER BY rank LIMIT :limit"),
+            {'match': match, 'limit': limit}
+        )
+        return [row[0] for row in rows]
+    
+    if backend == 'fulltext' and tokens and max(len(token) for token in tokens) >= MYSQL_MIN_TOKEN:
+        # Words below the minimum token size are not indexed and would never match
+        match = ' '.join(f'+{token}*' for token in tokens if len(token) >= MYSQL_MIN_TOKEN)
+        rows = db.session.execute(
+            text(
+                "SELECT id FROM players WHERE MATCH(name) AGAINST (:match IN BOOLEAN MODE) "
+                "ORDER BY MATCH(name) AGAINST (:match IN BOOLEAN MODE) DESC LIMIT :limit"
+            ),
+            {'match': match, 'limit': limit}
+        )
+        return [row[0] for row in rows]
+    
+    if backend == 'trigram':
+        # The trigram GIN index serves the ILIKE filter; similarity ranks the hits
+        rows = db.session.execute(
+            text(
+                "SELECT id FROM players WHERE name ILIKE :pattern "
+                "ORDER BY similarity(name, :query) DESC LIMIT :limit"
+            ),
+            {'pattern': f'%{query}%', 'query': query, 'limit': limit}
+        )
+        return [row[0] for row in rows]
+    
+    # No usable index (or nothing indexable in the query): substring scan
+    return [
+        player_id for (player_id,) in db.session.query(Player.id).filter(
+            Player.name.ilike(f'%{query}%')
+        ).order_by(Player.trophies.desc()).limit(limit)
+    ]
@@ -0,0 +1,83 @@
+"""
+Negative Cache
+Remembers keys known to be missing upstream so they are not re-fetched
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable
+from flask import current_app
+
+
+class NegativeCache:
+    """
+    Bounded TTL set of missing keys
+    
+    Keys expire ttl seconds after they were added. When full, the oldest
+    key is evicted.
+    """
+    
+    def __init__(self, ttl: float, max_entries: int):
+        """
+        Initialize the cache
+        
+        Args:
+            ttl: Seconds a key stays known-missing
+            max_entries: Maximum number of keys kept
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self._expires: 'OrderedDict[Hashable, float]' = OrderedDict()
+        self.hits = 0
+        self.added = 0
+    
+    def add(self, key: Hashable) -> None:
+        """Record a key as missing"""
+        with self.lock:
+            self._expires.pop(key, None)
+            self._expires[key] = time.monotonic() + self.ttl
+            self.added += 1
+            while len(self._expires) > self.max_entries:
+                self._expires.popitem(last=False)
+    
+    def __contains__(self, key: Hashable) -> bool:
+        """Whether a key is currently known to be missing"""
+        with self.lock:
+            expires = self._expires.get(key)
+            if expires is None:
+                return False
+            if expires <= time.monotonic():
+                del self._expires[key]
+                return False
+            self.hits += 1
+            return True
+    
+    def get_stats(self) -> Dict:
+        """Get cache size and counters"""
+        with self.lock:
+            return {
+                'entries': len(self._expires),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'added': self.added
+            }
+
+
+# Singleton instance
+_missing_players = None
+_missing_players_lock = threading.Lock()
+
+
+def get_missing_players() -> NegativeCache:
+    """Get or create the negative cache of player tags the API reported missing"""
+    global _missing_players
+    if _missing_players is None:
+        with _missing_players_lock:
+            if _missing_players is None:
+                _missing_players = NegativeCache(
+                    ttl=current_app.config.get('PLAYER_NOT_FOUND_TTL', 600),
+                    max_entries=current_app.config.get('PLAYER_NOT_FOUND_MAX_ENTRIES', 10000)
+                )
+    return _missing_players
@@ -3,15 +3,45 @@ Player Service
 Handles player-related database operations
 """
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+import base64
 import logging
+import threading
+import time
 from flask import current_app
-from models import db, Player, Deck, DeckCard, Card, DeckAnalysis
-from services.clash_royale import get_api_service, ClashRoyaleAPIError
+from models import db, upsert, Player, Deck, DeckCard, Card, PLAYER_DECK_LOADER, DECK_CARDS_LOADER
+from services.clash_royale import (
+    get_api_service, is_valid_tag, ClashRoyaleAPIError, ClashRoyaleUnavailableError,
+    ClashRoyaleNotFoundError, InvalidPlayerTagError
+)
 from services.deck_analyzer import get_analyzer
+from services.deck_optimizer import get_optimizer
+from services.deck_index import get_deck_index, index_after_commit
+from services.analysis_cache import get_analysis_cache
+from services.card_catalog import get_card_catalog
+from services.single_flight import SingleFlight
+from services.background_refresh import get_refresher
+from services.name_search import search_player_ids
+from services.negative_cache import get_missing_players
+from services.hot_players import get_access_tracker
+from services.adaptive_ttl import activity_updates, initial_history, player_ttl, get_ttl_stats
 
 logger = logging.getLogger(__name__)
 
+# Player columns copied from parsed API data on every refresh
+PLAYER_FIELDS = (
+    'name', 'trophies', 'best_trophies', 'wins', 'losses', 'battle_count', 'three_crown_wins',
+    'arena_id', 'arena_name', 'clan_name', 'clan_tag', 'exp_level'
+)
+
+# In-process coalescing of concurrent work for the same player tag
+_player_flight = SingleFlight()
+_analysis_flight = SingleFlight()
+
+# Approximate player count served as the listing total: (count, monotonic time counted)
+_player_count: Optional[Tuple[int, float]] = None
+_player_count_lock = threading.Lock()
+
 
 class PlayerService:
     """Service for managing players and their decks"""
@@ -29,73 +59,150 @@ class PlayerService:
             Dict: Player data with current deck
             
         Raises:
+            InvalidPlayerTagError: If the tag cannot exist
+            ClashRoyaleNotFoundError: If the API reports the player missing
+                (or did so within PLAYER_NOT_FOUND_TTL)
             ClashRoyaleAPIError: If API request fails
         """
-        # Normalize player tag
-        if not player_tag.startswith('#'):
-            player_tag = f'#{player_tag}'
-        
-        player = Player.query.filter_by(player_tag=player_tag).first()
-        cache_duration = current_app.config.get('PLAYER_CACHE_DURATION', 300)
+        player_tag = PlayerService.normalize_tag(player_tag)
+        PlayerService.check_tag(player_tag)
+        get_access_tracker().record(player_tag)
         
-        # Check if we need to fetch from API
-        should_fetch = (
-            force_refresh or
-            player is None or
-            (datetime.utcnow() - player.last_fetched).total_seconds() > cache_duration
-        )
+        # Cached reads serialize the current deck, so load it eagerly; forced refreshes reload anyway
+        query = Player.query if force_refresh else Player.query.options(PLAYER_DECK_LOADER)
+        player = query.filter_by(player_tag=player_tag).first()
+        ttl_stats = get_ttl_stats()
+        age = (datetime.utcnow() - player.last_fetched).total_seconds() if player is not None else None
         
-        extra_api_fields = {}
+        if player is not None and not force_refresh:
+            # Each player's TTL follows how often its stats change
+            cache_duration = player_ttl(player)
+            hard_cache_duration = max(
+                cache_duration, current_app.config.get('PLAYER_CACHE_HARD_DURATION', cache_duration)
+            )
+            
+            # Fresh: serve from the database
+            if age <= cache_duration:
+                ttl_stats.record_hit(age)
+                return player.to_dict()
+            
+            # Soft-expired: serve from the database and revalidate off the request path
+            if age <= hard_cache_duration:
+                ttl_stats.record_fetch(age)
+                get_refresher().schedule(
+                    player_tag,
+                    lambda: _player_flight.do(player_tag, lambda: PlayerService._refresh_player(player_tag))
+                )
+                return player.to_dict()
         
-        if should_fetch:
-            # Fetch from API
-            api_service = get_api_service()
-            try:
-                logger.info(f"Fetching player data for {player_tag} from API...")
-                api_data = api_service.get_player(player_tag)
-                logger.info(f"Successfully fetched player data for {player_tag}")
-            except ClashRoyaleAPIError as e:
-                logger.error(f"API Error fetching player {player_tag}: {str(e)}")
-                raise
-            except Exception as e:
-                logger.error(f"Unexpected error fetching player {player_tag}: {str(e)}")
+        if not force_refresh:
+            ttl_stats.record_fetch(age)
+        # Concurrent refreshes of the same tag share one fetch and one write
+        try:
+            return _player_flight.do(
+                player_tag,
+                lambda: PlayerService._refresh_player(player_tag)
+            )
+        except ClashRoyaleUnavailableError as e:
+            # Serve the last persisted data while the API is down
+            if player is None:
                 raise
+            logger.warning(f"Serving stale data for {player_tag}: {str(e)}")
+            return PlayerService._stale_player_dict(player)
+    
+    @staticmethod
+    def check_tag(player_tag: str) -> None:
+        """
+        Reject a normalized tag without touching the database or the API
+        
+        Args:
+            player_tag: Normalized player tag
             
-            player_data = api_service.parse_player_data(api_data)
-            
-            # Store extra fields from API
-            extra_api_fields = {
-                'current_favourite_card': player_data.get('current_favourite_card')
-            }
+        Raises:
+            InvalidPlayerTagError: If the tag is not in the game's tag format
+            ClashRoyaleNotFoundError: If the API recently reported the tag missing
+        """
+        if not is_valid_tag(player_tag):
+            raise InvalidPlayerTagError(f"Invalid player tag {player_tag}")
+        if player_tag in get_missing_players():
+            raise ClashRoyaleNotFoundError("Player not found")
+    
+    @staticmethod
+    def _stale_player_dict(player: Player) -> Dict:
+        """
+        Serialize a persisted player that could not be refreshed
+        
+        Args:
+            player: Player object
             
-            # Update or create player
-            if player is None:
-                player = Player()
+        Returns:
+            Dict: Player data marked as stale
+        """
+        player_dict = player.to_dict()
+        player_dict['stale'] = True
+        return player_dict
+    
+    @staticmethod
+    def normalize_tag(player_tag: str) -> str:
+        """
+        Normalize a player tag to its canonical '#ABC123' form
+        
+        Args:
+            player_tag: Player tag (with or without #)
             
-            # Update player fields
-            player.player_tag = player_data['player_tag']
-            player.name = player_data['name']
-            player.trophies = player_data['trophies']
-            player.best_trophies = player_data['best_trophies']
-            player.wins = player_data['wins']
-            player.losses = player_data['losses']
-            player.battle_count = player_data['battle_count']
-            player.three_crown_wins = player_data['three_crown_wins']
-            player.arena_id = player_data['arena_id']
-            player.arena_name = player_data['arena_name']
-            player.clan_name = player_data['clan_name']
-            player.clan_tag = player_data['clan_tag']
-            player.exp_level = player_data['exp_level']
-            player.last_fetched = datetime.utcnow()
+        Returns:
+            str: Upper-cased tag with a leading # (the letter O read as zero)
+        """
+        player_tag = player_tag.strip().upper().replace('O', '0')
+        if not player_tag.startswith('#'):
+            player_tag = f'#{player_tag}'
+        return player_tag
+    
+    @staticmethod
+    def _refresh_player(player_tag: str) -> Dict:
+        """
+        Fetch a player from the API and store it with its current deck
+        
+        Args:
+            player_tag: Normalized player tag
             
-            db.session.add(player)
-            db.session.commit()
+        Returns:
+            Dict: Player data with current deck
             
-            # Process deck
-            if player_data.get('current_deck'):
-                PlayerService._process_player_deck(player, player_data['current_deck'])
+        Raises:
+            ClashRoyaleAPIError: If API request fails
+        """
+        # Fetch from API
+        api_service = get_api_service()
+        try:
+            logger.info(f"Fetching player data for {player_tag} from API...")
+            api_data = api_service.get_player(player_tag)
+            logger.info(f"Successfully fetched player data for {player_tag}")
+        except ClashRoyaleNotFoundError:
+            # Remember the miss so repeated lookups of this tag stay off the API
+            logger.info(f"Player {player_tag} not found, caching the miss")
+            get_missing_players().add(player_tag)
+            raise
+        except ClashRoyaleAPIError as e:
+            logger.error(f"API Error fetching player {player_tag}: {str(e)}")
+            raise
+        except Exception as e:
+            logger.error(f"Unexpected error fetching player {player_tag}: {str(e)}")
+            raise
+        
+        player_data = api_service.parse_player_data(api_data)
         
-        # Get player dict
+        # Store extra fields from API
+        extra_api_fields = {
+            'current_favourite_card': player_data.get('current_favourite_card')
+        }
+        
+        # Upsert player and deck in one transaction
+        player_id = PlayerService._write_player(player_data)
+        db.session.commit()
+        
+        # Get player dict (the commit expired loaded rows; reload it with its deck eagerly)
+        player = Player.query.options(PLAYER_DECK_LOADER).filter_by(id=player_id).one()
         player_dict = player.to_dict()
         
         # Add extra API fields if available
@@ -105,99 +212,308 @@ class PlayerService:
         return player_dict
     
     @staticmethod
-    def _process_player_deck(player: Player, deck_data: List[Dict]) -> Deck:
+    def _write_player(player_data: Dict) -> int:
         """
-        Process and save player's current deck
+        Upsert a player and its current deck without committing
+        
+        Every write is a dialect-native upsert or a single UPDATE, so
+        concurrent refreshes of the same player or deck do not collide on
+        unique constraints and the caller commits the refresh as one unit.
         
         Args:
-            player: Player object
-            deck_data: List of card data from API
+            player_data: Parsed player data from parse_player_data
+            
+        Returns:
+            int: Player id
+        """
+        now = datetime.utcnow()
+        row = {column: player_data[column] for column in ('player_tag',) + PLAYER_FIELDS}
+        row.update(initial_history(), last_fetched=now, updated_at=now)
+        
+        player_id = PlayerService._upsert_returning_id(
+            Player,
+            upsert(
+                Player, ['player_tag'], PLAYER_FIELDS + ('last_fetched', 'updated_at'),
+                update_expressions=lambda new: activity_updates(Player.__table__, new)
+            ),
+            row,
+            Player.player_tag == row['player_tag']
+        )
+        
+        if player_data.get('current_deck'):
+            PlayerService._write_current_deck(player_id, player_data['current_deck'], now)
+        
+        return player_id
+    
+    @staticmethod
+    def _upsert_returning_id(model, stmt, row: Dict, key_clause) -> int:
+        """
+        Execute a single-row upsert and get the id of the inserted or existing row
+        
+        Args:
+            model: Mapped model class
+            stmt: Upsert statement from upsert()
+            row: Column values
+            key_clause: Filter selecting the row by its unique key
             
         Returns:
-            Deck: Created or existing deck object
+            int: Row id
+        """
+        if db.session.get_bind().dialect.insert_returning:
+            return db.session.scalar(stmt.values(row).returning(model.id))
+        
+        # MySQL has no RETURNING: read the id back by key
+        db.session.execute(stmt, [row])
+        return db.session.scalar(db.select(model.id).where(key_clause))
+    
+    @staticmethod
+    def get_or_create_players(player_tags: List[str]) -> List[Dict]:
         """
-        # First, ensure all cards exist in database by syncing if needed
-        from services.clash_royale import get_api_service
+        Get several players, fetching stale or missing ones concurrently
+        
+        Cached players are read with a single IN query. The rest are fetched
+        in parallel through the async API client and written in one
+        transaction, each inside its own savepoint so one bad player does not
+        discard the others.
+        
+        Args:
+            player_tags: Player tags (with or without #)
+            
+        Returns:
+            List[Dict]: One result per unique tag, in request order, with
+                either 'data' or 'error' and 'status'
+        """
+        all_tags = list(dict.fromkeys(PlayerService.normalize_tag(tag) for tag in player_tags))
+        now = datetime.utcnow()
+        ttl_stats = get_ttl_stats()
+        
+        # Malformed and recently missing tags are answered without a query or fetch
+        results = {}
+        for tag in all_tags:
+            try:
+                PlayerService.check_tag(tag)
+            except ClashRoyaleAPIError as e:
+                results[tag] = {
+                    'tag': tag,
+                    'success': False,
+                    'error': str(e),
+                    'status': 404 if isinstance(e, ClashRoyaleNotFoundError) else 400
+                }
+        tags = [tag for tag in all_tags if tag not in results]
+        access_tracker = get_access_tracker()
+        for tag in tags:
+            access_tracker.record(tag)
+        
+        players = {
+            p.player_tag: p
+            for p in Player.query.options(PLAYER_DECK_LOADER).filter(Player.player_tag.in_(tags)).all()
+        }
+        stale_tags = []
+        for tag in tags:
+            age = (now - players[tag].last_fetched).total_seconds() if tag in players else None
+            if age is not None and age <= player_ttl(players[tag]):
+                ttl_stats.record_hit(age)
+            else:
+                ttl_stats.record_fetch(age)
+                stale_tags.append(tag)
+        
+        if stale_tags:
+            errors = PlayerService.refresh_players(stale_tags)
+            
+            for tag, error in errors.items():
+                if isinstance(error, ClashRoyaleUnavailableError) and tag in players:
+                    logger.warning(f"Serving stale data for {tag}: {str(error)}")
+                    results[tag] = {
+                        'tag': tag,
+                        'success': True,
+                        'data': PlayerService._stale_player_dict(players[tag])
+                    }
+                elif isinstance(error, ClashRoyaleAPIError):
+                    results[tag] = {
+                        'tag': tag,
+                        'success': False,
+                        'error': str(error),
+                        'status': 404 if isinstance(error, ClashRoyaleNotFoundError) else 400
+                    }
+                elif error is not None:
+                    results[tag] = {
+                        'tag': tag,
+                        'success': False,
+                        'error': f'Failed to store player: {str(error)}',
+                        'status': 500
+                    }
+            
+            # The commit expired every row; reload the served players with their decks in one pass
+            reload_tags = [tag for tag in tags if tag not in results]
+            players = {
+                p.player_tag: p
+                for p in Player.query.options(PLAYER_DECK_LOADER).filter(Player.player_tag.in_(reload_tags)).all()
+            }
+        
+        for tag in tags:
+            if tag not in results:
+                results[tag] = {
+                    'tag': tag,
+                    'success': True,
+                    'data': players[tag].to_dict()
+                }
+        
+        return [results[tag] for tag in all_tags]
+    
+    @staticmethod
+    def refresh_players(player_tags: List[str]) -> Dict[str, Optional[Exception]]:
+        """
+        Fetch players concurrently and store them in one transaction
+        
+        Each player is written inside its own savepoint so one bad player does
+        not discard the others. Tags the API reports missing are added to the
+        negative cache.
+        
+        Args:
+            player_tags: Normalized player tags
+            
+        Returns:
+            Dict[str, Optional[Exception]]: Per tag, None when stored, else the
+                API error or the exception raised while storing
+        """
+        from services.async_clash_royale import get_async_api_service
         
         api_service = get_api_service()
-        api_cards = api_service.get_cards()
+        fetched = get_async_api_service().gather_players_sync(player_tags)
+        missing_players = get_missing_players()
+        
+        errors = {}
+        for tag in player_tags:
+            api_data = fetched[tag]
+            if isinstance(api_data, ClashRoyaleAPIError):
+                if isinstance(api_data, ClashRoyaleNotFoundError):
+                    missing_players.add(tag)
+                logger.error(f"API Error fetching player {tag}: {str(api_data)}")
+                errors[tag] = api_data
+                continue
+            
+            player_data = api_service.parse_player_data(api_data)
+            try:
+                with db.session.begin_nested():
+                    PlayerService._write_player(player_data)
+                errors[tag] = None
+            except Exception as e:
+                logger.error(f"Failed to store player {tag}: {str(e)}")
+                errors[tag] = e
+        
+        db.session.commit()
+        return errors
+    
+    @staticmethod
+    def _write_current_deck(player_id: int, deck_data: List[Dict], now: datetime) -> Optional[int]:
+        """
+        Store a player's current deck without committing
         
-        # Map card IDs from API to database, creating cards if needed
-        card_map = {}  # Maps API card_id to database Card object
-        total_elixir = 0
+        Args:
+            player_id: Player id
+            deck_data: List of card data from API
+            now: Timestamp for updated rows
+            
+        Returns:
+            Optional[int]: Deck id, or None if a deck card is unknown even to a
+                freshly downloaded catalog (the deck is not stored)
+        """
+        # Resolve every deck card with a single IN lookup
+        api_card_ids = [card_data.get('id') for card_data in deck_data]
+        card_map = {
+            card.card_id: card
+            for card in Card.query.filter(Card.card_id.in_(api_card_ids)).all()
+        }  # Maps API card_id to database Card object
         
-        for card_data in deck_data:
-            api_card_id = card_data.get('id')
-            card = Card.query.filter_by(card_id=api_card_id).first()
+        # Cards missing from the database are filled in from the cached catalog
+        missing_ids = [api_card_id for api_card_id in dict.fromkeys(api_card_ids) if api_card_id not in card_map]
+        if missing_ids:
+            catalog = get_card_catalog()
+            if any(catalog.get(api_card_id) is None for api_card_id in missing_ids):
+                # A card released since the catalog was cached: download it again once
+                catalog.refresh()
             
-            # If card doesn't exist, try to create it from API data
-            if not card:
-                # Find the card data from the full API cards list
-                api_card_data = next((c for c in api_cards if c.get('id') == api_card_id), None)
-                if api_card_data:
-                    parsed_card = api_service.parse_card_data(api_card_data)
-                    # Ensure rarity is lowercase for database
-                    rarity = parsed_card.get('rarity', 'common').lower()
-                    card = Card(
-                        card_id=parsed_card['card_id'],
-                        name=parsed_card['name'],
-                        card_type=parsed_card['card_type'],
-                        rarity=rarity,
-                        elixir_cost=parsed_card['elixir_cost'],
-                        max_level=parsed_card.get('max_level', 14),
-                        icon_url=parsed_card.get('icon_url', '')
-                    )
-                    db.session.add(card)
-                    db.session.flush()  # Get the card ID
+            unknown_ids = [api_card_id for api_card_id in missing_ids if catalog.get(api_card_id) is None]
+            if unknown_ids:
+                # A partial deck would get a wrong hash and fail every analysis
+                logger.warning(f"Not storing deck of player {player_id}: unknown cards {unknown_ids}")
+                return None
             
-            if card:
-                card_map[len(card_map)] = card
-                total_elixir += card.elixir_cost
+            new_cards = []
+            for api_card_id in missing_ids:
+                parsed_card = catalog.get(api_card_id)
+                # Ensure rarity is lowercase for database
+                rarity = parsed_card.get('rarity', 'common').lower()
+                new_cards.append({
+                    'card_id': parsed_card['card_id'],
+                    'name': parsed_card['name'],
+                    'card_type': parsed_card['card_type'],
+                    'rarity': rarity,
+                    'elixir_cost': parsed_card['elixir_cost'],
+                    'max_level': parsed_card.get('max_level', 14),
+                    'icon_url': parsed_card.get('icon_url', '')
+                })
+            
+            # Another refresh may insert the same cards concurrently; keep whichever lands first
+            db.session.execute(upsert(Card, ['card_id']), new_cards)
+            inserted = Card.query.filter(Card.card_id.in_([c['card_id'] for c in new_cards])).all()
+            card_map.update((card.card_id, card) for card in inserted)
+        
+        deck_cards = [
+            (position, card_data, card_map[card_data.get('id')])
+            for position, card_data in enumerate(deck_data)
+        ]
         
         # Generate deck hash from card IDs
-        card_ids = [card.id for card in card_map.values()]
+        card_ids = [card.id for _, _, card in deck_cards]
+        total_elixir = sum(card.elixir_cost for _, _, card in deck_cards)
         deck_hash = Deck.generate_hash(card_ids)
         avg_elixir = round(total_elixir / len(card_ids), 2) if card_ids else 0
         
         # Check if deck already exists
-        deck = Deck.query.filter_by(deck_hash=deck_hash).first()
+        deck_id = db.session.scalar(db.select(Deck.id).where(Deck.deck_hash == deck_hash))
         
-        if deck is None:
-            # Mark old decks as not current
-            Deck.query.filter_by(player_id=player.id, is_current_deck=True).update({'is_current_deck': False})
-            
-            # Create new deck
-            deck = Deck(
-                player_id=player.id,
-                deck_hash=deck_hash,
-                avg_elixir=avg_elixir,
-                is_current_deck=True
+        if deck_id is None:
+            # Create new deck; a concurrent refresh creating the same deck resolves to one row
+            deck_id = PlayerService._upsert_returning_id(
+                Deck,
+                upsert(Deck, ['deck_hash'], ('is_current_deck', 'updated_at')),
+                {
+                    'player_id': player_id,
+                    'deck_hash': deck_hash,
+                    'avg_elixir': avg_elixir,
+                    'is_current_deck': True,
+                    'updated_at': now
+                },
+                Deck.deck_hash == deck_hash
             )
-            db.session.add(deck)
-            db.session.flush()  # Get deck ID
             
-            # Add deck cards
-            for position, card_data in enumerate(deck_data):
-                card_id = card_data.get('id')
-                card = Card.query.filter_by(card_id=card_id).first()
+            # Add deck cards in one bulk upsert
+            if deck_cards:
+                db.session.execute(upsert(DeckCard, ['deck_id', 'card_id']), [
+                    {
+                        'deck_id': deck_id,
+                        'card_id': card.id,
+                        'card_level': card_data.get('level', 1),
+                        'position': position
+                    }
+                    for position, card_data, card in deck_cards
+                ])
                 
-                if card:
-                    deck_card = DeckCard(
-                        deck_id=deck.id,
-                        card_id=card.id,
-                        card_level=card_data.get('level', 1),
-                        position=position
-                    )
-                    db.session.add(deck_card)
-            
-            db.session.commit()
-        else:
-            # Update existing deck as current for this player
-            Deck.query.filter_by(player_id=player.id, is_current_deck=True).update({'is_current_deck': False})
-            deck.is_current_deck = True
-            db.session.commit()
+                # Searchable by similarity in this process once committed; others pick it up on sync
+                index_after_commit(db.session(), deck_id, card_ids)
         
-        return deck
+        # Mark this deck current and the player's other decks not current in one UPDATE
+        db.session.execute(
+            db.update(Deck).where(
+                db.or_(
+                    db.and_(Deck.player_id == player_id, Deck.is_current_deck == True),
+                    Deck.id == deck_id
+                )
+            ).values(is_current_deck=(Deck.id == deck_id), updated_at=now).execution_options(synchronize_session=False)
+        )
+        
+        return deck_id
     
     @staticmethod
     def analyze_player_deck(player_tag: str) -> Dict:
@@ -213,84 +529,283 @@ class PlayerService:
         Raises:
             ValueError: If player not found or no deck available
         """
-        # Normalize player tag
-        if not player_tag.startswith('#'):
-            player_tag = f'#{player_tag}'
+        player_tag = PlayerService.normalize_tag(player_tag)
         
-        player = Player.query.filter_by(player_tag=player_tag).first()
+        # Concurrent analyses of the same player share one computation and write
+        return _analysis_flight.do(
+            player_tag,
+            lambda: PlayerService._analyze_player_deck(player_tag)
+        )
+    
+    @staticmethod
+    def _analyze_player_deck(player_tag: str) -> Dict:
+        """
+        Analyze player's current deck, reusing the cached analysis of identical decks
+        
+        Args:
+            player_tag: Normalized player tag
+            
+        Returns:
+            Dict: Complete analysis results
+            
+        Raises:
+            ValueError: If player not found or no deck available
+        """
+        player = Player.query.options(PLAYER_DECK_LOADER).filter_by(player_tag=player_tag).first()
         
         if not player:
             raise ValueError(f"Player {player_tag} not found")
         
-        # Get current deck
-        deck = Deck.query.filter_by(player_id=player.id, is_current_deck=True).first()
+        # Get current deck (loaded with its cards)
+        deck = player.current_deck
         
         if not deck:
             raise ValueError(f"No current deck found for player {player_tag}")
         
-        # Check if analysis already exists
-        existing_analysis = DeckAnalysis.query.filter_by(deck_id=deck.id).order_by(DeckAnalysis.created_at.desc()).first()
+        # Serialize first: storing a new analysis commits, which would expire the loaded rows
+        result = {
+            'player': player.to_dict(),
+            'deck': deck.to_dict(include_cards=True)
+        }
+        
+        # Analyses are content-addressed, so a deck other players run is not recomputed
+        result['analysis'] = get_analysis_cache().get_or_compute(deck, get_analyzer())
         
-        if existing_analysis:
-            # Return existing analysis if it's recent (within 1 hour)
-            if (datetime.utcnow() - existing_analysis.created_at).total_seconds() < 3600:
-                return {
-                    'player': player.to_dict(),
-                    'deck': deck.to_dict(include_cards=True),
-                    'analysis': existing_analysis.to_dict()
-                }
+        return result
+    
+    @staticmethod
+    def suggest_deck_swaps(player_tag: str, limit: int = 5, max_swaps: int = 2) -> Dict:
+        """
+        Find the catalog swaps that most improve a player's current deck
         
-        # Get deck cards
-        deck_cards = DeckCard.query.filter_by(deck_id=deck.id).all()
-        cards = [dc.card for dc in deck_cards]
-        
-        # Analyze deck
-        analyzer = get_analyzer()
-        analysis_result = analyzer.analyze_deck(cards)
-        
-        # Save analysis
-        deck_analysis = DeckAnalysis(
-            deck_id=deck.id,
-            avg_elixir=analysis_result['metrics']['avg_elixir'],
-            air_targeting_count=analysis_result['metrics']['air_targeting_count'],
-            splash_damage_count=analysis_result['metrics']['splash_damage_count'],
-            win_condition_count=analysis_result['metrics']['win_condition_count'],
-            light_spell_count=analysis_result['metrics']['light_spell_count'],
-            heavy_spell_count=analysis_result['metrics']['heavy_spell_count'],
-            tank_count=analysis_result['metrics']['tank_count'],
-            strengths=analysis_result['strengths'],
-            weaknesses=analysis_result['weaknesses'],
-            suggestions=analysis_result['suggestions'],
-            overall_rating=analysis_result['overall_rating']
-        )
-        db.session.add(deck_analysis)
-        db.session.commit()
+        Args:
+            player_tag: Player tag (with or without #)
+            limit: Maximum number of swaps
+            max_swaps: Largest number of cards replaced at once
+        
+        Returns:
+            Dict: Current score and rating with the best swaps (see DeckOptimizer.optimize)
+        
+        Raises:
+            ValueError: If the player or their deck is not stored
+            RuntimeError: If NumPy is not installed
+        """
+        player_tag = PlayerService.normalize_tag(player_tag)
+        _, card_ids = PlayerService._current_deck_card_ids(player_tag)
+        return dict(get_optimizer().optimize(card_ids, limit=limit, max_swaps=max_swaps), player_tag=player_tag)
+    
+    @staticmethod
+    def find_similar_decks(player_tag: str, limit: int = 10) -> Dict:
+        """
+        Find the stored decks most similar to a player's current deck
+        
+        Args:
+            player_tag: Player tag (with or without #)
+            limit: Maximum number of decks
+        
+        Returns:
+            Dict: The player's deck id and the similar decks with their
+                players, Jaccard similarity and number of shared cards
+        
+        Raises:
+            ValueError: If the player or their deck is not stored
+            RuntimeError: If NumPy is not installed
+        """
+        player_tag = PlayerService.normalize_tag(player_tag)
+        deck_id, card_ids = PlayerService._current_deck_card_ids(player_tag)
+        
+        index = get_deck_index()
+        # One chunk on the request path; a large backlog (e.g. the first fill) continues in the background
+        index.sync(max_chunks=1, blocking=False)
+        if not index.caught_up:
+            get_refresher().schedule('deck_index_sync', lambda: index.sync(force=True))
+        matches = index.similar(card_ids, limit=limit, exclude_deck_id=deck_id)
+        
+        decks = {
+            deck.id: deck
+            for deck in Deck.query.options(DECK_CARDS_LOADER, db.joinedload(Deck.player)).filter(
+                Deck.id.in_([match_id for match_id, _, _ in matches])
+            )
+        } if matches else {}
+        
+        similar = []
+        for match_id, similarity, shared in matches:
+            deck = decks.get(match_id)
+            if deck is None:
+                continue
+            similar.append({
+                'similarity': similarity,
+                'shared_cards': shared,
+                'player': {
+                    'player_tag': deck.player.player_tag,
+                    'name': deck.player.name,
+                    'trophies': deck.player.trophies
+                },
+                'deck': deck.to_dict(include_cards=True)
+            })
         
         return {
-            'player': player.to_dict(),
-            'deck': deck.to_dict(include_cards=True),
-            'analysis': deck_analysis.to_dict()
+            'player_tag': player_tag,
+            'deck_id': deck_id,
+            'similar_decks': similar
         }
     
     @staticmethod
-    def get_all_players(limit: int = 20, offset: int = 0) -> Dict:
+    def _current_deck_card_ids(player_tag: str) -> Tuple[int, List[int]]:
         """
-        Get all players with pagination
+        Get a stored player's current deck id and card ids in one query
+        
+        Args:
+            player_tag: Normalized player tag
+        
+        Returns:
+            Tuple[int, List[int]]: Deck id and its card ids (cards.id) by position
+        
+        Raises:
+            ValueError: If the player or their deck is not stored
+        """
+        rows = db.session.query(DeckCard.deck_id, DeckCard.card_id).join(
+            Deck, Deck.id == DeckCard.deck_id
+        ).join(
+            Player, Player.id == Deck.player_id
+        ).filter(
+            Player.player_tag == player_tag, Deck.is_current_deck == True
+        ).order_by(DeckCard.position).all()
+        
+        if not rows:
+            raise ValueError(f"No current deck found for player {player_tag}")
+        
+        return rows[0].deck_id, [row.card_id for row in rows]
+    
+    @staticmethod
+    def get_all_players(limit: int = 20, offset: int = 0, cursor: Optional[str] = None) -> Dict:
+        """
+        Get all players ordered by trophies, with keyset or offset pagination
+        
+        With a cursor the page starts right after the (trophies, id) position
+        it encodes, which costs the same on every page. Offset pagination is
+        kept for existing clients. Both modes return next_cursor.
         
         Args:
             limit: Number of players per page
-            offset: Offset for pagination
+            offset: Offset for pagination (ignored when cursor is given)
+            cursor: Opaque cursor from a previous page's next_cursor
             
         Returns:
-            Dict: Players with pagination info
+            Dict: Players with pagination info; total is approximate
+            
+        Raises:
+            ValueError: If the cursor is malformed
         """
-        query = Player.query.order_by(Player.trophies.desc())
-        total = query.count()
-        players = query.limit(limit).offset(offset).all()
+        query = Player.query.options(PLAYER_DECK_LOADER).order_by(Player.trophies.desc(), Player.id.desc())
+        
+        if cursor:
+            trophies, player_id = PlayerService.decode_cursor(cursor)
+            query = query.filter(db.or_(
+                Player.trophies < trophies,
+                db.and_(Player.trophies == trophies, Player.id < player_id)
+            ))
+            offset = None
+        else:
+            query = query.offset(offset)
+        
+        # One extra row tells whether another page follows
+        players = query.limit(limit + 1).all()
+        has_more = len(players) > limit
+        players = players[:limit]
         
         return {
             'players': [p.to_dict() for p in players],
-            'total': total,
+            'total': PlayerService.get_player_count(),
+            'total_is_approximate': True,
             'limit': limit,
-            'offset': offset
-        }
\ No newline at end of file
+            'offset': offset,
+            'next_cursor': PlayerService.encode_cursor(players[-1]) if has_more else None
+        }
+    
+    @staticmethod
+    def search_players_by_name(query: str, limit: int = 10) -> List[Dict]:
+        """
+        Search stored players by name through the text search index
+        
+        Args:
+            query: Free-text name query (words match name word prefixes)
+            limit: Maximum number of players
+            
+        Returns:
+            List[Dict]: Matching players, best match first
+        """
+        player_ids = search_player_ids(query, limit=limit)
+        if not player_ids:
+            return []
+        
+        players = {
+            p.id: p
+            for p in Player.query.options(PLAYER_DECK_LOADER).filter(Player.id.in_(player_ids)).all()
+        }
+        return [players[player_id].to_dict() for player_id in player_ids if player_id in players]
+    
+    @staticmethod
+    def encode_cursor(player: Player) -> str:
+        """
+        Encode a player's listing position as an opaque cursor
+        
+        Args:
+            player: Last player of a page
+            
+        Returns:
+            str: URL-safe cursor
+        """
+        return base64.urlsafe_b64encode(f'{player.trophies or 0}:{player.id}'.encode()).decode().rstrip('=')
+    
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[int, int]:
+        """
+        Decode a cursor from encode_cursor
+        
+        Args:
+            cursor: URL-safe cursor
+            
+        Returns:
+            Tuple[int, int]: Trophies and player id of the last player seen
+            
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        try:
+            decoded = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+            trophies, player_id = decoded.split(':')
+            return int(trophies), int(player_id)
+        except (ValueError, UnicodeDecodeError) as e:
+            raise ValueError(f'Invalid cursor: {cursor}') from e
+    
+    @staticmethod
+    def get_player_count() -> int:
+        """
+        Get the number of stored players, recounted at most every PLAYER_COUNT_TTL seconds
+        
+        Only the first call counts on the request path; later recounts run
+        in the background while the previous value is served.
+        
+        Returns:
+            int: Approximate player count
+        """
+        with _player_count_lock:
+            cached = _player_count
+        
+        if cached is None:
+            return PlayerService._count_players()
+        
+        count, counted_at = cached
+        if time.monotonic() - counted_at > current_app.config.get('PLAYER_COUNT_TTL', 60):
+            get_refresher().schedule('player_count', PlayerService._count_players)
+        return count
+    
+    @staticmethod
+    def _count_players() -> int:
+        """Count players and store the result for get_player_count"""
+        global _player_count
+        count = db.session.query(db.func.count(Player.id)).scalar()
+        with _player_count_lock:
+            _player_count = (count, time.monotonic())
+        return count
\ No newline at end of file
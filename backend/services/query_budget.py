@@ -0,0 +1,84 @@
+"""
+Query Budget
+Per-endpoint SQL statement budgets, counted per request
+"""
+import logging
+import threading
+from functools import wraps
+from typing import Callable
+from flask import Flask, current_app, g
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+_state = threading.local()
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised in 'raise' mode when an endpoint issues more statements than its budget"""
+    pass
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    """Count a statement if the current thread is inside a budgeted endpoint"""
+    if getattr(_state, 'count', None) is not None:
+        _state.count += 1
+
+
+def query_budget(limit: int) -> Callable:
+    """
+    Declare the maximum number of SQL statements an endpoint may issue
+    
+    The budget is always recorded on the view as `query_budget`. Counting is
+    controlled by QUERY_BUDGET_MODE: 'off' skips it, 'warn' logs endpoints
+    over budget and 'raise' raises QueryBudgetExceeded (used under testing).
+    Statements issued by other threads (background refreshes) are not counted.
+    
+    Args:
+        limit: Maximum statements per request
+    
+    Returns:
+        Callable: View decorator
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            mode = current_app.config.get('QUERY_BUDGET_MODE', 'off')
+            if mode == 'off':
+                return view(*args, **kwargs)
+            
+            _state.count = 0
+            try:
+                response = view(*args, **kwargs)
+            finally:
+                count, _state.count = _state.count, None
+                g.query_count = count
+            
+            if count > limit:
+                message = f"{view.__name__} issued {count} SQL statements (budget {limit})"
+                if mode == 'raise':
+                    raise QueryBudgetExceeded(message)
+                logger.warning(message)
+            return response
+        
+        wrapper.query_budget = limit
+        return wrapper
+    return decorator
+
+
+def init_query_budget(app: Flask) -> None:
+    """
+    Install statement counting and the X-Query-Count response header
+    
+    Args:
+        app: Flask application
+    """
+    if not event.contains(Engine, 'before_cursor_execute', _count_statement):
+        event.listen(Engine, 'before_cursor_execute', _count_statement)
+    
+    @app.after_request
+    def add_query_count_header(response):
+        if 'query_count' in g:
+            response.headers['X-Query-Count'] = str(g.query_count)
+        return response
@@ -0,0 +1,150 @@
+"""
+Rate Limiter
+Process-wide token bucket and retry backoff for Clash Royale API calls
+"""
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from flask import current_app
+
+
+class TokenBucket:
+    """Thread-safe token bucket that queues callers instead of rejecting them"""
+    
+    def __init__(self, rate: float, capacity: int):
+        """
+        Initialize the token bucket
+        
+        Args:
+            rate: Tokens added per second (the API key's sustained quota)
+            capacity: Maximum tokens held (allowed burst size)
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+        
+        self.acquired = 0
+        self.waited = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+    
+    def _refill(self) -> None:
+        """Add tokens for the time elapsed since the last refill"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+    
+    def reserve(self, max_wait: float = None) -> Optional[float]:
+        """
+        Reserve a token, returning how long the caller must wait before using it
+        
+        Reservations may drive the balance negative, which is what queues
+        callers: each one waits for the tokens reserved ahead of it to refill.
+        
+        Args:
+            max_wait: Give up instead of reserving if the wait would exceed this
+        
+        Returns:
+            Optional[float]: Seconds to wait, or None if max_wait would be exceeded
+        """
+        with self.lock:
+            self._refill()
+            wait = max(0.0, (1 - self.tokens) / self.rate)
+            if max_wait is not None and wait > max_wait:
+                self.rejected += 1
+                return None
+            
+            self.tokens -= 1
+            self.acquired += 1
+            if wait > 0:
+                self.waited += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+            return wait
+    
+    def get_stats(self) -> Dict:
+        """Get token wait statistics"""
+        with self.lock:
+            return {
+                'rate': self.rate,
+                'capacity': self.capacity,
+                'acquired': self.acquired,
+                'waited': self.waited,
+                'rejected': self.rejected,
+                'total_wait_seconds': round(self.total_wait, 4),
+                'avg_wait_seconds': round(self.total_wait / self.acquired, 4) if self.acquired else 0.0,
+                'max_wait_seconds': round(self.max_wait, 4)
+            }
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header value
+    
+    Args:
+        value: Header value, either delta-seconds or an HTTP date
+    
+    Returns:
+        Optional[float]: Seconds to wait, or None if absent or invalid
+    """
+    if not value:
+        return None
+    
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt: int, base: float, cap: float, retry_after: Optional[float] = None) -> float:
+    """
+    Compute the delay before a retry
+    
+    Uses full-jitter exponential backoff, but never retries earlier than the
+    server asked to via Retry-After.
+    
+    Args:
+        attempt: Zero-based retry number
+        base: Base delay in seconds
+        cap: Maximum backoff delay in seconds
+        retry_after: Delay requested by the server, if any
+    
+    Returns:
+        float: Seconds to sleep before retrying
+    """
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+# Singleton instance
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> TokenBucket:
+    """Get or create the process-wide token bucket"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _rate_limiter_lock:
+            if _rate_limiter is None:
+                _rate_limiter = TokenBucket(
+                    rate=current_app.config.get('CLASH_ROYALE_API_RATE_LIMIT', 10),
+                    capacity=current_app.config.get('CLASH_ROYALE_API_RATE_BURST', 20)
+                )
+    return _rate_limiter
@@ -0,0 +1,86 @@
+"""
+Single-Flight Request Coalescing
+Collapses concurrent identical calls into one execution shared by all callers
+"""
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+
+class _Call:
+    """An in-flight call and the callers waiting on it"""
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Per-key call coalescing across threads
+    
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it is running block and receive the leader's result or
+    exception. Once the call finishes the key is forgotten, so the next caller
+    starts a fresh call. Results are shared between callers and must not be
+    mutated.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls: Dict[Hashable, _Call] = {}
+        self.executed = 0
+        self.coalesced = 0
+    
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """
+        Run fn once per key among concurrent callers
+        
+        Args:
+            key: Identity of the call (e.g. a normalized player tag)
+            fn: Zero-argument callable doing the actual work
+        
+        Returns:
+            Any: The result of fn, shared with every coalesced caller
+        
+        Raises:
+            Exception: Whatever fn raised, re-raised in every coalesced caller
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self.calls[key] = call
+                self.executed += 1
+                leader = True
+        
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+    
+    def get_stats(self) -> Dict:
+        """Get coalescing counters"""
+        with self.lock:
+            return {
+                'executed': self.executed,
+                'coalesced': self.coalesced,
+                'in_flight': len(self.calls)
+            }
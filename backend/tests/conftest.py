@@ -0,0 +1,115 @@
+"""
+Shared fixtures: an in-memory app whose Clash Royale API is the replay server
+"""
+import importlib
+import threading
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+from werkzeug.serving import make_server
+
+from app import create_app
+from models import db
+from replay_server import ReplayData, create_replay_app
+
+# Per-process singletons (module, global) reset between tests so no state leaks across databases
+SINGLETONS = [
+    ('services.clash_royale', '_api_service'),
+    ('services.async_clash_royale', '_async_api_service'),
+    ('services.card_catalog', '_card_catalog'),
+    ('services.card_features', '_card_table'),
+    ('services.deck_analyzer', '_analyzer'),
+    ('services.deck_optimizer', '_optimizer'),
+    ('services.deck_index', '_deck_index'),
+    ('services.analysis_cache', '_analysis_cache'),
+    ('services.negative_cache', '_missing_players'),
+    ('services.circuit_breaker', '_circuit_breaker'),
+    ('services.rate_limiter', '_rate_limiter'),
+    ('services.hot_players', '_access_tracker'),
+    ('services.adaptive_ttl', '_ttl_stats'),
+]
+
+
+# Tags the replay data answers (2PC answers 404)
+PLAYER_TAGS = ['#2PG', '#2PR', '#2PJ', '#2YG']
+MISSING_TAG = '#2PC'
+
+
+@pytest.fixture(scope='session')
+def replay_data():
+    """Deterministic synthetic API responses; half of all tags are unknown"""
+    data = ReplayData(seed=0, not_found_rate=0.5)
+    assert not any(data.is_missing(tag) for tag in PLAYER_TAGS) and data.is_missing(MISSING_TAG)
+    return data
+
+
+@pytest.fixture(scope='session')
+def replay_url(replay_data):
+    """Base URL of a replay server running in a background thread"""
+    server = make_server('127.0.0.1', 0, create_replay_app(replay_data), threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}/v1'
+    server.shutdown()
+
+
+@pytest.fixture
+def app(replay_url):
+    """Testing app on a fresh in-memory database"""
+    for module, name in SINGLETONS:
+        setattr(importlib.import_module(module), name, None)
+    
+    app = create_app('testing')
+    app.config.update(
+        CLASH_ROYALE_API_KEY='test',
+        CLASH_ROYALE_API_BASE_URL=replay_url
+    )
+    yield app
+    with app.app_context():
+        db.drop_all()
+
+
+@pytest.fixture
+def app_context(app):
+    """
+    App context for calling services directly
+    
+    Requests made while it is pushed share its flask.g, so request
+    fixtures (cards) must come before it in a test's arguments.
+    """
+    with app.app_context():
+        yield
+
+
+@pytest.fixture
+def client(app):
+    """Test client of the app"""
+    return app.test_client()
+
+
+@pytest.fixture
+def cards(client):
+    """Store the replay server's card catalog"""
+    response = client.post('/api/cards/sync')
+    assert response.status_code == 200
+    return response.get_json()
+
+
+@pytest.fixture
+def count_statements(app_context):
+    """Context manager collecting the SQL statements issued inside it"""
+    @contextmanager
+    def counting():
+        statements = []
+        
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+    
+    return counting
@@ -0,0 +1,54 @@
+"""
+Stored analyses follow card feature changes
+"""
+import pytest
+
+from models import db, Card
+from services.analysis_cache import get_analysis_cache
+
+
+def analyze(client, tag='2PG'):
+    response = client.get(f'/api/players/{tag}/analyze')
+    assert response.status_code == 200
+    return response.get_json()['data']
+
+
+def test_card_change_invalidates_analysis(app, client, cards):
+    before = analyze(client)
+    assert analyze(client)['analysis'] == before['analysis']
+    
+    with app.app_context():
+        card = Card.query.filter_by(card_id=before['deck']['cards'][0]['card']['card_id']).one()
+        card.elixir_cost += 3
+        db.session.commit()
+    
+    after = analyze(client)['analysis']
+    assert after['id'] != before['analysis']['id']
+    assert after['metrics']['avg_elixir'] == pytest.approx(before['analysis']['metrics']['avg_elixir'] + 3 / 8, abs=0.01)
+
+
+def test_unrelated_card_change_keeps_analysis(app, client, cards):
+    before = analyze(client)
+    
+    with app.app_context():
+        card = Card.query.filter_by(card_id=before['deck']['cards'][0]['card']['card_id']).one()
+        card.icon_url = 'https://example.invalid/new.png'
+        db.session.commit()
+    
+    assert analyze(client)['analysis']['id'] == before['analysis']['id']
+
+
+def test_new_card_keeps_cached_analyses(app, client, cards):
+    before = analyze(client)
+    
+    with app.app_context():
+        db.session.add(Card(
+            card_id=99999999, name='Newly Released', card_type='troop', rarity='common',
+            elixir_cost=4, max_level=14
+        ))
+        db.session.commit()
+        hits = get_analysis_cache().hits
+    
+    assert analyze(client)['analysis']['id'] == before['analysis']['id']
+    with app.app_context():
+        assert get_analysis_cache().hits == hits + 1
@@ -0,0 +1,105 @@
+"""
+Battle ingestion against the replay server
+"""
+from datetime import timedelta
+
+import pytest
+
+from conftest import PLAYER_TAGS
+from models import db, Battle, BattleDeck, BattleIngestState, Player
+from services.battle_ingestion import BattleIngestionService, BATTLE_TIME_FORMAT
+from services.player_service import PlayerService
+
+
+def battle_times(battlelog):
+    """Parsed battle times of a battlelog"""
+    return [BattleIngestionService.parse_battle_time(entry['battleTime']) for entry in battlelog]
+
+
+def marks():
+    """High-water mark of each player, by tag"""
+    return dict(
+        db.session.query(Player.player_tag, BattleIngestState.last_battle_time).join(
+            BattleIngestState, BattleIngestState.player_id == Player.id
+        )
+    )
+
+
+def shifted(entry, delta):
+    """Copy of a battlelog entry played delta later"""
+    battle_time = BattleIngestionService.parse_battle_time(entry['battleTime']) + delta
+    return dict(entry, battleTime=battle_time.strftime(BATTLE_TIME_FORMAT))
+
+
+@pytest.fixture
+def players(cards, app_context):
+    """Store the replay players"""
+    assert all(error is None for error in PlayerService.refresh_players(PLAYER_TAGS).values())
+    return PLAYER_TAGS
+
+
+def test_ingest_stores_every_battle(replay_data, players):
+    stats = BattleIngestionService.ingest_battles(chunk_size=3)
+    
+    battlelogs = [replay_data.battlelog(tag) for tag in players]
+    assert stats['players'] == len(players) and stats['errors'] == 0
+    assert stats['battles_inserted'] == Battle.query.count() == sum(len(log) for log in battlelogs)
+    assert stats['decks_inserted'] == BattleDeck.query.count() == 2 * Battle.query.count()
+    assert marks() == {tag: max(battle_times(log)) for tag, log in zip(players, battlelogs)}
+
+
+def test_reingest_inserts_no_duplicates(players):
+    BattleIngestionService.ingest_battles()
+    battles = Battle.query.count()
+    
+    # Without high-water marks every battle is parsed again and found already stored
+    BattleIngestState.query.delete()
+    db.session.commit()
+    stats = BattleIngestionService.ingest_battles()
+    
+    assert stats['battles_parsed'] == battles
+    assert stats['battles_inserted'] == stats['decks_inserted'] == 0
+    assert Battle.query.count() == battles
+
+
+def test_high_water_mark_skips_older_battles(replay_data, players, monkeypatch):
+    BattleIngestionService.ingest_battles()
+    battles = Battle.query.count()
+    before = marks()
+    
+    battlelog = replay_data.battlelog
+    
+    def with_new_and_old_battles(tag):
+        log = battlelog(tag)
+        # One battle after the mark, and one before it that was never stored
+        return [shifted(log[0], timedelta(minutes=1))] + log + [shifted(log[-1], -timedelta(minutes=1))]
+    
+    monkeypatch.setattr(replay_data, 'battlelog', with_new_and_old_battles)
+    stats = BattleIngestionService.ingest_battles()
+    
+    assert stats['battles_parsed'] == stats['battles_inserted'] == len(players)
+    assert Battle.query.count() == battles + len(players)
+    assert marks() == {tag: mark + timedelta(minutes=1) for tag, mark in before.items()}
+
+
+def test_failed_player_keeps_its_mark(replay_data, players, monkeypatch):
+    BattleIngestionService.ingest_battles()
+    before = marks()
+    
+    battlelog = replay_data.battlelog
+    failing = players[1]
+    
+    def with_new_battle(tag):
+        if tag == failing:
+            return None
+        log = battlelog(tag)
+        return [shifted(log[0], timedelta(minutes=1))] + log
+    
+    monkeypatch.setattr(replay_data, 'battlelog', with_new_battle)
+    stats = BattleIngestionService.ingest_battles()
+    
+    assert stats['errors'] == 1
+    assert stats['battles_inserted'] == len(players) - 1
+    after = marks()
+    assert after[failing] == before[failing]
+    assert all(after[tag] == before[tag] + timedelta(minutes=1) for tag in players if tag != failing)
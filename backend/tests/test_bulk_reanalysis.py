@@ -0,0 +1,110 @@
+"""
+Bulk re-analysis: resumable runs that match the serial analyzer
+"""
+import itertools
+import random
+
+import pytest
+
+from models import db, Deck, DeckAnalysis, AnalysisCacheEntry, ReanalysisCheckpoint
+from services.analysis_cache import analysis_columns
+from services.bulk_reanalysis import BulkReanalysisService
+from services.card_features import get_card_table
+from services.clash_royale import TAG_ALPHABET, get_api_service
+from services.deck_analyzer import DeckAnalyzer
+from services.player_service import PlayerService
+
+DECKS = 40
+CHUNK_SIZE = 7
+
+
+class Interrupted(Exception):
+    """Stops a run after its first committed chunk"""
+
+
+def interrupt(stats):
+    """Progress callback interrupting the run"""
+    raise Interrupted
+
+
+def card_ids(deck):
+    """Card ids of a deck in position order"""
+    return [dc.card_id for dc in sorted(deck.deck_cards, key=lambda dc: dc.position)]
+
+
+def analyses_per_deck():
+    """Number of stored analyses of each deck"""
+    return dict(db.session.query(DeckAnalysis.deck_id, db.func.count(DeckAnalysis.id)).group_by(DeckAnalysis.deck_id))
+
+
+@pytest.fixture
+def decks(replay_data, cards, app_context):
+    """Store DECKS players, each with its own random deck"""
+    template = replay_data.player('#2PG')
+    tags = itertools.product(TAG_ALPHABET, repeat=4)
+    for seed in range(DECKS):
+        api_data = dict(
+            template,
+            tag='#' + ''.join(next(tags)),
+            currentDeck=replay_data._synthetic_deck(random.Random(seed))
+        )
+        PlayerService._write_player(get_api_service().parse_player_data(api_data))
+    db.session.commit()
+    
+    deck_ids = [deck_id for (deck_id,) in db.session.query(Deck.id).order_by(Deck.id)]
+    assert len(deck_ids) == DECKS
+    return deck_ids
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_results_match_serial_analysis(decks, workers):
+    stats = BulkReanalysisService.reanalyze(chunk_size=CHUNK_SIZE, workers=workers)
+    assert (stats['decks'], stats['analyzed'], stats['skipped']) == (DECKS, DECKS, 0)
+    
+    analyzer = DeckAnalyzer()
+    table = get_card_table()
+    for deck in Deck.query.all():
+        entry = AnalysisCacheEntry.query.filter_by(
+            deck_hash=deck.deck_hash, thresholds_version=analyzer.analysis_version(card_ids(deck), table)
+        ).one()
+        expected = analysis_columns(analyzer.analyze_card_ids(card_ids(deck), table))
+        actual = {column: getattr(entry.analysis, column) for column in expected}
+        actual['avg_elixir'] = float(actual['avg_elixir'])
+        assert actual == expected
+
+
+def test_interrupted_run_resumes_from_checkpoint(decks):
+    with pytest.raises(Interrupted):
+        BulkReanalysisService.reanalyze(chunk_size=CHUNK_SIZE, workers=1, progress=interrupt)
+    db.session.rollback()
+    
+    checkpoint = ReanalysisCheckpoint.query.one()
+    assert (checkpoint.last_deck_id, checkpoint.decks_analyzed) == (decks[CHUNK_SIZE - 1], CHUNK_SIZE)
+    
+    stats = BulkReanalysisService.reanalyze(chunk_size=CHUNK_SIZE, workers=1)
+    assert stats['resumed_after_deck'] == decks[CHUNK_SIZE - 1]
+    assert stats['analyzed'] == DECKS - CHUNK_SIZE
+    # Finished decks were not analyzed again
+    assert analyses_per_deck() == {deck_id: 1 for deck_id in decks}
+    
+    # A finished run has nothing left to do
+    assert BulkReanalysisService.reanalyze(chunk_size=CHUNK_SIZE, workers=1)['decks'] == 0
+
+
+def test_threshold_change_starts_a_new_pass(app, decks):
+    first = BulkReanalysisService.reanalyze(chunk_size=CHUNK_SIZE, workers=1)
+    
+    app.config['ANALYSIS_THRESHOLDS'] = dict(app.config['ANALYSIS_THRESHOLDS'], high_elixir=4.0)
+    second = BulkReanalysisService.reanalyze(chunk_size=CHUNK_SIZE, workers=1)
+    
+    assert second['thresholds_version'] != first['thresholds_version']
+    assert (second['resumed_after_deck'], second['analyzed']) == (0, DECKS)
+    assert analyses_per_deck() == {deck_id: 2 for deck_id in decks}
+    assert ReanalysisCheckpoint.query.count() == 2
+
+
+def test_restart_skips_decks_already_analyzed(decks):
+    BulkReanalysisService.reanalyze(chunk_size=CHUNK_SIZE, workers=1)
+    stats = BulkReanalysisService.reanalyze(chunk_size=CHUNK_SIZE, workers=1, restart=True)
+    
+    assert (stats['decks'], stats['already_analyzed'], stats['analyzed']) == (DECKS, DECKS, 0)
@@ -0,0 +1,74 @@
+"""
+Batch and card-id deck analysis are equivalent to analyze_deck
+"""
+import random
+import pytest
+from models import Card
+from services.card_features import CardFeatureTable
+from services.deck_analyzer import DeckAnalyzer, CardFeatureMatrix, DEFAULT_THRESHOLDS, DECK_SIZE
+
+
+def random_catalog(rng, size):
+    """Cards with random costs and roles, ids not in row order"""
+    cards = []
+    for card_id in rng.sample(range(1, 10 * size), size):
+        spell_type = rng.choice(['light', 'heavy', 'none', 'none', None])
+        cards.append(Card(
+            id=card_id,
+            name=f'Card {card_id}',
+            elixir_cost=rng.randint(1, 9),
+            is_air_targeting=rng.random() < 0.4,
+            is_splash_damage=rng.random() < 0.3,
+            is_win_condition=rng.random() < 0.2,
+            is_tank=rng.random() < 0.15,
+            is_spell=spell_type in ('light', 'heavy') or rng.random() < 0.05,
+            spell_type=spell_type
+        ))
+    return cards
+
+
+def random_thresholds(rng):
+    """Thresholds around the defaults, so every rule fires on some decks"""
+    return {
+        'high_elixir': rng.choice([3.5, 4.0, 4.5, 5.0]),
+        'low_elixir': rng.choice([2.5, 3.0, 3.5]),
+        'min_air_defense': rng.randint(1, 4),
+        'min_splash': rng.randint(1, 3),
+        'min_win_conditions': rng.randint(0, 2),
+        'max_win_conditions': rng.randint(2, 4),
+    }
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_card_id_and_batch_paths_match_analyze_deck(seed):
+    rng = random.Random(seed)
+    catalog = random_catalog(rng, rng.choice([12, 40, 120]))
+    table = CardFeatureTable.from_cards(catalog)
+    analyzer = DeckAnalyzer(DEFAULT_THRESHOLDS if seed == 0 else random_thresholds(rng))
+    decks = [rng.sample(catalog, DECK_SIZE) for _ in range(200)]
+    
+    expected = [analyzer.analyze_deck(deck) for deck in decks]
+    deck_card_ids = [[card.id for card in deck] for deck in decks]
+    
+    assert [analyzer.analyze_card_ids(card_ids, table) for card_ids in deck_card_ids] == expected
+    
+    pytest.importorskip('numpy')
+    assert analyzer.analyze_decks(deck_card_ids, CardFeatureMatrix(table)) == expected
+
+
+def test_unknown_card_id_rejected():
+    rng = random.Random(0)
+    catalog = random_catalog(rng, 20)
+    table = CardFeatureTable.from_cards(catalog)
+    card_ids = [card.id for card in catalog[:DECK_SIZE - 1]] + [0]
+    
+    with pytest.raises(ValueError):
+        DeckAnalyzer(DEFAULT_THRESHOLDS).analyze_card_ids(card_ids, table)
+
+
+def test_wrong_deck_size_rejected():
+    rng = random.Random(0)
+    catalog = random_catalog(rng, 20)
+    
+    with pytest.raises(ValueError):
+        DeckAnalyzer(DEFAULT_THRESHOLDS).analyze_deck(catalog[:DECK_SIZE - 1])
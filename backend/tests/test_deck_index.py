@@ -0,0 +1,105 @@
+"""
+Deck similarity index: exact top-k and after-commit indexing
+"""
+import random
+import pytest
+from models import db, Deck
+from services.clash_royale import get_api_service
+from services.deck_index import DeckSimilarityIndex, get_deck_index
+from services.player_service import PlayerService
+
+np = pytest.importorskip('numpy')
+
+
+def brute_force(decks, card_ids, limit, exclude_deck_id=None):
+    """Top decks by Jaccard similarity, ties by lower deck id"""
+    query = set(card_ids)
+    scored = []
+    for deck_id, cards in decks.items():
+        shared = len(query & set(cards))
+        if shared and deck_id != exclude_deck_id:
+            scored.append((-shared / len(query | set(cards)), deck_id, shared))
+    return [(deck_id, round(-score, 4), shared) for score, deck_id, shared in sorted(scored)[:limit]]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_similar_matches_brute_force(seed):
+    rng = random.Random(seed)
+    # A small catalog makes many overlaps and similarity ties
+    catalog = list(range(1, rng.choice([20, 40, 100])))
+    decks = {}
+    index = DeckSimilarityIndex(chunk_size=100, sync_interval=10, sync_overlap=10)
+    for deck_id in rng.sample(range(1, 10000), 3000):
+        decks[deck_id] = rng.sample(catalog, rng.choice([8, 8, 8, 7]))
+        index.add(deck_id, decks[deck_id])
+    
+    for _ in range(50):
+        limit = rng.choice([1, 5, 10, 50])
+        if rng.random() < 0.5:
+            exclude_deck_id = rng.choice(list(decks))
+            card_ids = decks[exclude_deck_id]
+        else:
+            exclude_deck_id = None
+            card_ids = rng.sample(catalog, 8)
+        
+        assert index.similar(card_ids, limit=limit, exclude_deck_id=exclude_deck_id) == \
+            brute_force(decks, card_ids, limit, exclude_deck_id)
+
+
+def test_unknown_cards_match_nothing():
+    index = DeckSimilarityIndex(chunk_size=100, sync_interval=10, sync_overlap=10)
+    index.add(1, [1, 2, 3, 4, 5, 6, 7, 8])
+    
+    assert index.similar([9, 10, 11, 12, 13, 14, 15, 16]) == []
+
+
+def write_deck(replay_data, tag):
+    """Write a player and their deck without committing, returning the deck id"""
+    PlayerService._write_player(get_api_service().parse_player_data(replay_data.player(tag)))
+    return db.session.scalar(db.select(Deck.id).order_by(Deck.id.desc()))
+
+
+def test_decks_indexed_after_commit(replay_data, cards, app_context):
+    index = get_deck_index()
+    deck_id = write_deck(replay_data, '#2PG')
+    assert deck_id not in index
+    
+    db.session.commit()
+    assert deck_id in index
+
+
+def test_rolled_back_decks_not_indexed(replay_data, cards, app_context):
+    index = get_deck_index()
+    deck_id = write_deck(replay_data, '#2PG')
+    db.session.rollback()
+    db.session.commit()
+    
+    assert deck_id not in index
+    assert len(index) == 0
+
+
+def test_rolled_back_savepoint_decks_not_indexed(replay_data, cards, app_context):
+    index = get_deck_index()
+    with db.session.begin_nested():
+        kept = write_deck(replay_data, '#2PG')
+    with pytest.raises(RuntimeError):
+        with db.session.begin_nested():
+            dropped = write_deck(replay_data, '#2PR')
+            raise RuntimeError('write failed')
+    db.session.commit()
+    
+    assert kept in index
+    assert dropped not in index
+    assert Deck.query.count() == 1
+
+
+def test_similar_decks_endpoint(client, cards):
+    tags = ['2PG', '2PR', '2PJ', '2YG']
+    for tag in tags:
+        assert client.get(f'/api/players/{tag}').status_code == 200
+    
+    response = client.get('/api/players/2PG/similar-decks?limit=2')
+    assert response.status_code == 200
+    similar = response.get_json()['data']['similar_decks']
+    assert len(similar) <= 2
+    assert all(deck['player']['player_tag'] != '#2PG' for deck in similar)
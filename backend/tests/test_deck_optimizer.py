@@ -0,0 +1,133 @@
+"""
+Deck optimizer against brute-force re-analysis of every swap
+"""
+import random
+from itertools import combinations
+import pytest
+from models import db, Card
+from services.deck_analyzer import DeckAnalyzer, SEVERITY_SCORES, DECK_SIZE
+from services.deck_optimizer import DeckOptimizer
+
+np = pytest.importorskip('numpy')
+
+
+def store_catalog(rng, size):
+    """Store cards with random costs and roles; few roles so many cards share an effect"""
+    for i in range(size):
+        spell_type = rng.choice(['light', 'heavy', 'none', 'none'])
+        db.session.add(Card(
+            card_id=26000000 + i,
+            name=f'Card {i}',
+            max_level=14,
+            elixir_cost=rng.randint(1, 7),
+            rarity='common',
+            card_type='spell' if spell_type != 'none' else 'troop',
+            is_air_targeting=rng.random() < 0.4,
+            is_splash_damage=rng.random() < 0.3,
+            is_win_condition=rng.random() < 0.2,
+            is_tank=rng.random() < 0.15,
+            is_spell=spell_type != 'none',
+            spell_type=spell_type
+        ))
+    db.session.commit()
+    return Card.query.order_by(Card.id).all()
+
+
+def signature(card):
+    """Everything about a card that the analysis metrics depend on"""
+    return (
+        card.elixir_cost, bool(card.is_air_targeting), bool(card.is_splash_damage), bool(card.is_win_condition),
+        bool(card.is_tank), card.spell_type == 'light', card.spell_type == 'heavy'
+    )
+
+
+def net_score(analysis):
+    """Net rating score of a full analysis, as the analyzer rates it"""
+    weakness_score = sum(SEVERITY_SCORES.get(weakness['severity'], 1) for weakness in analysis['weaknesses'])
+    return len(analysis['strengths']) - weakness_score / 2
+
+
+def brute_force(analyzer, catalog, deck):
+    """
+    Re-analyze every single and double swap
+    
+    Returns:
+        Tuple[float, Dict]: Current score, and per distinct swap (removed
+            positions, added signatures) its (score, size, elixir change)
+    """
+    current = net_score(analyzer.analyze_deck(deck))
+    available = [card for card in catalog if card not in deck]
+    swaps = {}
+    for size in (1, 2):
+        for positions in combinations(range(DECK_SIZE), size):
+            kept = [card for position, card in enumerate(deck) if position not in positions]
+            for added in combinations(available, size):
+                key = (positions, tuple(sorted(signature(card) for card in added)))
+                if key not in swaps:
+                    new_deck = kept + list(added)
+                    swaps[key] = (
+                        net_score(analyzer.analyze_deck(new_deck)),
+                        size,
+                        abs(total_cost(new_deck) - total_cost(deck))
+                    )
+    return current, swaps
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_optimize_matches_brute_force(app_context, seed):
+    rng = random.Random(seed)
+    catalog = store_catalog(rng, rng.choice([14, 20]))
+    analyzer = DeckAnalyzer()
+    optimizer = DeckOptimizer(analyzer)
+    by_name = {card.name: card for card in catalog}
+    
+    for _ in range(3):
+        deck = rng.sample(catalog, DECK_SIZE)
+        limit = rng.choice([3, 10, 1000])
+        result = optimizer.optimize([card.id for card in deck], limit=limit, max_swaps=2)
+        current, swaps = brute_force(analyzer, catalog, deck)
+        
+        assert result['score'] == current
+        assert result['candidates_evaluated'] == len(swaps)
+        
+        # Each suggested swap re-analyzes to the reported score, rating and metrics
+        found = []
+        for swap in result['swaps']:
+            new_deck = [card for card in deck if card.name not in swap['remove']]
+            new_deck += [by_name[name] for name in swap['add']]
+            assert len(set(new_deck)) == DECK_SIZE
+            analysis = analyzer.analyze_deck(new_deck)
+            assert net_score(analysis) == swap['score']
+            assert swap['score_gain'] == swap['score'] - current
+            assert analysis['overall_rating'] == swap['overall_rating']
+            assert {key: analysis['metrics'][key] for key in swap['metrics']} == swap['metrics']
+            found.append((-swap['score_gain'], len(swap['add']), abs(total_cost(new_deck) - total_cost(deck))))
+        
+        # The same best swaps in the same order, up to the choice among equivalent cards
+        assert found == sorted(
+            (current - score, size, elixir_change) for score, size, elixir_change in swaps.values()
+            if score > current
+        )[:limit]
+
+
+def total_cost(deck):
+    """Total elixir cost of a deck"""
+    return sum(card.elixir_cost for card in deck)
+
+
+def test_single_swaps_only(app_context):
+    rng = random.Random(7)
+    catalog = store_catalog(rng, 16)
+    deck = rng.sample(catalog, DECK_SIZE)
+    
+    result = DeckOptimizer(DeckAnalyzer()).optimize([card.id for card in deck], limit=50, max_swaps=1)
+    
+    assert all(len(swap['add']) == len(swap['remove']) == 1 for swap in result['swaps'])
+    assert result['candidates_evaluated'] <= DECK_SIZE * (len(catalog) - DECK_SIZE)
+
+
+def test_max_swaps_out_of_range(app_context):
+    catalog = store_catalog(random.Random(0), 12)
+    
+    with pytest.raises(ValueError):
+        DeckOptimizer(DeckAnalyzer()).optimize([card.id for card in catalog[:DECK_SIZE]], max_swaps=3)
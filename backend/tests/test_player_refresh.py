@@ -0,0 +1,115 @@
+"""
+Statement counts of player refreshes
+"""
+from models import db, Card, Player, Deck
+from services.card_catalog import get_card_catalog
+from services.clash_royale import get_api_service
+from services.player_service import PlayerService
+
+# Player upsert, card lookup, deck lookup, deck upsert, deck cards upsert, current-deck UPDATE
+NEW_DECK_STATEMENTS = 6
+# Player upsert, card lookup, deck lookup, current-deck UPDATE
+KNOWN_DECK_STATEMENTS = 4
+# Card upsert and read-back of cards missing from the cards table
+MISSING_CARDS_STATEMENTS = 2
+
+
+def parse(replay_data, tag, deck_from=None):
+    """Parsed player data, optionally with another tag's deck"""
+    api_data = replay_data.player(tag)
+    if deck_from is not None:
+        api_data = dict(api_data, currentDeck=replay_data.player(deck_from)['currentDeck'])
+    return get_api_service().parse_player_data(api_data)
+
+
+def write_player(player_data, count_statements):
+    """Write and commit a player, returning the statements issued by the write"""
+    with count_statements() as statements:
+        PlayerService._write_player(player_data)
+    db.session.commit()
+    return statements
+
+
+def test_write_new_player(replay_data, cards, count_statements):
+    statements = write_player(parse(replay_data, '#2PG'), count_statements)
+    
+    assert len(statements) == NEW_DECK_STATEMENTS
+    assert Player.query.count() == 1
+    assert Deck.query.count() == 1
+
+
+def test_refresh_with_same_deck(replay_data, cards, count_statements):
+    write_player(parse(replay_data, '#2PG'), count_statements)
+    statements = write_player(parse(replay_data, '#2PG'), count_statements)
+    
+    assert len(statements) == KNOWN_DECK_STATEMENTS
+
+
+def test_refresh_with_new_deck(replay_data, cards, count_statements):
+    write_player(parse(replay_data, '#2PG'), count_statements)
+    statements = write_player(parse(replay_data, '#2PG', deck_from='#2PR'), count_statements)
+    
+    assert len(statements) == NEW_DECK_STATEMENTS
+    assert Deck.query.filter_by(is_current_deck=True).count() == 1
+
+
+def test_deck_seen_on_another_player(replay_data, cards, count_statements):
+    write_player(parse(replay_data, '#2PR'), count_statements)
+    statements = write_player(parse(replay_data, '#2PG', deck_from='#2PR'), count_statements)
+    
+    assert len(statements) == KNOWN_DECK_STATEMENTS
+
+
+def test_missing_cards_filled_from_catalog(replay_data, cards, count_statements):
+    player_data = parse(replay_data, '#2PG')
+    api_card_ids = [card['id'] for card in player_data['current_deck']]
+    Card.query.filter(Card.card_id.in_(api_card_ids[:3])).delete(synchronize_session=False)
+    db.session.commit()
+    
+    statements = write_player(player_data, count_statements)
+    
+    assert len(statements) == NEW_DECK_STATEMENTS + MISSING_CARDS_STATEMENTS
+    assert Card.query.filter(Card.card_id.in_(api_card_ids)).count() == 8
+
+
+def test_refresh_players_statements_per_player(cards, count_statements):
+    tags = ['#2PG', '#2PR', '#2PJ', '#2YG']
+    with count_statements() as one:
+        PlayerService.refresh_players(tags[:1])
+    with count_statements() as several:
+        PlayerService.refresh_players(tags[1:])
+    
+    # Each player's writes are wrapped in SAVEPOINT / RELEASE SAVEPOINT
+    assert len(one) == NEW_DECK_STATEMENTS + 2
+    assert len(several) == 3 * len(one)
+    assert Player.query.count() == 4
+
+
+def test_card_released_after_catalog_cached(replay_data, cards, count_statements, monkeypatch):
+    catalog = get_card_catalog()
+    catalog.all()
+    loads = catalog.loads
+    new_card = dict(replay_data.cards['items'][0], id=99999999, name='Newly Released')
+    monkeypatch.setitem(replay_data.cards, 'items', replay_data.cards['items'] + [new_card])
+    
+    player_data = parse(replay_data, '#2PG')
+    player_data['current_deck'][0] = dict(player_data['current_deck'][0], id=new_card['id'])
+    write_player(player_data, count_statements)
+    
+    assert catalog.loads == loads + 1
+    assert Card.query.filter_by(card_id=new_card['id']).count() == 1
+    assert len(Deck.query.one().deck_cards) == 8
+
+
+def test_unknown_card_does_not_store_partial_deck(replay_data, cards, count_statements):
+    catalog = get_card_catalog()
+    catalog.all()
+    loads = catalog.loads
+    
+    player_data = parse(replay_data, '#2PG')
+    player_data['current_deck'][0] = dict(player_data['current_deck'][0], id=99999998)
+    write_player(player_data, count_statements)
+    
+    assert catalog.loads == loads + 1
+    assert Player.query.count() == 1
+    assert Deck.query.count() == 0
@@ -0,0 +1,155 @@
+"""
+Budgeted endpoints stay within their declared SQL statement budgets
+
+Each budget is the endpoint's worst case (a fetched player whose deck cards
+are partly missing from the cards table), which the worst-case tests reach
+exactly. Cached paths are pinned to their exact counts, so an N+1 regression
+fails even while under budget.
+"""
+import pytest
+from conftest import PLAYER_TAGS, MISSING_TAG
+from models import db, Card
+import services.deck_index
+
+
+def budget_of(app, path, method='GET'):
+    """Declared budget of the endpoint serving a path"""
+    endpoint, _ = app.url_map.bind('localhost').match(path.split('?')[0], method=method)
+    return app.view_functions[endpoint].query_budget
+
+
+def call(app, client, path, method='GET', **kwargs):
+    """Request a budgeted endpoint, check it stays within budget and get its statement count"""
+    budget = budget_of(app, path, method)
+    response = client.open(path, method=method, **kwargs)
+    count = int(response.headers['X-Query-Count'])
+    assert count <= budget, (path, count, budget)
+    return response, count
+
+
+@pytest.fixture
+def players(client, cards):
+    """Store the replay players"""
+    for tag in PLAYER_TAGS:
+        assert client.get(f'/api/players/{tag.lstrip("#")}').status_code == 200
+    return [tag.lstrip('#') for tag in PLAYER_TAGS]
+
+
+@pytest.fixture
+def others(client, cards):
+    """Store every replay player but 2PG"""
+    for tag in PLAYER_TAGS[1:]:
+        assert client.get(f'/api/players/{tag.lstrip("#")}').status_code == 200
+
+
+@pytest.fixture
+def unstored_cards(app, replay_data, others):
+    """Remove three of 2PG's deck cards no stored deck uses, so fetching 2PG stores them again"""
+    used = {card['id'] for tag in PLAYER_TAGS[1:] for card in replay_data.player(tag)['currentDeck']}
+    card_ids = [card['id'] for card in replay_data.player('#2PG')['currentDeck'] if card['id'] not in used][:3]
+    assert len(card_ids) == 3
+    with app.app_context():
+        Card.query.filter(Card.card_id.in_(card_ids)).delete(synchronize_session=False)
+        db.session.commit()
+    # A fresh index has decks stored by other processes to sync
+    services.deck_index._deck_index = None
+
+
+def test_get_player(app, client, cards):
+    response, count = call(app, client, '/api/players/2PG')
+    assert (response.status_code, count) == (200, 11)
+    # Served from the database
+    assert call(app, client, '/api/players/2PG')[1] == 4
+    assert call(app, client, '/api/players/2PG?include_catalog=true')[1] == 5
+    # Forced refresh of a known deck
+    assert call(app, client, '/api/players/2PG?refresh=true')[1] == 9
+
+
+def test_get_missing_player(app, client, cards):
+    tag = MISSING_TAG.lstrip('#')
+    assert call(app, client, f'/api/players/{tag}')[0].status_code == 404
+    # Answered from the negative cache
+    response, count = call(app, client, f'/api/players/{tag}')
+    assert (response.status_code, count) == (404, 0)
+
+
+@pytest.mark.parametrize('path, cached', [('analyze', 12), ('improvements', 5), ('similar-decks', 7)])
+def test_player_deck_endpoints(app, client, players, path, cached):
+    for tag in players[:2]:
+        assert call(app, client, f'/api/players/{tag}/{path}')[0].status_code == 200
+        # Cached analyses and a synced index
+        response, count = call(app, client, f'/api/players/{tag}/{path}')
+        assert (response.status_code, count) == (200, cached)
+
+
+@pytest.mark.parametrize('path', ['analyze', 'improvements', 'similar-decks'])
+def test_player_deck_endpoints_fetch_player(app, client, cards, path):
+    # The player is fetched from the API and stored first
+    assert call(app, client, f'/api/players/2PG/{path}')[0].status_code == 200
+    tag = MISSING_TAG.lstrip('#')
+    assert call(app, client, f'/api/players/{tag}/{path}')[0].status_code == 404
+
+
+@pytest.mark.parametrize('path', [
+    '/api/players/2PG?include_catalog=true',
+    '/api/players/2PG/analyze?include_catalog=true',
+    '/api/players/2PG/improvements',
+    '/api/players/2PG/similar-decks',
+    '/api/players/search?q=2PG&include_catalog=true',
+])
+def test_worst_case_reaches_budget(app, client, unstored_cards, path):
+    response, count = call(app, client, path)
+    assert (response.status_code, count) == (200, budget_of(app, path))
+
+
+def test_batch_players(app, client, cards):
+    tags = [tag.lstrip('#') for tag in PLAYER_TAGS]
+    response, count = call(app, client, '/api/players/batch', 'POST', json={'tags': tags})
+    assert response.status_code == 200
+    # Lookup, then a savepoint, 6 writes and a release per fetched tag, then the reload
+    assert count == 5 + 8 * len(tags)
+    
+    assert call(app, client, '/api/players/batch', 'POST', json={'tags': tags})[1] == 4
+    assert call(app, client, '/api/players/batch?include_catalog=true', 'POST', json={'tags': tags})[1] == 5
+
+
+def test_batch_players_worst_case(app, client, unstored_cards):
+    path = '/api/players/batch?include_catalog=true'
+    response, count = call(app, client, path, 'POST', json={'tags': ['2PG']})
+    assert (response.status_code, count) == (200, 6 + 10)
+    # The budget allows this cost for PLAYER_BATCH_MAX_TAGS fetched tags
+    assert budget_of(app, path, 'POST') == 6 + 10 * app.config['PLAYER_BATCH_MAX_TAGS']
+
+
+def test_list_players(app, client, players):
+    response, count = call(app, client, '/api/players?limit=2')
+    first = response.get_json()['data']
+    assert (len(first['players']), count) == (2, 5)
+    
+    response, count = call(app, client, f"/api/players?limit=2&cursor={first['next_cursor']}")
+    assert (len(response.get_json()['data']['players']), count) == (2, 4)
+    assert call(app, client, '/api/players?limit=2&offset=2&include_catalog=true')[1] == 5
+
+
+@pytest.mark.parametrize('query, expected', [('2PG', 4), ('#2PR', 4), ('Player', 5), ('player 2p', 5), ('nobody', 1)])
+def test_search_players(app, client, players, query, expected):
+    response, count = call(app, client, '/api/players/search', query_string={'q': query})
+    assert (response.status_code, count) == (200, expected)
+
+
+def test_cards(app, client, cards):
+    card_id = call(app, client, '/api/cards')[0].get_json()['data']['cards'][0]['id']
+    assert call(app, client, f'/api/cards/{card_id}')[0].status_code == 200
+    assert call(app, client, '/api/cards/0')[0].status_code == 404
+    assert call(app, client, '/api/cards/statistics')[0].status_code == 200
+
+
+def test_card_catalog_revalidation(app, client, cards):
+    response, _ = call(app, client, '/api/cards/catalog')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    
+    response, count = call(app, client, '/api/cards/catalog', headers={'If-None-Match': etag})
+    assert (response.status_code, count) == (304, 1)
+    
+    assert call(app, client, '/api/cards/catalog', headers={'If-None-Match': '"stale"'})[0].status_code == 200